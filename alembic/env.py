@@ -29,6 +29,7 @@ if config.config_file_name is not None:
 # target_metadata = mymodel.Base.metadata
 import star.models
 from star.models.transcribe import *
+from star.models.events import *
 target_metadata = star.models.Base.metadata
 
 # other values from the config, defined by the needs of env.py,
@@ -0,0 +1,63 @@
+# Measures the cost of `L1Cache.event` as the cache grows.
+# The number of keys tied to the published event stays constant, so the per-event
+# cost should stay flat no matter how many unrelated entries are in the cache.
+#
+# usage: python -m benchmarks.l1_event_expiry [--repeat N]
+import argparse
+import time
+
+from star.cache.l1 import L1Cache
+from star.events import ServerEvent
+
+CACHE_SIZES = (1_000, 10_000, 100_000)
+AFFECTED_KEYS = 10
+
+
+def populate(size: int) -> L1Cache:
+    cache = L1Cache()
+    cache.max_cache_size_bytes = 1 << 40
+    for idx in range(size - AFFECTED_KEYS):
+        cache.insert(f'unrelated-{idx}', f'value-{idx}', ServerEvent.VIDEO_UPLOADED if idx % 2 else None)
+    return cache
+
+
+def refill(cache: L1Cache):
+    for idx in range(AFFECTED_KEYS):
+        cache.insert(f'affected-{idx}', f'value-{idx}', ServerEvent.VIDEO_STATE_CHANGE)
+
+
+def full_scan(cache: L1Cache, event: ServerEvent) -> list[str]:
+    # what `L1Cache.event` used to do before the event index existed
+    return [key for key, entry in cache.entry_map.items() if entry.expire_event == event]
+
+
+def measure(cache: L1Cache, repeat: int) -> tuple[float, float]:
+    indexed = 0.0
+    scanned = 0.0
+    for _ in range(repeat):
+        refill(cache)
+        start = time.perf_counter()
+        full_scan(cache, ServerEvent.VIDEO_STATE_CHANGE)
+        scanned += time.perf_counter() - start
+
+        start = time.perf_counter()
+        cache.event(ServerEvent.VIDEO_STATE_CHANGE)
+        indexed += time.perf_counter() - start
+    return indexed / repeat, scanned / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark L1Cache event expiry against cache size')
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    print(f'{"entries":>10} | {"indexed event() (us)":>22} | {"full scan (us)":>16}')
+    print('-' * 56)
+    for size in CACHE_SIZES:
+        cache = populate(size)
+        indexed, scanned = measure(cache, args.repeat)
+        print(f'{size:>10} | {indexed * 1e6:>22.2f} | {scanned * 1e6:>16.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+# Compares the memory footprint and throughput of the slotted L1Cache against the
+# previous dict-backed layout (a key -> value dict plus a key -> Entry dict).
+#
+# usage: python -m benchmarks.l1_layout [--sizes 10000 100000 1000000]
+import argparse
+import gc
+import time
+import tracemalloc
+from typing import Any, Self
+
+from star.cache.l1 import L1Cache
+from star.cache.sizing import SizeStrategy, FastSize
+from star.events import ServerEvent
+
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000)
+
+
+class _DictBackedEntry:
+    key: str
+    size: int
+    expire_event: ServerEvent
+    next: Self | None
+    prev: Self | None
+
+    def __init__(self, key: str, size: int, expire_event: ServerEvent | None):
+        self.key = key
+        self.size = size
+        self.expire_event = expire_event
+        self.prev = None
+        self.next = None
+
+
+class DictBackedL1Cache:
+    # frozen copy of the L1Cache layout prior to the slotted entries, kept as the reference point
+    newest_entry: _DictBackedEntry | None
+    oldest_entry: _DictBackedEntry | None
+    memory_cache: dict[str, Any]
+    entry_map: dict[str, _DictBackedEntry]
+    event_map: dict[ServerEvent, set[str]]
+    max_cache_size_bytes: int
+    current_size_bytes: int
+    size_strategy: SizeStrategy
+
+    def _getsize(self, value: Any) -> int:
+        return self.size_strategy.size(value)
+
+    def __init__(self, size_strategy: SizeStrategy | None = None):
+        self.size_strategy = size_strategy if size_strategy is not None else FastSize()
+        self.memory_cache = {}
+        self.entry_map = {}
+        self.event_map = {}
+        self.oldest_entry = None
+        self.newest_entry = None
+        self.current_size_bytes = 0
+
+        self.max_cache_size_bytes = 1 << 40
+
+    def _remove_entry(self, entry: _DictBackedEntry):
+        previous = entry.prev
+        next = entry.next
+
+        if previous is not None:
+            previous.next = next
+        if next is not None:
+            next.prev = previous
+
+        if self.oldest_entry is entry:
+            self.oldest_entry = next
+        if self.newest_entry is entry:
+            self.newest_entry = previous
+
+        entry.prev = None
+        entry.next = None
+
+    def event(self, event: ServerEvent):
+        # only the keys tied to this event are touched, regardless of how large the cache is
+        to_expire = self.event_map.pop(event, set())
+        for key in to_expire:
+            self.expire(key)
+
+    def expire(self, key: str):
+        if key in self.entry_map:
+            del self.memory_cache[key]
+
+            entry = self.entry_map.pop(key)
+            self.current_size_bytes -= entry.size
+            self._remove_entry(entry)
+
+            if entry.expire_event is not None and entry.expire_event in self.event_map:
+                keys = self.event_map[entry.expire_event]
+                keys.discard(key)
+                if len(keys) == 0:
+                    del self.event_map[entry.expire_event]
+
+    def insert(self, key: str, value: Any, expire_event: ServerEvent | None) -> list[Any]:
+        # we dont want to blow the cache up if we try to cache something too big
+        entry_size = self._getsize(value)
+        if entry_size > self.max_cache_size_bytes:
+            return [value]
+
+        self.memory_cache[key] = value
+
+        if key in self.entry_map:
+            # if entry already exists, remove it from the linked list so we can append
+            entry = self.entry_map[key]
+            self._remove_entry(entry)
+            # the replaced value no longer takes up space; account for the new one instead
+            self.current_size_bytes += entry_size - entry.size
+            entry.size = entry_size
+        else:
+            # if new entry, make sure its logged
+            entry = _DictBackedEntry(key, entry_size, expire_event=expire_event)
+            self.entry_map[key] = entry
+            self.current_size_bytes += entry_size
+            if expire_event is not None:
+                self.event_map.setdefault(expire_event, set()).add(key)
+
+        if self.oldest_entry is None:
+            # if this is the first entry, set it as both oldest and newest
+            self.oldest_entry = entry
+            self.newest_entry = self.oldest_entry
+        else:
+            # otherwise, update it to the newest entry
+            entry.prev = self.newest_entry
+            self.newest_entry.next = entry
+            self.newest_entry = entry
+
+        popped_items = []
+        while self.current_size_bytes > self.max_cache_size_bytes:
+            popped_items.append(self.memory_cache[self.oldest_entry.key])
+            self.expire(self.oldest_entry.key)
+        return popped_items
+
+    def get(self, key: str) -> Any | None:
+        if key in self.memory_cache:
+            entry = self.entry_map[key]
+
+            self._remove_entry(entry)
+            entry.prev = self.newest_entry
+            self.newest_entry.next = entry
+            self.newest_entry = entry
+
+            return self.memory_cache[key]
+        return None
+
+    def contains(self, key: str) -> bool:
+        return key in self.memory_cache
+
+    def clear(self):
+        self.memory_cache.clear()
+        self.entry_map.clear()
+        self.event_map.clear()
+        self.oldest_entry = None
+        self.newest_entry = None
+        self.current_size_bytes = 0
+
+
+def fill(cache: Any, keys: list[str], values: list[str]):
+    for idx, key in enumerate(keys):
+        cache.insert(key, values[idx], ServerEvent.VIDEO_STATE_CHANGE if idx % 16 == 0 else None)
+
+
+def measure_memory(factory, keys: list[str], values: list[str]) -> int:
+    gc.collect()
+    tracemalloc.start()
+    cache = factory()
+    fill(cache, keys, values)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del cache
+    return current
+
+
+def measure_throughput(factory, keys: list[str], values: list[str]) -> tuple[float, float]:
+    cache = factory()
+    start = time.perf_counter()
+    fill(cache, keys, values)
+    insert_rate = len(keys) / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for key in keys:
+        cache.get(key)
+    get_rate = len(keys) / (time.perf_counter() - start)
+    return insert_rate, get_rate
+
+
+def slotted_cache() -> L1Cache:
+    cache = L1Cache()
+    cache.max_cache_size_bytes = 1 << 40
+    return cache
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark L1Cache entry layouts')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    args = parser.parse_args()
+
+    layouts = {'dict-backed': DictBackedL1Cache, 'slotted': slotted_cache}
+    print(f'{"entries":>10} | {"layout":>12} | {"bytes/entry":>12} | {"insert/s":>12} | {"get/s":>12}')
+    print('-' * 70)
+    for size in args.sizes:
+        keys = [f'key-{idx}' for idx in range(size)]
+        values = [f'value-{idx}' for idx in range(size)]
+        # the keys and values are shared by both layouts; only the cache structure is measured
+        for name, factory in layouts.items():
+            memory = measure_memory(factory, keys, values)
+            insert_rate, get_rate = measure_throughput(factory, keys, values)
+            print(f'{size:>10} | {name:>12} | {memory / size:>12.1f} | {insert_rate:>12.0f} | {get_rate:>12.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+# Times the speech recognition of one recording whole, and then split into windows across an increasing number of
+# segment workers, to show how segmented transcription scales with the cores available. Model loads and process
+# start up are done before the clock starts; alignment is the same either way and is left out.
+#
+# usage: python -m benchmarks.segmented_transcription AUDIO [--workers 2 4 8] [--segment-seconds 300]
+#
+# AUDIO has to be the 16 kHz mono float32 PCM the server decodes videos to, e.g.
+#     ffmpeg -i lecture.mp4 -vn -ac 1 -ar 16000 -f f32le lecture.f32
+import argparse
+import os
+import time
+from pathlib import Path
+
+from scripts.transcribe import Transcriber, load_audio
+from star.transcribe.audio import SAMPLE_RATE, PCM_SUFFIX
+
+DEFAULT_WORKERS = (2, 4, 8)
+
+
+def words(result: dict) -> int:
+    return sum(len(segment['text'].split()) for segment in result['segments'])
+
+
+def time_whole(transcriber: Transcriber, audio_path: Path) -> tuple[float, dict]:
+    model = transcriber.asr_model()
+    audio = load_audio(audio_path)
+    start = time.perf_counter()
+    result = model.transcribe(audio, batch_size=transcriber.batch_size)
+    return time.perf_counter() - start, result
+
+
+def time_segmented(transcriber: Transcriber, audio_path: Path, language: str) -> tuple[float, dict]:
+    # starting every process runs its initializer, so all of the models are loaded before we start timing
+    pool = transcriber.segment_pool()
+    list(pool.map(time.sleep, [1] * transcriber.segment_workers))
+
+    audio = load_audio(audio_path)
+    start = time.perf_counter()
+    result = transcriber.transcribe_segmented(audio_path, audio, language)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('audio', type=Path)
+    parser.add_argument('--workers', type=int, nargs='+', default=DEFAULT_WORKERS)
+    parser.add_argument('--segment-seconds', type=float, default=300)
+    arguments = parser.parse_args()
+    if arguments.audio.suffix != PCM_SUFFIX:
+        parser.error(f'{arguments.audio} is not {PCM_SUFFIX} PCM')
+
+    duration = arguments.audio.stat().st_size / 4 / SAMPLE_RATE
+    print(f'{arguments.audio}: {duration / 60:.1f} minutes of audio, {os.cpu_count()} cores')
+    print(f'{"workers":>8} {"seconds":>10} {"speedup":>8} {"x realtime":>11} {"words":>8}')
+
+    transcriber = Transcriber()
+    baseline, result = time_whole(transcriber, arguments.audio)
+    language = result['language']
+    print(f'{"whole":>8} {baseline:>10.1f} {1:>8.2f} {duration / baseline:>11.2f} {words(result):>8}')
+
+    for workers in arguments.workers:
+        transcriber = Transcriber()
+        transcriber.segment_workers = workers
+        transcriber.segment_seconds = arguments.segment_seconds
+        elapsed, result = time_segmented(transcriber, arguments.audio, language)
+        transcriber.segment_pool().shutdown()
+        print(f'{workers:>8} {elapsed:>10.1f} {baseline / elapsed:>8.2f} {duration / elapsed:>11.2f} {words(result):>8}')
+
+
+if __name__ == '__main__':
+    main()
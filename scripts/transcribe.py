@@ -2,14 +2,31 @@ import os
 import sys
 import whisperx
 import torch
+import numpy as np
 import gc
+import argparse
+import itertools
 import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any
+from collections import OrderedDict
+from collections.abc import Callable, Iterator
 from pathlib import Path
+from multiprocessing.connection import Listener
 
 sys.path.append(str(Path(os.getcwd())))
 
 from star.environment import ENVIRONMENT
 from star.configuration import Configuration
+from star.transcribe.pool import AUTHKEY_ENVIRONMENT_VARIABLE
+from star.subprocess.transcribe import LANGUAGE_PREFIX
+from star.transcribe.audio import SAMPLE_DTYPE, SAMPLE_RATE, PCM_SUFFIX
+from star.transcribe.segments import Window, plan_windows, stitch
+from star.transcribe.partial import PartialTranscript
+
+# the resolution silence is looked for at when splitting audio into windows
+SEGMENT_FRAME_SECONDS = 0.1
 
 
 @contextlib.contextmanager
@@ -21,53 +38,260 @@ def resource_cleaner(*objs_to_clean):
         del obj
 
 
+def load_audio(audio_path: Path) -> np.ndarray:
+    # PCM decoded by the server is mapped rather than read, so only the pages being worked on are ever in memory.
+    # Anything else is decoded by whisperx as usual
+    if audio_path.suffix != PCM_SUFFIX:
+        return whisperx.load_audio(str(audio_path))
+    if audio_path.stat().st_size == 0:
+        return np.zeros(0, dtype=SAMPLE_DTYPE)
+    # copy on write, in case anything downstream scales the samples in place
+    return np.memmap(audio_path, dtype=SAMPLE_DTYPE, mode='c')
+
+
+def frame_energies(audio: np.ndarray, frame_seconds: float) -> list[float]:
+    # mean square of every frame, worked out a block at a time so a mapped file is never read in all at once
+    frame_samples = int(frame_seconds * SAMPLE_RATE)
+    frames = len(audio) // frame_samples
+    energies = []
+    for first in range(0, frames, 4096):
+        last = min(frames, first + 4096)
+        block = np.asarray(audio[first * frame_samples : last * frame_samples], dtype=np.float32)
+        energies.extend(np.square(block).reshape(-1, frame_samples).mean(axis=1).tolist())
+    return energies
+
+
+# each process in the segment pool holds one model of its own
+_window_model = None
+
+
+def _load_window_model(variant: str, device: str, compute_type: str, download_root: str, threads: int):
+    global _window_model
+    _window_model = whisperx.load_model(variant, device, compute_type=compute_type, download_root=download_root, threads=threads)
+
+
+def transcribe_window(
+    model: Any, audio: np.ndarray, window: Window, language: str | None, batch_size: int
+) -> tuple[list[dict], str]:
+    # Returns the window's segments, timed from the start of `audio`, and the language they're in
+    samples = audio[int(window.start * SAMPLE_RATE) : int(window.end * SAMPLE_RATE)]
+    result = model.transcribe(np.ascontiguousarray(samples), batch_size=batch_size, language=language)
+    segments = [
+        {**segment, 'start': segment['start'] + window.start, 'end': segment['end'] + window.start}
+        for segment in result['segments']
+    ]
+    return segments, result['language']
+
+
+def _transcribe_window(audio_path: str, window: Window, language: str | None, batch_size: int) -> tuple[list[dict], str]:
+    return transcribe_window(_window_model, load_audio(Path(audio_path)), window, language, batch_size)
+
+
+def resident_bytes() -> int:
+    # what a model costs once loaded: resident memory, plus whatever torch holds on the GPU
+    with open('/proc/self/statm') as statm:
+        resident = int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    if torch.cuda.is_available():
+        resident += torch.cuda.memory_allocated()
+    return resident
+
+
+class ModelRegistry:
+    """
+    ### Loaded ASR and alignment models, least recently used evicted first once `budget_bytes` is exceeded.
+
+    Models are keyed by (kind, variant, compute type, language). A model's size is however much memory loading it
+    took, so the budget holds for whatever whisperx happens to load. The model just asked for is never evicted,
+    even if it alone is over budget.
+    """
+
+    budget_bytes: int
+    models: OrderedDict[tuple, tuple[Any, int]]
+
+    def __init__(self, budget_bytes: int):
+        self.budget_bytes = budget_bytes
+        self.models = OrderedDict()
+
+    @property
+    def used_bytes(self) -> int:
+        return sum(size for _, size in self.models.values())
+
+    def get(self, key: tuple, load: Callable[[], Any]) -> Any:
+        if key in self.models:
+            self.models.move_to_end(key)
+            return self.models[key][0]
+
+        before = resident_bytes()
+        model = load()
+        size = max(0, resident_bytes() - before)
+        print(f'Loaded {key} ({size // 2**20} MiB)')
+        self.models[key] = (model, size)
+        self._evict()
+        return model
+
+    def _evict(self):
+        while self.used_bytes > self.budget_bytes and len(self.models) > 1:
+            key, _ = self.models.popitem(last=False)
+            print(f'Evicting {key} to stay under {self.budget_bytes // 2**20} MiB')
+            gc.collect()
+            torch.cuda.empty_cache()
+
+
 class Transcriber:
-    audio_path: Path
-    subtitle_path: Path
     model_path: Path
 
     model_variant: str
     compute_type: str
     device: str
     batch_size: int
+    registry: ModelRegistry
+    preload_languages: list[str]
+    segment_workers: int
+    segment_seconds: float
+    segment_overlap_seconds: float
+    stream_partial: bool
 
-    def __init__(self, audio_path: Path):
+    def __init__(self):
+        # Models are loaded on first use and kept in the registry, so `transcribe` may be called any number of times
         config = Configuration.load('transcription.env')
         self.compute_type = config.require('compute_type').get()
         self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
         self.model_variant = config.require('model_variant').get()
         self.batch_size = int(config.require('batch_size').get())
+        self.registry = ModelRegistry(int(config.get('model_memory_budget_mb', 8192)) * 2**20)
+        # the alignment models a warm worker loads before it takes any jobs
+        self.preload_languages = [language for language in config.get('preload_languages', 'en').split(',') if language]
+        # Recordings at least two windows long are split up and transcribed by this many processes. With 1 they are
+        # only split when their transcript is streamed, and then the windows are transcribed one after the other here
+        self.segment_workers = int(config.get('segment_workers', 1))
+        # 'false' never writes a partial transcript, so with 1 segment worker long recordings are transcribed whole
+        self.stream_partial = config.get('stream_partial_transcript', 'true').lower() == 'true'
+        self.segment_seconds = float(config.get('segment_seconds', 300))
+        self.segment_overlap_seconds = float(config.get('segment_overlap_seconds', 5))
+        self._segment_pool = None
 
-        self.audio_path = audio_path
-        self.subtitle_path = self.audio_path.with_suffix('.srt')
         self.model_path = ENVIRONMENT.model_folder() / 'whisperx' / self.model_variant / self.compute_type
-
         print(f'Using whisperx.{self.model_variant}.{self.compute_type} on {self.device} with {self.batch_size} batch size')
-        self.model = whisperx.load_model(
-            self.model_variant,
-            self.device,
-            compute_type=self.compute_type,
-            download_root=self.model_path,
-            language='en',
+
+    def asr_model(self) -> Any:
+        # one multilingual model serves every language; the language is picked per call
+        return self.registry.get(
+            ('asr', self.model_variant, self.compute_type, None),
+            lambda: whisperx.load_model(
+                self.model_variant,
+                self.device,
+                compute_type=self.compute_type,
+                download_root=self.model_path,
+            ),
         )
 
-    def transcribe(self):
-        print(f'Loading {self.audio_path}')
-        with resource_cleaner(self.model):
-            audio = whisperx.load_audio(self.audio_path)
-            result = self.model.transcribe(audio, batch_size=self.batch_size)
-
-        print('Aligning transcription output')
-        model, metadata = whisperx.load_align_model(
-            language_code='en',
-            device=self.device,
-            model_dir=self.model_path
+    def align_model(self, language: str) -> tuple[Any, dict]:
+        return self.registry.get(
+            ('align', self.model_variant, self.compute_type, language),
+            lambda: whisperx.load_align_model(language_code=language, device=self.device, model_dir=self.model_path),
         )
-        with resource_cleaner(model):
-            result = whisperx.align(result['segments'], model, metadata, audio, self.device, return_char_alignments=False)
 
-        print(f'Writing transcription to {self.subtitle_path}')
-        with open(self.subtitle_path, 'w') as f:
+    def preload(self):
+        # Loads the models most jobs need now rather than during the first of them
+        self.asr_model()
+        for language in self.preload_languages:
+            self.align_model(language)
+
+    def segment_pool(self) -> ProcessPoolExecutor:
+        # Started on first use and kept for as long as we are. Its models are outside the registry's budget
+        if self._segment_pool is None:
+            # only the CPUs we're allowed on; see `Transcribe.CPU_AFFINITY`
+            threads = max(1, len(os.sched_getaffinity(0)) // self.segment_workers)
+            print(f'Starting {self.segment_workers} segment workers with {threads} threads each')
+            self._segment_pool = ProcessPoolExecutor(
+                self.segment_workers,
+                # forking a process that has already started torch's threads is asking for a deadlock
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_load_window_model,
+                initargs=(self.model_variant, self.device, self.compute_type, str(self.model_path), threads),
+            )
+        return self._segment_pool
+
+    def segmented(self, audio_path: Path, audio: np.ndarray, partial: PartialTranscript | None) -> bool:
+        # Long recordings are split up to spread them over the segment workers, or to hand back some of the transcript
+        # before all of it is done. The windows are read straight from the file, so it has to be PCM we can map
+        return (
+            (self.segment_workers > 1 or partial is not None)
+            and audio_path.suffix == PCM_SUFFIX
+            and len(audio) >= 2 * self.segment_seconds * SAMPLE_RATE
+        )
+
+    def _windows_in_order(
+        self, audio_path: Path, audio: np.ndarray, windows: list[Window], language: str | None
+    ) -> Iterator[tuple[Window, list[dict], str]]:
+        if self.segment_workers <= 1:
+            model = self.asr_model()
+            for window in windows:
+                segments, language = transcribe_window(model, audio, window, language, self.batch_size)
+                yield window, segments, language
+            return
+
+        pool = self.segment_pool()
+        if language is None:
+            # every window has to agree on the language, so the first one decides it for the rest
+            segments, language = pool.submit(_transcribe_window, str(audio_path), windows[0], None, self.batch_size).result()
+            yield windows[0], segments, language
+            windows = windows[1:]
+
+        futures = [pool.submit(_transcribe_window, str(audio_path), window, language, self.batch_size) for window in windows]
+        for window, future in zip(windows, futures):
+            yield window, future.result()[0], language
+
+    def transcribe_segmented(
+        self, audio_path: Path, audio: np.ndarray, language: str | None, partial: PartialTranscript | None = None
+    ) -> dict:
+        windows = plan_windows(
+            frame_energies(audio, SEGMENT_FRAME_SECONDS),
+            SEGMENT_FRAME_SECONDS,
+            self.segment_seconds,
+            self.segment_overlap_seconds,
+        )
+        print(f'Transcribing {len(windows)} windows with {self.segment_workers} workers')
+
+        transcribed = []
+        for window, segments, language in self._windows_in_order(audio_path, audio, windows, language):
+            transcribed.append((window, segments))
+            if partial is not None:
+                # windows finish in order and only keep their own stretch, so this is already final
+                partial.append(segment for segment in segments if window.keeps(segment))
+        return {'segments': stitch(transcribed), 'language': language}
+
+    def transcribe(self, audio_path: Path, language: str | None = None, partial_path: Path | None = None) -> tuple[Path, str]:
+        # Returns the subtitles and the language they are in, which is detected if `language` is None. Segments are
+        # appended to `partial_path` as they are transcribed; see `star.transcribe.partial.PartialTranscript`
+        subtitle_path = audio_path.with_suffix('.srt')
+        partial = PartialTranscript(partial_path) if partial_path is not None and self.stream_partial else None
+        if partial is not None:
+            partial.start()
+
+        print(f'Loading {audio_path}')
+        with resource_cleaner():
+            audio = load_audio(audio_path)
+            if self.segmented(audio_path, audio, partial):
+                result = self.transcribe_segmented(audio_path, audio, language, partial)
+            else:
+                result = self.asr_model().transcribe(audio, batch_size=self.batch_size, language=language)
+        language = result['language']
+
+        try:
+            align_model, align_metadata = self.align_model(language)
+        except ValueError as e:
+            # whisperx can recognise more languages than it can align; the transcript is still good, only less exact
+            print(f'Not aligning {language} transcription output, there is no alignment model for it: {e}')
+        else:
+            print(f'Aligning {language} transcription output')
+            with resource_cleaner():
+                result = whisperx.align(
+                    result['segments'], align_model, align_metadata, audio, self.device, return_char_alignments=False
+                )
+
+        print(f'Writing transcription to {subtitle_path}')
+        with open(subtitle_path, 'w') as f:
 
             def timecode(seconds) -> tuple[int, int, int, int]:
                 return (int(seconds // 3600), int((seconds % 3600) // 60), int(seconds % 60), int(seconds * 1000) % 1000)
@@ -84,16 +308,51 @@ class Transcriber:
                 end_timecode = f'{end_hour:02}:{end_minute:02}:{end_second:02},{end_millisecond:03}'
 
                 f.write(f'{idx + 1}\n{start_timecode} --> {end_timecode}\n{sentence}\n\n')
+        return subtitle_path, language
 
 
-def transcribe(audio_path: Path | str):
+def transcribe(audio_path: Path | str, language: str | None = None, partial_path: Path | None = None):
     if isinstance(audio_path, str):
         audio_path = Path(audio_path)
-    Transcriber(audio_path).transcribe()
+    _, language = Transcriber().transcribe(audio_path, language, partial_path)
+    # read back by `star.subprocess.transcribe.Transcribe`
+    print(f'{LANGUAGE_PREFIX}{language}')
+
+
+def serve(address: str, max_jobs: int):
+    # Serves `star.transcribe.pool.TranscriberPool` over a unix socket. The ASR model and the `preload_languages`
+    # alignment models are loaded before we start listening, so a connection means we are ready; other languages
+    # are loaded by the first job that needs them. Exits after `max_jobs` jobs, or never if it is 0
+    transcriber = Transcriber()
+    transcriber.preload()
+    authkey = bytes.fromhex(os.environ.pop(AUTHKEY_ENVIRONMENT_VARIABLE))
+    with Listener(address, family='AF_UNIX', authkey=authkey) as listener:
+        with listener.accept() as connection:
+            for _ in range(max_jobs) if max_jobs > 0 else itertools.count():
+                try:
+                    request = connection.recv()
+                except EOFError:
+                    break
+                try:
+                    partial = Path(request['partial']) if request.get('partial') else None
+                    subtitles, language = transcriber.transcribe(Path(request['audio']), request.get('language'), partial)
+                    connection.send({'subtitles': str(subtitles), 'language': language})
+                except Exception as e:
+                    connection.send({'error': repr(e)})
 
 
 if __name__ == '__main__':
-    if len(sys.argv) != 2:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('audio', nargs='?')
+    parser.add_argument('--serve', metavar='SOCKET')
+    parser.add_argument('--max-jobs', type=int, default=0)
+    parser.add_argument('--language', help='detected from the audio if not given')
+    parser.add_argument('--partial', type=Path, help='where to append segments as they are transcribed')
+    arguments = parser.parse_args()
+
+    if arguments.serve:
+        serve(arguments.serve, arguments.max_jobs)
+    elif arguments.audio is None:
         print('No file supplied')
     else:
-        transcribe(Path(sys.argv[1]))
+        transcribe(Path(arguments.audio), arguments.language, arguments.partial)
@@ -1 +1,2 @@
 from star.cache.cache import Cache as Cache
+from star.cache.shared import SharedCache as SharedCache
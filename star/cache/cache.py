@@ -1,34 +1,54 @@
 # A caching scheme that mimics CPU architecture caches.
 # Includes an "L1" cache that is a simple in-memory cache,
-# and can be extended with an "L2" cache that is a networked cache (memcache, redis).
+# and an optional "L2" cache that lives on disk and is shared by every worker on the host.
+# Anything evicted from L1 falls through to L2, and L2 hits are promoted back into L1.
 
 import logging
 from typing import Any
 from star.cache.l1 import L1Cache
-from star.error import L1CacheMiss
+from star.cache.l2 import L2Cache
+from star.error import L1CacheMiss, L2CacheMiss
 from star.events import ServerEvent
+from star.settings import GLOBAL_CONFIGURATION
 
 logger = logging.getLogger('star.cache')
 
 
 class Cache:
     l1_cache: L1Cache
-    l2_cache: None  # Placeholder for L2 cache, if implemented later
+    l2_cache: L2Cache | None
+    # keys promoted from L2 that haven't been written to since. No need to write them back on eviction. Only ever
+    # holds keys that are in L1, so a key leaves it however it leaves L1
+    l2_resident: set[str]
 
-    def __init__(self):
-        self.l1_cache = L1Cache()
-        self.l2_cache = None
+    def __init__(self, l2_cache: L2Cache | None = None):
+        self.l1_cache = L1Cache(on_evict=self._evicted)
+        self.l2_resident = set()
+
+        if l2_cache is None and 'l2_cache_path' in GLOBAL_CONFIGURATION:
+            l2_cache = L2Cache(GLOBAL_CONFIGURATION['l2_cache_path'])
+        self.l2_cache = l2_cache
+
+    def _evicted(self, key: str, value: Any, expire_event: ServerEvent | None):
+        if self.l2_cache is None:
+            return
+        if key in self.l2_resident:
+            self.l2_resident.discard(key)
+            return
+        logging.debug(f"Moving '{key}' from L1 cache to L2 cache")
+        self.l2_cache.insert(key, value, expire_event)
 
     def event(self, event: ServerEvent, data: Any = None):
-        self.l1_cache.event(event)
+        self.l2_resident.difference_update(self.l1_cache.event(event))
+        if self.l2_cache is not None:
+            self.l2_cache.event(event)
 
     def insert(self, key: str, value: Any, expire_event: ServerEvent | None = None):
         logging.info(f"Inserting '{key}' into cache")
         logging.debug(f"Inserting '{key}' into L1 cache")
-        popped_items = self.l1_cache.insert(key, value, expire_event)  # noqa: F841
+        self.l2_resident.discard(key)
+        popped_items = self.l1_cache.insert(key, value, expire_event)
         logging.debug(f'Popped {len(popped_items)} items from L1 cache')
-        # If L2 cache is implemented, it would handle the popped items
-        # for right now, unused
 
     def get(self, key: str) -> Any | None:
         logging.info(f"Getting '{key}' from cache")
@@ -38,8 +58,19 @@ class Cache:
             logging.debug(f'L1 Cache hit! Key: {key}')
             return item
         logging.debug(f'L1 Cache miss! Key: {key}')
-        raise L1CacheMiss(key)
-        # todo! if L2 cache is implemented, check there as well
+        if self.l2_cache is None:
+            raise L1CacheMiss(key)
+
+        result = self.l2_cache.get(key)
+        if result is None:
+            logging.debug(f'L2 Cache miss! Key: {key}')
+            raise L2CacheMiss(key)
+
+        logging.debug(f'L2 Cache hit! Key: {key}')
+        item, expire_event = result
+        self.l2_resident.add(key)
+        self.l1_cache.insert(key, item, expire_event)
+        return item
 
     def __getitem__(self, key: str) -> Any:
         return self.get(key)
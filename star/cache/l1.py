@@ -1,20 +1,29 @@
-import objsize
 import logging
 from typing import Any, Self
+from collections.abc import Callable
 from star.settings import GLOBAL_CONFIGURATION
 from star.events import ServerEvent
+from star.cache.sizing import SizeStrategy, FastSize
 
 logger = logging.getLogger('star.cache')
 
 
 class Entry:
+    # Entries are allocated per cached key, so keep them as small as possible and store
+    # the value inline so lookups only go through `entry_map`
+    __slots__ = ('key', 'value', 'size', 'expire_event', 'prev', 'next')
+
     key: str
-    expire_event: ServerEvent
+    value: Any
+    size: int
+    expire_event: ServerEvent | None
     next: Self | None
     prev: Self | None
 
-    def __init__(self, key: str, expire_event: ServerEvent | None):
+    def __init__(self, key: str, value: Any, size: int, expire_event: ServerEvent | None):
         self.key = key
+        self.value = value
+        self.size = size
         self.expire_event = expire_event
         self.prev = None
         self.next = None
@@ -27,22 +36,30 @@ class L1Cache:
 
     newest_entry: Entry | None
     oldest_entry: Entry | None
-    memory_cache: dict[str, Any]
     entry_map: dict[str, Entry]
+    event_map: dict[ServerEvent, set[str]]
     max_cache_size_bytes: int
     current_size_bytes: int
+    size_strategy: SizeStrategy
+    on_evict: Callable[[str, Any, ServerEvent | None], None] | None
 
     def _getsize(self, value: Any) -> int:
-        return objsize.get_deep_size(value)
-
-    def __init__(self):
-        self.memory_cache = {}
+        return self.size_strategy.size(value)
+
+    def __init__(
+        self,
+        size_strategy: SizeStrategy | None = None,
+        on_evict: Callable[[str, Any, ServerEvent | None], None] | None = None,
+    ):
+        self.size_strategy = size_strategy if size_strategy is not None else FastSize()
+        self.on_evict = on_evict
         self.entry_map = {}
+        self.event_map = {}
         self.oldest_entry = None
         self.newest_entry = None
         self.current_size_bytes = 0
 
-        self.max_cache_size_bytes = GLOBAL_CONFIGURATION.get('cache_size', 1 * 1024 * 1024)
+        self.max_cache_size_bytes = int(GLOBAL_CONFIGURATION.get('cache_size', 1 * 1024 * 1024))
 
     def _remove_entry(self, entry: Entry):
         previous = entry.prev
@@ -61,77 +78,92 @@ class L1Cache:
         entry.prev = None
         entry.next = None
 
-    def event(self, event: ServerEvent):
-        to_expire = []
-        for key, entry in self.entry_map.items():
-            if entry.expire_event == event:
-                to_expire.append(key)
+    def _append_entry(self, entry: Entry):
+        if self.newest_entry is None:
+            # if this is the first entry, set it as both oldest and newest
+            self.oldest_entry = entry
+            self.newest_entry = entry
+        else:
+            # otherwise, update it to the newest entry
+            entry.prev = self.newest_entry
+            self.newest_entry.next = entry
+            self.newest_entry = entry
 
+    def event(self, event: ServerEvent) -> set[str]:
+        # Expires the keys tied to this event and returns them; no other key is touched, however large the cache is
+        to_expire = self.event_map.pop(event, set())
         for key in to_expire:
             logger.debug(f'Expiring key {key} due to event {event}')
             self.expire(key)
+        return to_expire
 
     def expire(self, key: str):
-        if key in self.entry_map:
-            item = self.entry_map[key]
-            self.current_size_bytes -= self._getsize(item.key)
-            del self.memory_cache[key]
+        entry = self.entry_map.pop(key, None)
+        if entry is None:
+            return
 
-            entry = self.entry_map.pop(key)
-            self._remove_entry(entry)
+        self.current_size_bytes -= entry.size
+        self._remove_entry(entry)
+
+        if entry.expire_event is not None and entry.expire_event in self.event_map:
+            keys = self.event_map[entry.expire_event]
+            keys.discard(key)
+            if len(keys) == 0:
+                del self.event_map[entry.expire_event]
 
     def insert(self, key: str, value: Any, expire_event: ServerEvent | None) -> list[Any]:
         # we dont want to blow the cache up if we try to cache something too big
         entry_size = self._getsize(value)
         if entry_size > self.max_cache_size_bytes:
+            # whatever was cached under this key before is out of date now
+            self.expire(key)
+            if self.on_evict is not None:
+                self.on_evict(key, value, expire_event)
             return [value]
 
-        self.memory_cache[key] = value
-
-        if key in self.entry_map:
+        entry = self.entry_map.get(key)
+        if entry is not None:
             # if entry already exists, remove it from the linked list so we can append
-            entry = self.entry_map[key]
             self._remove_entry(entry)
+            # the replaced value no longer takes up space; account for the new one instead
+            self.current_size_bytes += entry_size - entry.size
+            entry.value = value
+            entry.size = entry_size
         else:
             # if new entry, make sure its logged
-            entry = Entry(key, expire_event=expire_event)
+            entry = Entry(key, value, entry_size, expire_event=expire_event)
             self.entry_map[key] = entry
             self.current_size_bytes += entry_size
+            if expire_event is not None:
+                self.event_map.setdefault(expire_event, set()).add(key)
 
-        if self.oldest_entry is None:
-            # if this is the first entry, set it as both oldest and newest
-            self.oldest_entry = entry
-            self.newest_entry = self.oldest_entry
-        else:
-            # otherwise, update it to the newest entry
-            entry.prev = self.newest_entry
-            self.newest_entry.next = entry
-            self.newest_entry = entry
+        self._append_entry(entry)
 
         popped_items = []
         while self.current_size_bytes > self.max_cache_size_bytes:
-            popped_items.append(self.memory_cache[self.oldest_entry.key])
-            self.expire(self.oldest_entry.key)
+            oldest = self.oldest_entry
+            popped_items.append(oldest.value)
+            self.expire(oldest.key)
+            if self.on_evict is not None:
+                self.on_evict(oldest.key, oldest.value, oldest.expire_event)
         return popped_items
 
     def get(self, key: str) -> Any | None:
-        if key in self.memory_cache:
-            entry = self.entry_map[key]
+        entry = self.entry_map.get(key)
+        if entry is None:
+            return None
 
+        if entry is not self.newest_entry:
             self._remove_entry(entry)
-            entry.prev = self.newest_entry
-            self.newest_entry.next = entry
-            self.newest_entry = entry
-
-            return self.memory_cache[key]
-        return None
+            self._append_entry(entry)
+        return entry.value
 
     def contains(self, key: str) -> bool:
-        return key in self.memory_cache
+        return key in self.entry_map
 
     def clear(self):
-        self.memory_cache.clear()
         self.entry_map.clear()
+        self.event_map.clear()
         self.oldest_entry = None
         self.newest_entry = None
         self.current_size_bytes = 0
@@ -0,0 +1,298 @@
+import os
+import mmap
+import fcntl
+import pickle
+import struct
+import logging
+import contextlib
+from pathlib import Path
+from typing import Any
+from collections.abc import Iterator
+
+from star.settings import GLOBAL_CONFIGURATION
+from star.events import ServerEvent
+
+logger = logging.getLogger('star.cache')
+
+MAGIC = b'STL2\x01'
+# kind, event length, key length, value length
+RECORD_HEADER = struct.Struct('<BHII')
+
+INSERT_RECORD = 1
+EXPIRE_RECORD = 2
+EVENT_RECORD = 3
+
+
+class L2Entry:
+    __slots__ = ('record_offset', 'record_size', 'value_offset', 'value_size', 'expire_event')
+
+    record_offset: int
+    record_size: int
+    value_offset: int
+    value_size: int
+    expire_event: str | None
+
+    def __init__(self, record_offset: int, record_size: int, value_offset: int, value_size: int, expire_event: str | None):
+        self.record_offset = record_offset
+        self.record_size = record_size
+        self.value_offset = value_offset
+        self.value_size = value_size
+        self.expire_event = expire_event
+
+
+class L2Cache:
+    """
+    ### On-disk cache shared by every process that points at the same file.
+
+    Values are pickled into a single append-only log which is memory-mapped for reads. Inserts, expiries and
+    events are all appended as records; each process keeps its own index of the log and replays whatever other
+    processes appended since it last looked. When the log outgrows `max_cache_size_bytes` it is compacted down
+    to the newest entries and atomically swapped in, which every other process notices on its next access.
+    """
+
+    # after compaction the log is at most this fraction of the budget, so we don't compact on every insert
+    COMPACTION_RATIO: float = 0.5
+
+    path: Path
+    lock_path: Path
+    max_cache_size_bytes: int
+    entry_map: dict[str, L2Entry]
+    event_map: dict[str, set[str]]
+    scanned_offset: int
+    live_bytes: int
+
+    def __init__(self, path: Path | str, max_cache_size_bytes: int | None = None):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.lock_path = self.path.with_name(f'{self.path.name}.lock')
+
+        if max_cache_size_bytes is None:
+            max_cache_size_bytes = int(GLOBAL_CONFIGURATION.get('l2_cache_size', 64 * 1024 * 1024))
+        self.max_cache_size_bytes = max_cache_size_bytes
+
+        self.entry_map = {}
+        self.event_map = {}
+        self.scanned_offset = len(MAGIC)
+        self.live_bytes = 0
+
+        self._fd = None
+        self._inode = None
+        self._mmap = None
+        self._lock_file = open(self.lock_path, 'a+b')
+
+        with self._locked(fcntl.LOCK_SH):
+            logger.info(f'Opened L2 cache at {self.path} with {len(self.entry_map)} entries')
+
+    def _open(self):
+        self._close_data()
+        try:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o600)
+            os.write(fd, MAGIC)
+        except FileExistsError:
+            fd = os.open(self.path, os.O_RDWR)
+
+        stat = os.fstat(fd)
+        self._fd = fd
+        self._inode = (stat.st_dev, stat.st_ino)
+        self.entry_map.clear()
+        self.event_map.clear()
+        self.scanned_offset = len(MAGIC)
+        self.live_bytes = 0
+
+    def _close_data(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _file_size(self) -> int:
+        return os.fstat(self._fd).st_size
+
+    def _is_stale(self) -> bool:
+        # another process may have compacted the log and swapped a new file in underneath us
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return True
+        return (stat.st_dev, stat.st_ino) != self._inode
+
+    @contextlib.contextmanager
+    def _locked(self, mode: int) -> Iterator[None]:
+        fcntl.flock(self._lock_file, mode)
+        try:
+            if self._fd is None or self._is_stale():
+                self._open()
+            self._catch_up(writable=mode == fcntl.LOCK_EX)
+            yield
+        finally:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _remap(self, size: int):
+        if self._mmap is not None:
+            self._mmap.close()
+        self._mmap = mmap.mmap(self._fd, size, access=mmap.ACCESS_READ)
+
+    def _reset(self):
+        os.ftruncate(self._fd, 0)
+        os.pwrite(self._fd, MAGIC, 0)
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        self.entry_map.clear()
+        self.event_map.clear()
+        self.scanned_offset = len(MAGIC)
+        self.live_bytes = 0
+
+    def _catch_up(self, writable: bool):
+        size = self._file_size()
+        if size < len(MAGIC):
+            # the file is being created by another process
+            if writable:
+                self._reset()
+            return
+
+        if self._mmap is None or len(self._mmap) < size:
+            self._remap(size)
+
+        if self._mmap[: len(MAGIC)] != MAGIC:
+            logger.warning(f'L2 cache at {self.path} is not in a format we understand')
+            if writable:
+                self._reset()
+            return
+
+        offset = self.scanned_offset
+        while offset + RECORD_HEADER.size <= size:
+            kind, event_size, key_size, value_size = RECORD_HEADER.unpack_from(self._mmap, offset)
+            event_offset = offset + RECORD_HEADER.size
+            key_offset = event_offset + event_size
+            value_offset = key_offset + key_size
+            end = value_offset + value_size
+            if end > size or kind not in (INSERT_RECORD, EXPIRE_RECORD, EVENT_RECORD):
+                # a writer died part way through a record. Whoever writes next will cut it off
+                break
+
+            event = self._mmap[event_offset:key_offset].decode() if event_size > 0 else None
+            key = self._mmap[key_offset:value_offset].decode()
+            if kind == INSERT_RECORD:
+                self._drop(key)
+                self.entry_map[key] = L2Entry(offset, end - offset, value_offset, value_size, event)
+                if event is not None:
+                    self.event_map.setdefault(event, set()).add(key)
+                self.live_bytes += end - offset
+            elif kind == EXPIRE_RECORD:
+                self._drop(key)
+            elif kind == EVENT_RECORD:
+                for expired_key in self.event_map.pop(event, set()):
+                    self._drop(expired_key)
+
+            offset = end
+        self.scanned_offset = offset
+
+    def _drop(self, key: str):
+        entry = self.entry_map.pop(key, None)
+        if entry is None:
+            return
+
+        self.live_bytes -= entry.record_size
+        if entry.expire_event is not None and entry.expire_event in self.event_map:
+            keys = self.event_map[entry.expire_event]
+            keys.discard(key)
+            if len(keys) == 0:
+                del self.event_map[entry.expire_event]
+
+    @staticmethod
+    def _record(kind: int, key: str = '', event: str | None = None, value: bytes = b'') -> bytes:
+        encoded_event = event.encode() if event is not None else b''
+        encoded_key = key.encode()
+        return RECORD_HEADER.pack(kind, len(encoded_event), len(encoded_key), len(value)) + encoded_event + encoded_key + value
+
+    def _append(self, record: bytes):
+        if self._file_size() != self.scanned_offset:
+            # drop anything we couldn't parse so it doesn't corrupt every record after it
+            os.ftruncate(self._fd, self.scanned_offset)
+        os.pwrite(self._fd, record, self.scanned_offset)
+        self._catch_up(writable=True)
+
+    def _rewrite(self, entries: list[L2Entry]):
+        # never truncate the log in place; other processes may still have it mapped
+        rewritten_path = self.path.with_name(f'{self.path.name}.rewrite')
+        with open(rewritten_path, 'wb') as rewritten:
+            rewritten.write(MAGIC)
+            for entry in entries:
+                rewritten.write(self._mmap[entry.record_offset : entry.record_offset + entry.record_size])
+        os.replace(rewritten_path, self.path)
+
+        self._open()
+        self._catch_up(writable=True)
+
+    def _compact(self):
+        budget = int(self.max_cache_size_bytes * self.COMPACTION_RATIO)
+        kept = []
+        kept_bytes = len(MAGIC)
+        for entry in sorted(self.entry_map.values(), key=lambda entry: entry.record_offset, reverse=True):
+            if kept_bytes + entry.record_size > budget:
+                break
+            kept.append(entry)
+            kept_bytes += entry.record_size
+
+        logger.info(f'Compacting L2 cache from {self._file_size()} bytes to {kept_bytes} bytes ({len(kept)} entries)')
+        self._rewrite(list(reversed(kept)))
+
+    def event(self, event: ServerEvent):
+        with self._locked(fcntl.LOCK_EX):
+            if event in self.event_map:
+                logger.debug(f'Expiring {len(self.event_map[event])} L2 keys due to event {event}')
+                self._append(self._record(EVENT_RECORD, event=event))
+
+    def expire(self, key: str):
+        with self._locked(fcntl.LOCK_EX):
+            if key in self.entry_map:
+                self._append(self._record(EXPIRE_RECORD, key=key))
+
+    def insert(self, key: str, value: Any, expire_event: ServerEvent | None) -> bool:
+        try:
+            payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, TypeError, AttributeError) as e:
+            logger.debug(f"Can't store '{key}' in L2 cache: {e}")
+            return False
+
+        record = self._record(INSERT_RECORD, key=key, event=expire_event, value=payload)
+        if len(MAGIC) + len(record) > self.max_cache_size_bytes * self.COMPACTION_RATIO:
+            return False
+
+        with self._locked(fcntl.LOCK_EX):
+            self._append(record)
+            if self._file_size() > self.max_cache_size_bytes:
+                self._compact()
+        return True
+
+    def get(self, key: str) -> tuple[Any, ServerEvent | None] | None:
+        with self._locked(fcntl.LOCK_SH):
+            entry = self.entry_map.get(key)
+            if entry is None:
+                return None
+
+            try:
+                with memoryview(self._mmap) as view:
+                    with view[entry.value_offset : entry.value_offset + entry.value_size] as payload:
+                        value = pickle.loads(payload)
+            except Exception as e:
+                logger.warning(f"Failed to load '{key}' from L2 cache: {e}")
+                return None
+
+            expire_event = ServerEvent(entry.expire_event) if entry.expire_event in ServerEvent else None
+            return value, expire_event
+
+    def contains(self, key: str) -> bool:
+        with self._locked(fcntl.LOCK_SH):
+            return key in self.entry_map
+
+    def clear(self):
+        with self._locked(fcntl.LOCK_EX):
+            self._rewrite([])
+
+    def close(self):
+        self._close_data()
+        self._lock_file.close()
@@ -0,0 +1,107 @@
+# A cache that every worker on the host shares.
+# Inserts are written through to the on-disk L2 cache so any worker can serve a page another worker rendered,
+# and events bump a shared, memory-mapped epoch counter so every worker drops its stale L1 copies,
+# no matter which worker the event was published in.
+
+import os
+import mmap
+import fcntl
+import struct
+import logging
+from pathlib import Path
+from typing import Any
+
+from star.cache.cache import Cache
+from star.cache.l2 import L2Cache
+from star.events import ServerEvent
+from star.settings import GLOBAL_CONFIGURATION
+
+logger = logging.getLogger('star.cache')
+
+
+class EventEpochs:
+    """
+    ### One shared counter per `ServerEvent`, bumped every time the event is published by any worker.
+    """
+
+    SLOT = struct.Struct('<Q')
+
+    path: Path
+    events: list[ServerEvent]
+
+    def __init__(self, path: Path | str):
+        self.path = Path(path)
+        self.events = list(ServerEvent)
+        self._slots = struct.Struct(f'<{len(self.events)}Q')
+
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._fd).st_size < self._slots.size:
+                os.ftruncate(self._fd, self._slots.size)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._mmap = mmap.mmap(self._fd, self._slots.size, access=mmap.ACCESS_WRITE)
+
+    def bump(self, event: ServerEvent):
+        offset = self.events.index(event) * self.SLOT.size
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            (epoch,) = self.SLOT.unpack_from(self._mmap, offset)
+            self.SLOT.pack_into(self._mmap, offset, epoch + 1)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def snapshot(self) -> tuple[int, ...]:
+        return self._slots.unpack_from(self._mmap, 0)
+
+    def close(self):
+        self._mmap.close()
+        os.close(self._fd)
+
+
+class SharedCache(Cache):
+    epochs: EventEpochs
+    seen_epochs: tuple[int, ...]
+
+    def __init__(self, l2_cache: L2Cache | None = None, epochs: EventEpochs | None = None):
+        if l2_cache is None:
+            l2_cache = L2Cache(GLOBAL_CONFIGURATION.require('l2_cache_path').get())
+        super().__init__(l2_cache)
+
+        if epochs is None:
+            epochs = EventEpochs(l2_cache.path.with_name(f'{l2_cache.path.name}.epochs'))
+        self.epochs = epochs
+        self.seen_epochs = self.epochs.snapshot()
+
+    def _sync(self):
+        # a few aligned integer reads from shared memory; cheap enough to do on every access
+        current_epochs = self.epochs.snapshot()
+        if current_epochs == self.seen_epochs:
+            return
+
+        for event, seen, current in zip(self.epochs.events, self.seen_epochs, current_epochs):
+            if seen != current:
+                logging.debug(f'Event {event} was published by another worker, expiring L1 keys')
+                self.l2_resident.difference_update(self.l1_cache.event(event))
+        self.seen_epochs = current_epochs
+
+    def _evicted(self, key: str, value: Any, expire_event: ServerEvent | None):
+        # everything was written through to L2 on insert already
+        self.l2_resident.discard(key)
+
+    def event(self, event: ServerEvent, data: Any = None):
+        # expire on disk before telling the other workers, otherwise they could re-promote the stale value
+        self.l2_cache.event(event)
+        self.epochs.bump(event)
+        self._sync()
+
+    def insert(self, key: str, value: Any, expire_event: ServerEvent | None = None):
+        self._sync()
+        super().insert(key, value, expire_event)
+        logging.debug(f"Writing '{key}' through to L2 cache")
+        self.l2_cache.insert(key, value, expire_event)
+
+    def get(self, key: str) -> Any | None:
+        self._sync()
+        return super().get(key)
@@ -0,0 +1,47 @@
+import sys
+import objsize
+from typing import Any
+
+
+class SizeStrategy:
+    """
+    ### Estimates how many bytes a cached value occupies.
+    """
+
+    def size(self, value: Any) -> int:
+        raise NotImplementedError()
+
+
+class DeepSize(SizeStrategy):
+    """
+    ### Walks the entire object graph of a value. Exact, but slow for large values.
+    """
+
+    def size(self, value: Any) -> int:
+        return objsize.get_deep_size(value)
+
+
+class FastSize(SizeStrategy):
+    """
+    ### Constant-time sizes for the values we cache the most, deep walks for everything else.
+
+    Strings and bytes report their allocated size directly. Small tuples (rendered pages are cached as
+    `(html, timestamp)`) are summed item by item. Anything else falls back to `fallback`.
+    """
+
+    MAX_TUPLE_LENGTH: int = 8
+    FIXED_SIZE_TYPES: tuple[type, ...] = (str, bytes, int, float, bool, type(None))
+
+    fallback: SizeStrategy
+
+    def __init__(self, fallback: SizeStrategy | None = None):
+        self.fallback = fallback if fallback is not None else DeepSize()
+
+    def size(self, value: Any) -> int:
+        value_type = type(value)
+        if value_type in self.FIXED_SIZE_TYPES:
+            # str/bytes keep their length in the object header, so this is O(1)
+            return sys.getsizeof(value)
+        if value_type is tuple and len(value) <= self.MAX_TUPLE_LENGTH:
+            return sys.getsizeof(value) + sum(self.size(item) for item in value)
+        return self.fallback.size(value)
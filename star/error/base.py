@@ -11,7 +11,7 @@ class ServerError(Exception):
         return {}
 
     def as_response_code(self) -> WebResponse:
-        return WebResponse(status=self.status(), from_exception=self)
+        return WebResponse(status=self.status(), headers=self.headers(), from_exception=self)
 
     def __init__(self, message: str, status: int = 500):
         super().__init__(message)
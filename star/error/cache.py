@@ -9,3 +9,8 @@ class CacheMiss(ServerError):
 class L1CacheMiss(CacheMiss):
     def __init__(self, key: str):
         super().__init__(f'L1 Cache miss for key: {key}')
+
+
+class L2CacheMiss(CacheMiss):
+    def __init__(self, key: str):
+        super().__init__(f'L2 Cache miss for key: {key}')
@@ -1,4 +1,4 @@
-from star.error.base import ClientError
+from star.error.base import ClientError, ConflictError, NotFoundError
 
 
 class BadArguments(ClientError):
@@ -39,3 +39,18 @@ class UploadError(ClientError):
 
     def __init__(self, reason: str):
         super().__init__(f'Something went wrong with the upload: {reason}')
+
+
+class UploadSessionNotFound(NotFoundError):
+    def __init__(self, uuid: str):
+        super().__init__(f'upload session "{uuid}"')
+
+
+class UploadSessionMismatch(ConflictError):
+    def __init__(self, uuid: str, reason: str):
+        super().__init__(f'upload session "{uuid}" {reason}')
+
+
+class UploadSessionCompleted(ConflictError):
+    def __init__(self, uuid: str):
+        super().__init__(f'upload session "{uuid}" has already been completed')
@@ -14,3 +14,8 @@ class SubprocessNotFound(SubprocessError):
 class SubprocessFailed(SubprocessError):
     def __init__(self, subprocess: str, reason: str):
         super().__init__(f"process '{subprocess}' didn't exist successfully\n\t{reason}")
+
+
+class SubprocessTimeout(SubprocessError):
+    def __init__(self, subprocess: str, reason: str):
+        super().__init__(f"process '{subprocess}' was killed because it {reason}")
@@ -34,3 +34,15 @@ class InvalidFileFormat(TranscribeError):
 
     def __init__(self):
         super().__init__('Uploaded file not in a valid supplied format')
+
+
+class TranscriptionBacklogFull(TranscribeError):
+    def status(self) -> int:
+        return 429
+
+    def headers(self) -> dict[str, str]:
+        return {'Retry-After': str(self.retry_after_seconds)}
+
+    def __init__(self, retry_after_seconds: int):
+        self.retry_after_seconds = retry_after_seconds
+        super().__init__('Too many videos are waiting to be transcribed, try again later')
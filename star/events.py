@@ -1,6 +1,22 @@
+import os
+import json
+import socket
+import pickle
+import asyncio
+import logging
+import datetime
+import contextlib
+import uuid
 from enum import StrEnum
+from pathlib import Path
 from typing import Any
-from collections.abc import Callable
+from collections.abc import Callable, AsyncIterator
+from sqlalchemy import select, delete
+from sqlalchemy.orm import sessionmaker, Session
+
+from star.models.events import BrokerEvent, ORIGIN_LENGTH
+
+logger = logging.getLogger('star')
 
 
 class ServerEvent(StrEnum):
@@ -8,25 +24,252 @@ class ServerEvent(StrEnum):
     VIDEO_UPLOADED = 'upload'
     VIDEO_STATE_CHANGE = 'video state changed'
     VIDEO_TRANSCRIPT_COMPLETED = 'video transcript completed'
+    VIDEO_QUEUE_POSITION = 'video queue position'
+    VIDEO_TRANSCRIPT_SEGMENT = 'video transcript segment'
+
+
+class BrokerTransport:
+    """
+    ### Carries published events to the brokers in other processes.
+    """
+
+    def attach(self, deliver: Callable[[ServerEvent, Any], None]):
+        self._deliver = deliver
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        pass
+
+    def stop(self):
+        pass
+
+    def send(self, event: ServerEvent, data: Any):
+        raise NotImplementedError()
+
+
+class UnixSocketTransport(BrokerTransport):
+    """
+    ### Fans events out to every process with a socket in `directory`.
+
+    Each process binds a datagram socket in a shared, private directory. Publishing sends the pickled event to
+    every other socket in it; sockets whose process has gone away are cleaned up as they're found.
+    """
+
+    directory: Path
+    path: Path
+
+    def __init__(self, directory: Path | str):
+        self.directory = Path(directory)
+        self.directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+        self.path = self.directory / f'{os.getpid()}-{uuid.uuid4().hex[:8]}.sock'
+
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._socket.bind(str(self.path))
+        self._socket.setblocking(False)
+        self._loop = None
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        loop.add_reader(self._socket.fileno(), self._receive)
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.remove_reader(self._socket.fileno())
+            self._loop = None
+        self._socket.close()
+        self.path.unlink(missing_ok=True)
+
+    def _receive(self):
+        while True:
+            try:
+                payload = self._socket.recv(65536)
+            except BlockingIOError:
+                return
+
+            try:
+                event, data = pickle.loads(payload)
+            except Exception as e:
+                logger.warning(f'Dropping malformed broker message: {e}')
+                continue
+            self._deliver(event, data)
+
+    def send(self, event: ServerEvent, data: Any):
+        payload = pickle.dumps((event, data), protocol=pickle.HIGHEST_PROTOCOL)
+        for peer in self.directory.glob('*.sock'):
+            if peer == self.path:
+                continue
+            try:
+                self._socket.sendto(payload, str(peer))
+            except (ConnectionRefusedError, FileNotFoundError):
+                logger.debug(f'Broker peer {peer.name} is gone, removing it')
+                peer.unlink(missing_ok=True)
+            except BlockingIOError:
+                logger.warning(f'Broker peer {peer.name} is not keeping up, dropping {event}')
+            except OSError as e:
+                logger.warning(f'Failed to send {event} to broker peer {peer.name}: {e}')
+
+
+class DatabaseTransport(BrokerTransport):
+    """
+    ### Fans events out to every process that shares the database, on whichever node it runs.
+
+    Publishing inserts the event into `broker_events`, and every process reads the rows it didn't write every
+    `poll_seconds`. Rows that commit out of order are still picked up as long as they show up within
+    `settle_seconds`, and every process deletes rows once they are `retention_seconds` old. Events are stored as
+    JSON rather than pickled, since whoever can write to the database shouldn't be able to run code in every process.
+    """
+
+    sessions: sessionmaker[Session]
+    origin: str
+    poll_seconds: float
+    settle_seconds: float
+    retention_seconds: float
+
+    def __init__(
+        self,
+        sessions: sessionmaker[Session],
+        poll_seconds: float = 1,
+        settle_seconds: float = 10,
+        retention_seconds: float = 300,
+    ):
+        self.sessions = sessions
+        self.origin = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'[-ORIGIN_LENGTH:]
+        self.poll_seconds = poll_seconds
+        self.settle_seconds = settle_seconds
+        self.retention_seconds = max(retention_seconds, settle_seconds)
+        # the rows already delivered that are still recent enough to be read again, by when they were created
+        self._seen: dict[int, datetime.datetime] = {}
+        self._task = None
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        try:
+            # whatever was published before we started is not ours to deliver
+            self._receive(deliver=False)
+        except Exception as e:
+            logger.warning(f'Failed to read the broker events table: {e}')
+        self._task = loop.create_task(self._poll())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(self.poll_seconds)
+            try:
+                self._receive()
+            except Exception as e:
+                # the database going away shouldn't stop us picking events back up once it returns
+                logger.warning(f'Failed to read the broker events table: {e}')
+
+    def _receive(self, deliver: bool = True):
+        now = utcnow()
+        settled = now - datetime.timedelta(seconds=self.settle_seconds)
+        with self.sessions.begin() as session:
+            query = select(BrokerEvent).where(BrokerEvent.created >= settled).order_by(BrokerEvent.id)
+            rows = [row for row in session.scalars(query) if row.id not in self._seen]
+            for row in rows:
+                self._seen[row.id] = row.created
+            session.expunge_all()
+            session.execute(
+                delete(BrokerEvent).where(BrokerEvent.created < now - datetime.timedelta(seconds=self.retention_seconds))
+            )
+        self._seen = {id: created for id, created in self._seen.items() if created >= settled}
+
+        for row in rows:
+            if not deliver or row.origin == self.origin:
+                continue
+            try:
+                event, data = ServerEvent(row.event), json.loads(row.data)
+            except ValueError as e:
+                logger.warning(f'Dropping malformed broker event {row.id}: {e}')
+                continue
+            self._deliver(event, data)
+
+    def send(self, event: ServerEvent, data: Any):
+        try:
+            with self.sessions.begin() as session:
+                session.add(BrokerEvent(created=utcnow(), origin=self.origin, event=event, data=json.dumps(data, default=str)))
+        except Exception as e:
+            logger.warning(f'Failed to send {event} through the database: {e}')
+
+
+def utcnow() -> datetime.datetime:
+    return datetime.datetime.now(datetime.UTC).replace(tzinfo=None)
 
 
 class Broker:
-    def __init__(self):
+    def __init__(self, transport: BrokerTransport | None = None):
         self.subscribers = {}
         self.global_subscribers = []
+        self.local_subscribers = []
+        self.transport = transport
+        if self.transport is not None:
+            self.transport.attach(self._deliver)
 
-    def subscribe_all(self, callback: Callable[[ServerEvent, Any], None]):
-        self.global_subscribers.append(callback)
+    def subscribe_all(self, callback: Callable[[ServerEvent, Any], None], include_remote: bool = True):
+        if include_remote:
+            self.global_subscribers.append(callback)
+        else:
+            self.local_subscribers.append(callback)
 
     def subscribe(self, event: ServerEvent, callback: Callable[[ServerEvent, Any], None]):
         if event not in self.subscribers:
             self.subscribers[event] = []
         self.subscribers[event].append(callback)
 
-    def publish(self, event: ServerEvent, data=None):
+    def unsubscribe(self, event: ServerEvent, callback: Callable[[ServerEvent, Any], None]):
+        if event not in self.subscribers:
+            return
+        if callback in self.subscribers[event]:
+            self.subscribers[event].remove(callback)
+        if len(self.subscribers[event]) == 0:
+            del self.subscribers[event]
+
+    @contextlib.asynccontextmanager
+    async def listen(self, *events: ServerEvent, maxsize: int = 64) -> AsyncIterator[asyncio.Queue]:
+        # Subscribe to `events` for the lifetime of the context, receiving (event, data) pairs through a queue.
+        # Events can be published from anywhere, so they're always handed to the queue on the listener's loop
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=maxsize)
+
+        def put(event: ServerEvent, data: Any):
+            try:
+                queue.put_nowait((event, data))
+            except asyncio.QueueFull:
+                logger.warning(f'Listener is not keeping up, dropping {event}')
+
+        def enqueue(event: ServerEvent, data: Any):
+            loop.call_soon_threadsafe(put, event, data)
+
+        for event in events:
+            self.subscribe(event, enqueue)
+        try:
+            yield queue
+        finally:
+            for event in events:
+                self.unsubscribe(event, enqueue)
+
+    def start(self):
+        if self.transport is not None:
+            self.transport.start(asyncio.get_running_loop())
+
+    def stop(self):
+        if self.transport is not None:
+            self.transport.stop()
+
+    def _deliver(self, event: ServerEvent, data=None):
         if event in self.subscribers:
             for callback in self.subscribers[event]:
                 callback(event, data)
 
         for callback in self.global_subscribers:
             callback(event, data)
+
+    def publish(self, event: ServerEvent, data=None):
+        self._deliver(event, data)
+        for callback in self.local_subscribers:
+            callback(event, data)
+
+        if self.transport is not None:
+            self.transport.send(event, data)
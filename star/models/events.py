@@ -0,0 +1,20 @@
+from sqlalchemy import DateTime, String, Text
+from sqlalchemy.orm import Mapped, mapped_column
+import datetime
+
+from star.models import Base
+
+ORIGIN_LENGTH = 64
+EVENT_LENGTH = 64
+
+
+class BrokerEvent(Base):
+    # see `star.events.DatabaseTransport`
+    __tablename__ = 'broker_events'
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    # UTC, so that processes on every node agree on how old an event is
+    created: Mapped[datetime.datetime] = mapped_column(DateTime(timezone=False), nullable=False, index=True)
+    origin: Mapped[str] = mapped_column(String(ORIGIN_LENGTH), nullable=False)
+    event: Mapped[str] = mapped_column(String(EVENT_LENGTH), nullable=False)
+    data: Mapped[str] = mapped_column(Text(), nullable=False)
@@ -1,18 +1,23 @@
-from sqlalchemy import UUID as SqlUUID, DateTime, String, ForeignKey
+from sqlalchemy import UUID as SqlUUID, DateTime, String, ForeignKey, Index, Float, JSON
 from sqlalchemy.orm import Mapped, mapped_column
 from uuid import UUID, uuid4
 import datetime
 
 from star.models import Base
-from star.transcribe.state import VideoState
+from star.transcribe.state import VideoState, JobState
 
 LANGUAGE_LENGTH = 8
 NAME_LENGTH = 256
 PATH_LENGTH = 96
+HASH_LENGTH = 64
+UPLOAD_PATH_LENGTH = 512
+OWNER_LENGTH = 64
 
 
 class Video(Base):
     __tablename__ = 'videos'
+    # the video list is paged by id and optionally filtered by state
+    __table_args__ = (Index('ix_videos_state_id', 'state', 'id'),)
 
     id: Mapped[int] = mapped_column(primary_key=True)
     uuid: Mapped[UUID] = mapped_column(SqlUUID(), nullable=False, unique=True, default=uuid4)
@@ -20,6 +25,11 @@ class Video(Base):
     title: Mapped[str] = mapped_column(String(NAME_LENGTH), nullable=False)
     state: Mapped[VideoState] = mapped_column(nullable=False, default=VideoState.PENDING)
     transcript: Mapped[int | None] = mapped_column(ForeignKey('transcriptions.id'), nullable=True)
+    # see `star.transcribe.upload.HASH_BLOCK_SIZE`
+    content_hash: Mapped[str | None] = mapped_column(String(HASH_LENGTH), nullable=True, index=True)
+    # `star.transcribe.metadata.ProbeMetadata`, None until the upload has been probed
+    probe: Mapped[dict | None] = mapped_column(JSON(), nullable=True)
+    duration: Mapped[float | None] = mapped_column(Float(), nullable=True)
 
 
 class Transcription(Base):
@@ -30,3 +40,24 @@ class Transcription(Base):
     created: Mapped[datetime.datetime] = mapped_column(DateTime(timezone=False), nullable=False, default=datetime.datetime.now)
     language: Mapped[str] = mapped_column(String(LANGUAGE_LENGTH), nullable=False)
     path: Mapped[str] = mapped_column(String(PATH_LENGTH), nullable=False)
+
+
+class TranscriptionJob(Base):
+    __tablename__ = 'transcription_jobs'
+    # workers claim the shortest queued job first
+    __table_args__ = (Index('ix_transcription_jobs_state_duration_id', 'state', 'duration', 'id'),)
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    video: Mapped[int] = mapped_column(ForeignKey('videos.id'), nullable=False, unique=True)
+    created: Mapped[datetime.datetime] = mapped_column(DateTime(timezone=False), nullable=False, default=datetime.datetime.now)
+    state: Mapped[JobState] = mapped_column(nullable=False, default=JobState.QUEUED)
+    # the uploaded file, which every worker must be able to reach at the same path
+    video_path: Mapped[str] = mapped_column(String(UPLOAD_PATH_LENGTH), nullable=False)
+    # None when ffprobe couldn't time the video
+    duration: Mapped[float | None] = mapped_column(Float(), nullable=True)
+    language: Mapped[str] = mapped_column(String(LANGUAGE_LENGTH), nullable=False, default='unknown', server_default='unknown')
+    attempts: Mapped[int] = mapped_column(nullable=False, default=0)
+    # lease times are UTC so that workers on every node agree on them
+    lease_owner: Mapped[str | None] = mapped_column(String(OWNER_LENGTH), nullable=True)
+    lease_expires: Mapped[datetime.datetime | None] = mapped_column(DateTime(timezone=False), nullable=True)
+    heartbeat: Mapped[datetime.datetime | None] = mapped_column(DateTime(timezone=False), nullable=True)
@@ -20,6 +20,21 @@ state = State()
 define_endpoints(app)
 
 
+@app.before_serving
+async def start_broker():
+    state.broker.start()
+
+
+@app.after_serving
+async def stop_broker():
+    state.broker.stop()
+
+
+@app.after_serving
+async def stop_transcribers():
+    await state.transcribers.close()
+
+
 def run():
     if ENVIRONMENT.use_ssl():
         app.logger.info('using ssl...')
@@ -4,8 +4,10 @@ from sqlalchemy.orm import sessionmaker, Session
 
 from star.environment import ENVIRONMENT
 from star.settings import GLOBAL_CONFIGURATION
-from star.cache import Cache
-from star.events import Broker
+from star.cache import Cache, SharedCache
+from star.events import Broker, UnixSocketTransport, DatabaseTransport
+from star.transcribe.scheduler import TranscriptionScheduler
+from star.transcribe.pool import TranscriberPool
 
 
 class DatabaseConnection:
@@ -18,6 +20,8 @@ class State:
     state: Self = None  # ty: ignore[invalid-assignment]
     cache: Cache = None  # ty: ignore[invalid-assignment]
     broker: Broker = None  # ty: ignore[invalid-assignment]
+    scheduler: TranscriptionScheduler = None  # ty: ignore[invalid-assignment]
+    transcribers: TranscriberPool = None  # ty: ignore[invalid-assignment]
 
     def _connection(self) -> str:
         return ENVIRONMENT.db_connection()
@@ -26,9 +30,6 @@ class State:
         return create_engine(f'{self._connection()}/{db_name}', echo=echo)
 
     def __init__(self):
-        State.broker = Broker()
-        State.cache = Cache()
-
         self.engine_map = {}
         State.state = self
 
@@ -36,7 +37,37 @@ class State:
             self.default_database = GLOBAL_CONFIGURATION['db_name']
             self.register_database(self.default_database, echo=False)
 
-        State.broker.subscribe_all(self.cache.event)
+        broker_transport = GLOBAL_CONFIGURATION.get('broker_transport', 'local')
+        if broker_transport == 'unix':
+            # fan events out to the other workers on this host
+            State.broker = Broker(UnixSocketTransport(GLOBAL_CONFIGURATION.require('broker_socket_dir').get()))
+        elif broker_transport == 'database':
+            # fan events out to every process on every node, which transcription workers on other nodes need
+            State.broker = Broker(
+                DatabaseTransport(
+                    self.Session,
+                    poll_seconds=float(GLOBAL_CONFIGURATION.get('broker_poll_seconds', 1)),
+                    retention_seconds=float(GLOBAL_CONFIGURATION.get('broker_retention_seconds', 300)),
+                )
+            )
+        else:
+            State.broker = Broker()
+
+        State.scheduler = TranscriptionScheduler(State.broker)
+        State.transcribers = TranscriberPool()
+
+        if GLOBAL_CONFIGURATION.get('cache_backend', 'local') == 'shared':
+            # every worker on the host reads and invalidates the same cache
+            State.cache = SharedCache()
+        else:
+            State.cache = Cache()
+
+        # a shared cache already invalidates every worker on this host, so it only needs the events published here,
+        # unless events also come in from other hosts
+        State.broker.subscribe_all(
+            self.cache.event,
+            include_remote=not isinstance(self.cache, SharedCache) or isinstance(State.broker.transport, DatabaseTransport),
+        )
 
     def register_database(self, database_name: str, echo=False):
         self.engine_map[database_name] = DatabaseConnection(self._setup_engine(echo=echo, db_name=database_name))
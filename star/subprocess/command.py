@@ -3,18 +3,37 @@ import copy
 import subprocess
 import asyncio
 import asyncio.subprocess
+import contextlib
+import collections
+import signal
+import tempfile
 import os
-from typing import Any
-from collections.abc import Iterable
+import re
+from typing import Any, Literal
+from collections.abc import Iterable, AsyncIterator
 from pathlib import Path
 
 from star.environment import ENVIRONMENT
 from star.subprocess.helpers import can_call_as_command
-from star.error import SubprocessNotFound, SubprocessFailed
+from star.subprocess.resources import Resources
+from star.subprocess.limiter import ProcessLimiter
+from star.error import SubprocessNotFound, SubprocessFailed, SubprocessTimeout
 
 
 logger = logging.getLogger('star.subprocess')
 
+STDOUT = 'stdout'
+STDERR = 'stderr'
+Source = Literal['stdout', 'stderr']
+
+# ffmpeg redraws its progress with carriage returns, so those end a line too
+LINE_BREAK = re.compile(rb'\r\n|\r|\n')
+READ_SIZE = 64 * 1024
+# lines waiting for a slow consumer; past this the process blocks on its pipe rather than us buffering it all
+STREAM_BACKLOG = 64
+# how much of stderr is kept to explain a failure
+STDERR_TAIL_LINES = 20
+
 
 class Command:
     RUNNER: str = ''
@@ -31,6 +50,19 @@ class Command:
 
     WORKING_DIRECTORY: str | None = os.getcwd()
 
+    # how the process is allowed to run; see `star.subprocess.resources.Resources`
+    CPU_AFFINITY: frozenset[int] = frozenset()
+    NICE: int = 0
+    IONICE: tuple[int, int] | None = None
+    RLIMITS: dict[int, tuple[int, int]] = {}
+    ENVIRONMENT_VARIABLES: dict[str, str] = {}
+
+    # At most MAX_PROCESSES of the commands sharing a SLOT_GROUP (their COMMAND if None) run at once on this host,
+    # across every worker; 0 is no limit. Waiting calls go lowest PRIORITY first. See `star.subprocess.limiter`
+    SLOT_GROUP: str | None = None
+    MAX_PROCESSES: int = 0
+    PRIORITY: int = 0
+
     @classmethod
     def locate(cls) -> str:
         if cls.GUARANTEE_CAN_RUN or cls.RUNNER != '':
@@ -152,6 +184,20 @@ class Command:
             final_command = command_prefix + commands + list(args)
         return [c if isinstance(c, str) else str(c) for c in final_command]
 
+    @classmethod
+    def resources(cls) -> Resources:
+        return Resources(
+            cpu_affinity=cls.CPU_AFFINITY,
+            nice=cls.NICE,
+            ionice=cls.IONICE,
+            rlimits=cls.RLIMITS,
+            environment=cls.ENVIRONMENT_VARIABLES,
+        )
+
+    @classmethod
+    def limiter(cls) -> ProcessLimiter:
+        return ProcessLimiter.of(cls.SLOT_GROUP or cls.COMMAND, cls.MAX_PROCESSES)
+
     @classmethod
     def dryrun(cls, *args, **kwargs) -> str:
         command = cls._get_command(*args, **kwargs)
@@ -160,18 +206,37 @@ class Command:
 
     @classmethod
     def call(cls, *args, **kwargs) -> Any:
-        runner = Runner(cls._get_command(*args, **kwargs))
+        runner = Runner(cls._get_command(*args, **kwargs), cls.resources())
         logger.info(f'Calling `{" ".join(runner.command)}` (synchronous) with args={args}, kwargs={kwargs}')
-        stdout, stderr = runner.call(cls.WORKING_DIRECTORY)
+        with cls.limiter().hold():
+            stdout, stderr = runner.call(cls.WORKING_DIRECTORY)
         return cls._interpret_results(stdout, stderr)
 
     @classmethod
-    async def acall(cls, *args, **kwargs) -> Any:
-        runner = Runner(cls._get_command(*args, **kwargs))
+    async def acall(cls, *args, timeout: float | None = None, **kwargs) -> Any:
+        runner = Runner(cls._get_command(*args, **kwargs), cls.resources())
         logger.info(f'Calling `{" ".join(runner.command)}` (asynchronous) with args={args}, kwargs={kwargs}')
-        stdout, stderr = await runner.acall(cls.WORKING_DIRECTORY)
+        async with cls.limiter().slot(cls.PRIORITY):
+            stdout, stderr = await runner.acall(cls.WORKING_DIRECTORY, timeout=timeout)
         return cls._interpret_results(stdout, stderr)
 
+    @classmethod
+    async def astream(
+        cls, *args, timeout: float | None = None, idle_timeout: float | None = None, **kwargs
+    ) -> AsyncIterator[Any]:
+        # Yields what `_map_stdout` and `_map_stderr` make of each line as it is printed, skipping the lines they
+        # map to None. See `Runner.astream` for the timeouts
+        runner = Runner(cls._get_command(*args, **kwargs), cls.resources())
+        logger.info(f'Streaming `{" ".join(runner.command)}` with args={args}, kwargs={kwargs}')
+        async with cls.limiter().slot(cls.PRIORITY):
+            async for source, line in runner.astream(cls.WORKING_DIRECTORY, timeout=timeout, idle_timeout=idle_timeout):
+                try:
+                    record = cls._map_stdout(line) if source == STDOUT else cls._map_stderr(line)
+                except NotImplementedError:
+                    continue
+                if record is not None:
+                    yield record
+
     def __call__(self, *args, **kwargs) -> Any:
         return self.call(*args, **kwargs)
 
@@ -192,9 +257,11 @@ class DryCommand(Command):
 
 class Runner:
     _command: list[str]
+    resources: Resources
 
-    def __init__(self, command: Iterable[str]):
+    def __init__(self, command: Iterable[str], resources: Resources = Resources()):
         self._command = list(command)
+        self.resources = resources
 
     @property
     def command(self) -> list[str]:
@@ -206,7 +273,9 @@ class Runner:
 
     def call(self, working_directory: str | None) -> Any:
         logger.info(f'Calling `{" ".join(self.command)}` [cwd: {working_directory}] (synchronous)')
-        result = subprocess.run(args=self.command, capture_output=True, cwd=working_directory)
+        result = subprocess.run(
+            args=self.command, capture_output=True, cwd=working_directory, **self.resources.spawn_options()
+        )
         try:
             result.check_returncode()
         except subprocess.CalledProcessError as e:
@@ -220,16 +289,49 @@ class Runner:
             ) from e
         return result.stdout.decode(), result.stderr.decode()
 
-    async def acall(self, working_directory: str | None) -> Any:
-        logger.info(f'Calling `{" ".join(self.command)}` [cwd: {working_directory}] (asynchronous)')
+    @property
+    def stages(self) -> list[list[str]]:
+        return [self.command]
+
+    @contextlib.asynccontextmanager
+    async def _spawn(self, working_directory: str | None) -> AsyncIterator[list[asyncio.subprocess.Process]]:
+        # The process leads its own group so that anything it starts goes down with it. If we stop waiting on it
+        # for any reason, cancellation included, the whole group is killed
         process = await asyncio.create_subprocess_exec(
             *self.command,
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.PIPE,
-            cwd=working_directory
+            cwd=working_directory,
+            start_new_session=True,
+            **self.resources.spawn_options(),
         )  # ty: ignore[missing-argument]
+        try:
+            yield [process]
+        finally:
+            await self._kill([process])
+
+    async def _kill(self, processes: list[asyncio.subprocess.Process]):
+        # every process leads a group of its own
+        if any(process.returncode is None for process in processes):
+            logger.warning(f'Killing `{" ".join(self.command)}` and its children')
+            for process in processes:
+                with contextlib.suppress(ProcessLookupError):
+                    os.killpg(process.pid, signal.SIGKILL)
+            await asyncio.shield(asyncio.gather(*(process.wait() for process in processes)))
+
+    def _check_exit(self, returncodes: list[int | None], stderr: str):
+        failed = [f'`{" ".join(stage)}` exited with {code}' for stage, code in zip(self.stages, returncodes) if code != 0]
+        if failed:
+            raise SubprocessFailed(' '.join(self.command), f'{", ".join(failed)}\n\tstderr={stderr}')
+
+    async def acall(self, working_directory: str | None, timeout: float | None = None) -> Any:
+        logger.info(f'Calling `{" ".join(self.command)}` [cwd: {working_directory}] (asynchronous)')
+        async with self._spawn(working_directory) as (process,):
+            try:
+                stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+            except TimeoutError as e:
+                raise SubprocessTimeout(' '.join(self.command), f'was still running after {timeout}s') from e
 
-        stdout, stderr = await process.communicate()
         if process.returncode != 0:
             raise SubprocessFailed(
                 ' '.join(self.command),
@@ -240,13 +342,175 @@ class Runner:
             )
         return stdout.decode(), stderr.decode()
 
+    async def astream(
+        self, working_directory: str | None, *, timeout: float | None = None, idle_timeout: float | None = None
+    ) -> AsyncIterator[tuple[Source, str]]:
+        """
+        ### Yields `(source, line)` for every line the process prints, as it prints it.
+
+        The process is killed once `timeout` seconds have passed since it started, or once it has gone `idle_timeout`
+        seconds without printing anything, and also if the caller stops iterating early. Either timeout raises
+        `SubprocessTimeout`; exiting with anything but 0 raises `SubprocessFailed` with the end of stderr.
+        """
+        logger.info(f'Streaming `{" ".join(self.command)}` [cwd: {working_directory}]')
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        stderr_tail = collections.deque(maxlen=STDERR_TAIL_LINES)
+
+        async with self._spawn(working_directory) as processes:
+            lines = asyncio.Queue(maxsize=STREAM_BACKLOG)
+            # only the last process prints to us, but all of them can complain
+            readers = [
+                asyncio.create_task(_read_lines(processes[-1].stdout, STDOUT, lines)),
+                *(asyncio.create_task(_read_lines(process.stderr, STDERR, lines)) for process in processes),
+            ]
+            try:
+                open_streams = len(readers)
+                while open_streams > 0:
+                    wait = idle_timeout
+                    if deadline is not None:
+                        wait = deadline - loop.time() if wait is None else min(wait, deadline - loop.time())
+                    try:
+                        source, line = await asyncio.wait_for(lines.get(), wait)
+                    except TimeoutError as e:
+                        if deadline is not None and loop.time() >= deadline:
+                            raise SubprocessTimeout(' '.join(self.command), f'was still running after {timeout}s') from e
+                        raise SubprocessTimeout(' '.join(self.command), f'printed nothing for {idle_timeout}s') from e
+
+                    if line is None:
+                        open_streams -= 1
+                        continue
+                    if source == STDERR:
+                        stderr_tail.append(line)
+                    yield source, line
+
+                # every pipe is closed, so they are exiting; only the deadline still applies
+                exiting = asyncio.gather(*(process.wait() for process in processes))
+                try:
+                    await asyncio.wait_for(exiting, None if deadline is None else max(deadline - loop.time(), 0))
+                except TimeoutError as e:
+                    raise SubprocessTimeout(' '.join(self.command), f'was still running after {timeout}s') from e
+            finally:
+                for reader in readers:
+                    reader.cancel()
+
+        self._check_exit([process.returncode for process in processes], ' '.join(stderr_tail))
+
+
+async def _read_lines(stream: asyncio.StreamReader, source: Source, lines: asyncio.Queue):
+    # Puts each non-empty line of `stream` on `lines`, then None once it is closed
+    buffer = b''
+    while chunk := await stream.read(READ_SIZE):
+        *complete, buffer = LINE_BREAK.split(buffer + chunk)
+        for line in complete:
+            if line:
+                await lines.put((source, line.decode(errors='replace')))
+    if buffer:
+        await lines.put((source, buffer.decode(errors='replace')))
+    await lines.put((source, None))
+
 
 class Chain(Runner):
-    def __init__(self, *commands: str):
-        command = []
-        for sub_command in commands:
-            command.extend(sub_command)
-        super().__init__(command)
+    """
+    ### Runs commands as a pipeline, each one's stdout feeding the next one's stdin, like `a | b | c` in a shell.
+
+    Nothing passes through us or the disk between stages; we only read the last stage's stdout and everybody's
+    stderr. Like `set -o pipefail`, the chain fails if any stage does, and the error names each stage that failed
+    and its exit code. Each stage leads its own process group, and they are all killed together.
+    """
+
+    _stages: list[list[str]]
+
+    def __init__(self, *commands: Iterable[str], resources: Resources = Resources()):
+        # `resources` apply to every stage
+        self._stages = [list(command) for command in commands]
+        if len(self._stages) == 0:
+            raise ValueError('a chain needs at least one command')
+        super().__init__([part for stage in self._stages for part in [*stage, '|']][:-1], resources)
+
+    @property
+    def stages(self) -> list[list[str]]:
+        return self._stages
+
+    def call(self, working_directory: str | None) -> Any:
+        logger.info(f'Calling `{" ".join(self.command)}` [cwd: {working_directory}] (synchronous)')
+        processes: list[subprocess.Popen] = []
+        stderr_files = [tempfile.TemporaryFile() for _ in self.stages]
+        try:
+            stdin = None
+            for stage, stderr_file in zip(self.stages, stderr_files):
+                processes.append(
+                    subprocess.Popen(
+                        stage,
+                        stdin=stdin,
+                        stdout=subprocess.PIPE,
+                        stderr=stderr_file,
+                        cwd=working_directory,
+                        **self.resources.spawn_options(),
+                    )
+                )
+                if stdin is not None:
+                    # the next stage holds it now; letting go means a stage whose reader exits gets SIGPIPE
+                    stdin.close()
+                stdin = processes[-1].stdout
+            stdout, _ = processes[-1].communicate()
+            for process in processes:
+                process.wait()
+
+            stderr = []
+            for stderr_file in stderr_files:
+                stderr_file.seek(0)
+                stderr.append(stderr_file.read().decode())
+        finally:
+            for process in processes:
+                if process.poll() is None:
+                    process.kill()
+                    process.wait()
+            for stderr_file in stderr_files:
+                stderr_file.close()
+
+        self._check_exit([process.returncode for process in processes], ' '.join(stderr).strip().replace('\n', ' '))
+        return stdout.decode(), ''.join(stderr)
+
+    @contextlib.asynccontextmanager
+    async def _spawn(self, working_directory: str | None) -> AsyncIterator[list[asyncio.subprocess.Process]]:
+        processes: list[asyncio.subprocess.Process] = []
+        stdin = None
+        try:
+            for idx, stage in enumerate(self.stages):
+                last = idx == len(self.stages) - 1
+                read_end, write_end = (None, None) if last else os.pipe()
+                try:
+                    processes.append(
+                        await asyncio.create_subprocess_exec(
+                            *stage,
+                            stdin=stdin,
+                            stdout=asyncio.subprocess.PIPE if last else write_end,
+                            stderr=asyncio.subprocess.PIPE,
+                            cwd=working_directory,
+                            start_new_session=True,
+                            **self.resources.spawn_options(),
+                        )  # ty: ignore[missing-argument]
+                    )
+                finally:
+                    # the stages hold their own copies of the pipe; ours would keep it open after a stage exits
+                    if stdin is not None:
+                        os.close(stdin)
+                    if write_end is not None:
+                        os.close(write_end)
+                    stdin = read_end
+            yield processes
+        finally:
+            if stdin is not None:
+                os.close(stdin)
+            await self._kill(processes)
+
+    async def acall(self, working_directory: str | None, timeout: float | None = None) -> Any:
+        # `communicate` only talks to one process, so this collects the streamed lines instead
+        stdout, stderr = [], []
+        async for source, line in self.astream(working_directory, timeout=timeout):
+            (stdout if source == STDOUT else stderr).append(line)
+        return '\n'.join(stdout), '\n'.join(stderr)
 
 
 def define_process(process, *, command: list | None = None, return_instance: bool = True):
@@ -1,26 +1,58 @@
 from star.subprocess.command import Command, define_process
+from star.subprocess.resources import IOPRIO_CLASS_BEST_EFFORT, limits, parse_cpus
+from star.subprocess.limiter import FFMPEG_SLOT_GROUP, FFMPEG_MAX_PROCESSES
+from star.settings import GLOBAL_CONFIGURATION
 import logging
+import re
 
 logger = logging.getLogger('star.command.ffprobe')
 
+# what `-progress` prints for how far into the input ffmpeg has got, in microseconds
+PROGRESS_KEY = 'out_time_us='
+PROGRESS_LINE = re.compile(r'\w+=\S*')
+
 
 class Ffmpeg(Command):
     COMMAND = 'ffmpeg'
 
+    # decoding is background work too, though it is short enough to only need to yield to the web workers
+    CPU_AFFINITY = parse_cpus(GLOBAL_CONFIGURATION.get('ffmpeg_cpus', ''))
+    NICE = int(GLOBAL_CONFIGURATION.get('ffmpeg_nice', 5))
+    IONICE = (IOPRIO_CLASS_BEST_EFFORT, 7)
+    RLIMITS = limits(cpu_seconds=int(GLOBAL_CONFIGURATION.get('ffmpeg_cpu_seconds', 0)))
+
+    # shares its slots with ffprobe, which goes first since it's over in a moment
+    SLOT_GROUP = FFMPEG_SLOT_GROUP
+    MAX_PROCESSES = FFMPEG_MAX_PROCESSES
+    PRIORITY = 10
+
     KEYWORD_PREFIX = '-'
     KEYWORD_ARGUMENTS = {
         'i': str,
         'vn': None,
         'acodec': str,
-        'loglevel': str
+        'ac': int,
+        'ar': int,
+        'f': str,
+        'loglevel': str,
+        'nostats': None,
+        'progress': str,
     }
     POSITIONAL_ARGUMENTS = (str,)
 
     def _map_stderr(result: str):
         logger.error(f'ffmpeg stderr: {result}')
 
-    def _map_stdout(result: str):
+    def _map_stdout(result: str) -> float | None:
+        # with `progress='pipe:1'` this is the number of seconds decoded so far, otherwise just logged
+        for line in reversed(result.splitlines()):
+            if line.startswith(PROGRESS_KEY):
+                position = line.removeprefix(PROGRESS_KEY)
+                return int(position) / 1_000_000 if position.isdigit() else None
+        if all(PROGRESS_LINE.fullmatch(line) for line in result.splitlines()):
+            return None
         logger.info(f'ffmpeg stdout: {result}')
+        return None
 
 
 ffmpeg = define_process(Ffmpeg)
@@ -1,4 +1,6 @@
 from star.subprocess.command import Command, define_process
+from star.subprocess.limiter import FFMPEG_SLOT_GROUP, FFMPEG_MAX_PROCESSES
+import json
 import logging
 
 logger = logging.getLogger('star.command.ffprobe')
@@ -7,9 +9,14 @@ logger = logging.getLogger('star.command.ffprobe')
 class Ffprobe(Command):
     COMMAND = 'ffprobe'
 
+    SLOT_GROUP = FFMPEG_SLOT_GROUP
+    MAX_PROCESSES = FFMPEG_MAX_PROCESSES
+    PRIORITY = 0
+
     KEYWORD_PREFIX = '-'
     KEYWORD_ARGUMENTS = {
         'show_format': None,
+        'show_streams': None,
         'show_error': None,
         'output_format': str,
         'o': str,
@@ -20,7 +27,12 @@ class Ffprobe(Command):
     def _map_stderr(result: str):
         logger.error(f'ffprobe stderr: {result}')
 
-    def _map_stdout(result: str):
-        logger.info(f'ffprobe stdout: {result}')
+    def _map_stdout(result: str) -> dict | None:
+        # with `output_format='json'` and no `o`, the report comes back parsed
+        try:
+            return json.loads(result)
+        except json.JSONDecodeError:
+            logger.info(f'ffprobe stdout: {result}')
+            return None
 
 ffprobe = define_process(Ffprobe)
@@ -0,0 +1,134 @@
+import os
+import time
+import fcntl
+import heapq
+import asyncio
+import itertools
+import contextlib
+import tempfile
+from pathlib import Path
+from collections.abc import AsyncIterator, Iterator
+
+from star.settings import GLOBAL_CONFIGURATION
+
+# every worker on the host has to agree on this, so it is somewhere local rather than the shared data folder
+SLOT_FOLDER = Path(GLOBAL_CONFIGURATION.get('subprocess_slot_folder', str(Path(tempfile.gettempdir()) / 'star-slots')))
+SLOT_POLL_SECONDS = float(GLOBAL_CONFIGURATION.get('subprocess_slot_poll_seconds', 0.05))
+
+# ffmpeg and ffprobe compete for the same cores and disks, so they share a budget
+FFMPEG_SLOT_GROUP = 'ffmpeg'
+FFMPEG_MAX_PROCESSES = int(GLOBAL_CONFIGURATION.get('ffmpeg_max_processes', max(1, (os.cpu_count() or 2) // 2)))
+
+
+class SlotWaiter:
+    __slots__ = ('priority', 'sequence', 'wake')
+
+    priority: int
+    sequence: int
+    wake: asyncio.Future | None
+
+    def __init__(self, priority: int, sequence: int):
+        self.priority = priority
+        self.sequence = sequence
+        self.wake = None
+
+    def __lt__(self, other: 'SlotWaiter') -> bool:
+        # lowest priority number first; equal priorities are served in the order they arrived
+        return (self.priority, self.sequence) < (other.priority, other.sequence)
+
+
+class ProcessLimiter:
+    """
+    ### Lets at most `slots` processes of one kind run at once on this host, across every worker process.
+
+    Each slot is a lock file that is `flock`ed for as long as a process runs in it, so the kernel frees the slot if
+    the worker holding it dies. Within a worker, callers wait in a heap by priority and only the one at the head
+    tries for a slot. Between workers the heads race for the next free file; a worker only learns that another one
+    freed a slot by polling every `poll_seconds`, whereas its own slots are handed on straight away.
+    """
+
+    _limiters: dict[str, 'ProcessLimiter'] = {}
+
+    name: str
+    slots: int
+    folder: Path
+    poll_seconds: float
+    queue: list[SlotWaiter]
+
+    def __init__(self, name: str, slots: int, folder: Path = SLOT_FOLDER, poll_seconds: float = SLOT_POLL_SECONDS):
+        self.name = name
+        self.slots = slots
+        self.folder = folder
+        self.poll_seconds = poll_seconds
+        self.queue = []
+        self._sequence = itertools.count()
+
+    @classmethod
+    def of(cls, name: str, slots: int) -> 'ProcessLimiter':
+        # every command sharing `name` in this process waits in the same queue
+        if name not in cls._limiters:
+            cls._limiters[name] = cls(name, slots)
+        return cls._limiters[name]
+
+    @contextlib.asynccontextmanager
+    async def slot(self, priority: int = 0) -> AsyncIterator[None]:
+        # Waits for a free slot, which is held for the lifetime of the context. 0 slots means no limit
+        if self.slots <= 0:
+            yield
+            return
+
+        loop = asyncio.get_running_loop()
+        entry = SlotWaiter(priority, next(self._sequence))
+        heapq.heappush(self.queue, entry)
+        try:
+            while True:
+                head = self.queue[0] is entry
+                if head and (lock := self._try_lock()) is not None:
+                    break
+                # the head watches for other workers freeing a slot; everybody else waits to become the head
+                entry.wake = loop.create_future()
+                with contextlib.suppress(TimeoutError):
+                    await asyncio.wait_for(entry.wake, self.poll_seconds if head else None)
+        except BaseException:
+            self.queue.remove(entry)
+            heapq.heapify(self.queue)
+            self._wake_head()
+            raise
+
+        heapq.heappop(self.queue)
+        self._wake_head()
+        try:
+            yield
+        finally:
+            os.close(lock)
+            self._wake_head()
+
+    @contextlib.contextmanager
+    def hold(self) -> Iterator[None]:
+        # `slot` for synchronous callers, who have no queue to wait in and simply poll
+        if self.slots <= 0:
+            yield
+            return
+
+        while (lock := self._try_lock()) is None:
+            time.sleep(self.poll_seconds)
+        try:
+            yield
+        finally:
+            os.close(lock)
+
+    def _try_lock(self) -> int | None:
+        # Returns the descriptor of a slot file we now hold the lock on, which closing releases
+        self.folder.mkdir(parents=True, exist_ok=True)
+        for index in range(self.slots):
+            lock = os.open(self.folder / f'{self.name}.{index}.lock', os.O_CREAT | os.O_RDWR, 0o644)
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return lock
+            except BlockingIOError:
+                os.close(lock)
+        return None
+
+    def _wake_head(self):
+        if self.queue and self.queue[0].wake is not None and not self.queue[0].wake.done():
+            self.queue[0].wake.set_result(None)
@@ -0,0 +1,111 @@
+import ctypes
+import dataclasses
+import logging
+import os
+import platform
+import resource
+from typing import Any
+from collections.abc import Callable, Mapping
+
+logger = logging.getLogger('star.subprocess')
+
+# see ioprio_set(2)
+IOPRIO_CLASS_REALTIME = 1
+IOPRIO_CLASS_BEST_EFFORT = 2
+IOPRIO_CLASS_IDLE = 3
+IOPRIO_WHO_PROCESS = 1
+IOPRIO_CLASS_SHIFT = 13
+# glibc doesn't wrap ioprio_set, so it is called by number
+IOPRIO_SET_SYSCALLS = {'x86_64': 251, 'aarch64': 30, 'i686': 289, 'armv7l': 314}
+
+
+def parse_cpus(cpus: str) -> frozenset[int]:
+    # A CPU list the way taskset and cgroups write them, e.g. '0-3,6'. Empty means every CPU
+    parsed = set()
+    for part in cpus.replace(' ', '').split(','):
+        if not part:
+            continue
+        first, _, last = part.partition('-')
+        parsed.update(range(int(first), int(last or first) + 1))
+    return frozenset(parsed)
+
+
+def limits(memory_mb: int = 0, cpu_seconds: int = 0) -> dict[int, tuple[int, int]]:
+    # Hard rlimits for `Resources.rlimits`; 0 leaves that one alone. The memory limit is on address space, which
+    # is far more than what is resident for anything that maps a GPU, so it is only useful for CPU-only processes
+    rlimits = {}
+    if memory_mb > 0:
+        rlimits[resource.RLIMIT_AS] = (memory_mb * 1024 * 1024, memory_mb * 1024 * 1024)
+    if cpu_seconds > 0:
+        rlimits[resource.RLIMIT_CPU] = (cpu_seconds, cpu_seconds)
+    return rlimits
+
+
+def thread_environment(threads: int) -> dict[str, str]:
+    # The numeric libraries size their thread pools from the machine, not the affinity they are given
+    if threads <= 0:
+        return {}
+    return {variable: str(threads) for variable in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS')}
+
+
+@dataclasses.dataclass(frozen=True)
+class Resources:
+    """
+    ### How a process is allowed to run, applied between fork and exec so it holds from the first instruction.
+
+    `cpu_affinity` pins it to those CPUs, `nice` is added to its niceness, `ionice` is an `(IOPRIO_CLASS_*, level)`
+    pair, `rlimits` maps `resource.RLIMIT_*` to `(soft, hard)` and `environment` is added to ours. Children of the
+    process inherit all of it.
+    """
+
+    cpu_affinity: frozenset[int] = frozenset()
+    nice: int = 0
+    ionice: tuple[int, int] | None = None
+    rlimits: Mapping[int, tuple[int, int]] = dataclasses.field(default_factory=dict)
+    environment: Mapping[str, str] = dataclasses.field(default_factory=dict)
+
+    def spawn_options(self, environment: Mapping[str, str] = {}) -> dict[str, Any]:
+        # Keyword arguments for `subprocess.Popen` and `asyncio.create_subprocess_exec`, with `environment` on top
+        options: dict[str, Any] = {}
+        if self.environment or environment:
+            options['env'] = {**os.environ, **self.environment, **environment}
+        preexec = self._preexec()
+        if preexec is not None:
+            options['preexec_fn'] = preexec
+        return options
+
+    def _preexec(self) -> Callable[[], None] | None:
+        set_ioprio = _ioprio_setter(self.ionice) if self.ionice is not None else None
+        if not (self.cpu_affinity or self.nice or self.rlimits or set_ioprio):
+            return None
+
+        # runs in the child with the parent's threads gone, so everything it needs is worked out beforehand
+        cpu_affinity, nice, rlimits = self.cpu_affinity, self.nice, list(self.rlimits.items())
+
+        def apply():
+            if cpu_affinity:
+                os.sched_setaffinity(0, cpu_affinity)
+            if nice:
+                os.nice(nice)
+            for limit, value in rlimits:
+                resource.setrlimit(limit, value)
+            if set_ioprio is not None:
+                set_ioprio()
+
+        return apply
+
+
+def _ioprio_setter(ionice: tuple[int, int]) -> Callable[[], None] | None:
+    number = IOPRIO_SET_SYSCALLS.get(platform.machine())
+    if number is None:
+        logger.warning(f'Not setting I/O priority, ioprio_set is unknown on {platform.machine()}')
+        return None
+    syscall = ctypes.CDLL(None, use_errno=True).syscall
+    io_class, level = ionice
+    priority = (io_class << IOPRIO_CLASS_SHIFT) | level
+
+    def set_ioprio():
+        if syscall(number, IOPRIO_WHO_PROCESS, 0, priority) != 0:
+            raise OSError(ctypes.get_errno(), 'ioprio_set failed')
+
+    return set_ioprio
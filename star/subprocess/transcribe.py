@@ -1,5 +1,10 @@
 from pathlib import Path
 from star.subprocess.command import Command, define_process
+from star.subprocess.resources import IOPRIO_CLASS_BEST_EFFORT, limits, parse_cpus, thread_environment
+from star.settings import GLOBAL_CONFIGURATION
+
+# the last line `scripts/transcribe.py` prints names the language the transcript is in
+LANGUAGE_PREFIX = 'language: '
 
 
 class Transcribe(Command):
@@ -7,7 +12,35 @@ class Transcribe(Command):
     COMMAND_PATHS = [Path('./scripts')]
     COMMAND = 'transcribe.py'
 
-    POSITIONAL_ARGUMENTS = (str,)
+    # whisperx takes every core it can see, so it can be kept off the ones the web workers run on, and behind them
+    # in line for the rest. Its thread pools are sized to the CPUs it is given
+    CPU_AFFINITY = parse_cpus(GLOBAL_CONFIGURATION.get('transcription_cpus', ''))
+    NICE = int(GLOBAL_CONFIGURATION.get('transcription_nice', 10))
+    IONICE = (IOPRIO_CLASS_BEST_EFFORT, 7)
+    # RLIMIT_CPU counts a process's whole life rather than any one job, so the CPU time limit only bounds the one-off
+    # processes that run a single job. Warm pool workers serve many, and only get the memory limit
+    WARM_RLIMITS = limits(memory_mb=int(GLOBAL_CONFIGURATION.get('transcription_memory_limit_mb', 0)))
+    RLIMITS = {**WARM_RLIMITS, **limits(cpu_seconds=int(GLOBAL_CONFIGURATION.get('transcription_cpu_seconds', 0)))}
+    ENVIRONMENT_VARIABLES = thread_environment(len(CPU_AFFINITY))
+
+    # one-off transcriber processes for the whole host; the warm pool's workers are sized by `transcription_pool_size`
+    MAX_PROCESSES = int(GLOBAL_CONFIGURATION.get('transcription_max_processes', 1))
+
+    # either an audio file to transcribe, or `serve` and `max_jobs` to start a warm worker for `TranscriberPool`
+    POSITIONAL_ARGUMENTS = (str | None,)
+    KEYWORD_ARGUMENTS = {
+        'serve': str,
+        'max-jobs': int,
+        'language': str,
+        'partial': str,
+    }
+
+    @staticmethod
+    def _map_stdout(result: str) -> str | None:
+        lines = result.strip().splitlines()
+        if lines and lines[-1].startswith(LANGUAGE_PREFIX):
+            return lines[-1].removeprefix(LANGUAGE_PREFIX)
+        return None
 
 
 transcribe = define_process(Transcribe)
@@ -4,30 +4,57 @@ from star.subprocess.ffprobe import ffprobe
 from star.subprocess.ffmpeg import ffmpeg
 from star.subprocess.transcribe import transcribe
 from star.transcribe.video import VideoStore
-from star.transcribe.metadata import VideoMetadata
+from star.transcribe.metadata import VideoMetadata, ProbeMetadata
 from star.transcribe.state import VideoState
 from star.transcribe.transcription import TranscriptionStore
+from star.transcribe.hub import VideoEventHub
+from star.transcribe.jobs import JobStore
+from star.transcribe.upload import ChunkedUpload, ChunkInfo, ChunkWriter, MultipartUpload, UploadRegistry
 from star.transcribe.language import Language
-from star.models.transcribe import Video
-from star.error import ServerError, InvalidFileFormat, TranscriptNotFoundError
+from star.transcribe.audio import SAMPLE_RATE, SAMPLE_FORMAT, PCM_SUFFIX
+from star.transcribe.partial import PartialTranscript
+from star.models.transcribe import Video, Transcription
+from star.error import (
+    ServerError,
+    InvalidFileFormat,
+    TranscriptNotFoundError,
+    UploadError,
+    VideoNotFoundError,
+    BadArguments,
+    SubprocessFailed,
+)
 from star.state import State
 from star.environment import ENVIRONMENT
+from star.settings import GLOBAL_CONFIGURATION
 from star.web_event import BaseEvent
 from star.events import ServerEvent
+from typing import Any
 from pathlib import Path
 from tempfile import TemporaryDirectory
 from uuid import UUID
-from collections.abc import AsyncIterator
+from collections.abc import AsyncIterable, AsyncIterator
 from werkzeug.utils import secure_filename
 import json
 import logging
 import dataclasses
 import asyncio
-import shutil
 import re
 
 logger = logging.getLogger('star.video')
 
+# SSE streams are driven by broker events; the DB is only re-read this often in case an event never reaches us
+SSE_FALLBACK_POLL_SECONDS = float(GLOBAL_CONFIGURATION.get('sse_fallback_poll_seconds', 60))
+# 'local' transcribes in the web worker that took the upload; 'jobs' queues it in the database for
+# `star.transcribe.worker` processes, which may run on other nodes as long as they share the upload folder. Their
+# events only reach web workers on other nodes with the 'database' `broker_transport`
+TRANSCRIPTION_BACKEND = GLOBAL_CONFIGURATION.get('transcription_backend', 'local')
+# ffmpeg reports its progress every half second or so, so a decode that has gone quiet for this long is stuck
+FFMPEG_IDLE_TIMEOUT_SECONDS = float(GLOBAL_CONFIGURATION.get('ffmpeg_idle_timeout_seconds', 120))
+# a one-off transcriber process is killed after this long; 0 lets it run as long as it needs
+TRANSCRIPTION_TIMEOUT_SECONDS = float(GLOBAL_CONFIGURATION.get('transcription_timeout_seconds', 0)) or None
+# how often the transcript being written is checked for new segments to send to clients
+TRANSCRIPT_SEGMENT_POLL_SECONDS = float(GLOBAL_CONFIGURATION.get('transcript_segment_poll_seconds', 1))
+
 
 @dataclasses.dataclass
 class TranscriptReturn:
@@ -35,6 +62,10 @@ class TranscriptReturn:
     create_date: str
     language: str
 
+    @classmethod
+    def from_model(cls, transcript: Transcription) -> 'TranscriptReturn':
+        return cls(uuid=str(transcript.uuid), create_date=str(transcript.created), language=transcript.language)
+
 
 @dataclasses.dataclass
 class VideoReturn:
@@ -43,6 +74,19 @@ class VideoReturn:
     title: str
     state: str
     transcription: TranscriptReturn | None = None
+    queue_position: int | None = None
+    duration: float | None = None
+
+    @classmethod
+    def from_models(cls, video: Video, transcript: Transcription | None) -> 'VideoReturn':
+        return cls(
+            uuid=str(video.uuid),
+            create_date=str(video.created),
+            title=video.title,
+            state=video.state,
+            transcription=TranscriptReturn.from_model(transcript) if transcript else None,
+            duration=video.duration,
+        )
 
 
 class VideoEvent(BaseEvent):
@@ -62,38 +106,129 @@ class VideoEventEnd(VideoEvent):
         self.event = 'update-end'
 
 
+class VideoChangeEvent(BaseEvent, namespace='video'):
+    # Partial updates for streams that carry many videos at once; only what changed is sent
+    def __init__(self, uuid: Any, changes: dict):
+        self.id = str(uuid)
+        self._changes = changes
+        super().__init__()
+
+    def data(self):
+        return json.dumps({'uuid': self.id, **self._changes})
+
+
+class VideoCreatedEvent(VideoChangeEvent, event='created'):
+    pass
+
+
+class VideoStateEvent(VideoChangeEvent, event='state'):
+    pass
+
+
+class VideoTranscriptEvent(VideoChangeEvent, event='transcript'):
+    pass
+
+
+class VideoQueueEvent(VideoChangeEvent, event='queue'):
+    pass
+
+
+class VideoSegmentEvent(VideoChangeEvent, event='segment'):
+    pass
+
+
 class VideoApi:
-    async def _transcribe(self, state: State, video_file: Path, video: Video):
-        try:
-            # Generate ffprobe metadata
-            json_file = video_file.with_suffix('.ffprobe.json')
-            logger.info(f'Generating metadata to {json_file}')
-            await ffprobe.acall(str(video_file), show_format=True, show_error=True, output_format='json', o=str(json_file), loglevel='error')
-
-            # If there was an error with ffprobe, ffmpeg has no chance
-            logger.info(f'Reading metadata from {json_file}')
-            metadata = json.loads(json_file.read_text())
-            if 'error' in metadata:
+    async def _probe(self, state: State, video_file: Path, video: Video) -> float | None:
+        # Stores what ffprobe makes of the upload on its video and returns the duration. A file we have seen before
+        # isn't probed again
+        probe = VideoStore().get_probe_from_hash(state, video.content_hash) if video.content_hash else None
+        if probe is not None:
+            logger.info(f'Reusing the probe of an earlier upload of {video_file}')
+        else:
+            logger.info(f'Probing {video_file}')
+            try:
+                metadata = await ffprobe.acall(
+                    str(video_file), show_format=True, show_streams=True, show_error=True, output_format='json', loglevel='error'
+                )
+            except SubprocessFailed as e:
+                # If there was an error with ffprobe, ffmpeg has no chance
+                raise InvalidFileFormat() from e
+            if metadata is None or 'error' in metadata:
                 raise InvalidFileFormat()
+            probe = ProbeMetadata.from_ffprobe(metadata)
+
+        VideoStore().set_probe(state, video, probe)
+        return probe.duration
+
+    def _failed(self, state: State, video_file: Path, video: Video, error: Exception):
+        VideoStore().update_video_state(state, video, VideoState.FAILED)
+        logger.error(f'Failed to transcribe video "{video.title}":\n{error}')
+        video_file.unlink(missing_ok=True)
 
+    async def _transcribe(self, state: State, video_file: Path, video: Video, language: Language):
+        try:
+            duration = await self._probe(state, video_file, video)
+            if TRANSCRIPTION_BACKEND == 'jobs':
+                # a worker on whichever node gets to it first does the rest; see `star.transcribe.worker`
+                JobStore().enqueue(state, video, video_file, duration, language)
+                JobStore().publish_positions(state)
+                return
+        except ServerError as e:
+            self._failed(state, video_file, video, e)
+            return
+        except Exception as e:
+            self._failed(state, video_file, video, e)
+            raise e
 
+        # shortest videos go first; anything ffprobe couldn't time waits until the end
+        async with state.scheduler.slot(str(video.uuid), duration if duration is not None else float('inf')):
+            await self.process_video(state, video_file, video, language)
+
+    async def process_video(self, state: State, video_file: Path, video: Video, language: Language) -> bool:
+        # Transcribes a probed video and links the transcript to it, returning whether that worked. The video file is
+        # removed once we are done with it either way, but is left alone if we are cancelled part way through.
+        # An unknown `language` is detected from the audio
+        try:
             with TemporaryDirectory(dir=str(ENVIRONMENT.data_folder())) as processing_directory:
-                audio_file = Path(processing_directory) / video_file.with_suffix('.aac').name
-                logger.info(f'Extracting audio from {video_file} to {audio_file}')
-                await ffmpeg.acall(
+                # decoded once, straight to what the transcriber reads; see `star.transcribe.audio`
+                audio_file = Path(processing_directory) / video_file.with_suffix(PCM_SUFFIX).name
+                logger.info(f'Decoding audio from {video_file} to {audio_file}')
+                decoding = ffmpeg.astream(
                     str(audio_file),
                     i=str(video_file),
                     vn=True,
-                    acodec='copy',
-                    loglevel='error'
+                    ac=1,
+                    ar=SAMPLE_RATE,
+                    f=SAMPLE_FORMAT,
+                    loglevel='error',
+                    nostats=True,
+                    progress='pipe:1',
+                    idle_timeout=FFMPEG_IDLE_TIMEOUT_SECONDS,
                 )
+                async for decoded_seconds in decoding:
+                    logger.debug(f'Decoded {decoded_seconds:.0f}s of audio from {video_file}')
 
                 logger.info(f'Starting transcription for video "{video.title}" with audio file "{audio_file}"')
                 VideoStore().update_video_state(state, video, VideoState.PROCESSING)
-                await transcribe.acall(str(audio_file))
+                partial = PartialTranscript.of(video.uuid)
+                partial.start()
+                relay = asyncio.create_task(partial.relay(state.broker, video.uuid, TRANSCRIPT_SEGMENT_POLL_SECONDS))
+                try:
+                    if state.transcribers.enabled:
+                        _, detected = await state.transcribers.transcribe(audio_file, language, partial.path)
+                    else:
+                        options = {'language': str(language)} if language != Language.UNKNOWN else {}
+                        detected = await transcribe.acall(
+                            str(audio_file), partial=str(partial.path), timeout=TRANSCRIPTION_TIMEOUT_SECONDS, **options
+                        )
+                finally:
+                    relay.cancel()
+                # whatever was written since the last poll goes out before the finished transcript does
+                partial.publish(state.broker, video.uuid)
+                language = Language(detected) if detected in Language else Language.UNKNOWN
                 logger.info(f'Transcription for video "{video.title}" completed')
                 transcript = Path(processing_directory) / audio_file.with_suffix('.srt').name
-            
+        
                 idx = 0
                 while True:
                     test_path = ENVIRONMENT.transcript_folder() / transcript.name
@@ -107,141 +242,252 @@ class VideoApi:
                     idx = idx + 1
 
             logger.info(f'Linking transcription for video "{video.title}" to database')
-            db_transcript = TranscriptionStore().create_transcript(state, video, Language.ENGLISH, transcript)
+            db_transcript = TranscriptionStore().create_transcript(state, video, language, transcript)
 
             VideoStore().link_transcription(state, video, db_transcript, transcript)
-            VideoStore().update_video_state(state, video, VideoState.COMPLETED)
             logger.info(f'Video "{video.title}" transcription linked to DB')
-            logger.info(f'Removing temporary video file: {video_file}')
-            logger.info(f'Video transcript complete and ready')
+            # announce the transcript before the state change so listeners have it by the time the video completes
             state.broker.publish(
-                ServerEvent.VIDEO_TRANSCRIPT_COMPLETED, {'uuid': video.uuid, 'transcript': db_transcript.uuid, 'title': video.title}
+                ServerEvent.VIDEO_TRANSCRIPT_COMPLETED,
+                {
+                    'uuid': video.uuid,
+                    'transcript': db_transcript.uuid,
+                    'title': video.title,
+                    'transcription': dataclasses.asdict(TranscriptReturn.from_model(db_transcript)),
+                },
             )
+            VideoStore().update_video_state(state, video, VideoState.COMPLETED)
         except ServerError as e:
-            VideoStore().update_video_state(state, video, VideoState.FAILED)
-            logger.error(f'Failed to transcribe video "{video.title}":\n{e}')
+            self._failed(state, video_file, video, e)
+            return False
         except Exception as e:
-            VideoStore().update_video_state(state, video, VideoState.FAILED)
-            logger.error(f'Failed to transcribe video "{video.title}":\n{e}')
+            self._failed(state, video_file, video, e)
             raise e
         finally:
-            video_file.unlink()
+            # left alone on cancellation like the video itself; whoever took over the job may be writing to it
+            if not asyncio.current_task().cancelling():
+                PartialTranscript.of(video.uuid).remove()
+
+        logger.info(f'Removing temporary video file: {video_file}')
+        video_file.unlink()
+        logger.info(f'Video transcript complete and ready')
+        return True
 
     @define_async_api
-    async def upload_video(self, state: State, video_file: Path) -> WebResponse:
+    async def upload_video(
+        self, state: State, video_file: Path, content_hash: str | None = None, language: Language = Language.UNKNOWN
+    ) -> WebResponse:
         logger.info(f'Uploading video file: {video_file} to server')
 
-        metadata = VideoMetadata(title=video_file.stem)
+        metadata = VideoMetadata(title=video_file.stem, content_hash=content_hash)
+        duplicate = VideoStore().get_transcribed_video_from_hash(state, content_hash) if content_hash else None
+        if duplicate is not None and language not in (Language.UNKNOWN, duplicate[1].language):
+            # the same file, but transcribed as another language than the one asked for this time
+            duplicate = None
         video = VideoStore().create_video(state, metadata)
 
         logger.info(f'Created video entry in database with UUID: {video.uuid}')
+        state.broker.publish(
+            ServerEvent.VIDEO_UPLOADED,
+            {'uuid': video.uuid, 'title': video.title, 'video': dataclasses.asdict(VideoReturn.from_models(video, None))},
+        )
+
+        if duplicate is not None:
+            # we've transcribed this exact file before, so there's nothing left to do but point at that transcript
+            _, transcript = duplicate
+            logger.info(f'Video file {video_file} was already transcribed as {transcript.uuid}, reusing it')
+            VideoStore().link_transcription(state, video, transcript, Path(transcript.path))
+            state.broker.publish(
+                ServerEvent.VIDEO_TRANSCRIPT_COMPLETED,
+                {
+                    'uuid': video.uuid,
+                    'transcript': transcript.uuid,
+                    'title': video.title,
+                    'transcription': dataclasses.asdict(TranscriptReturn.from_model(transcript)),
+                },
+            )
+            VideoStore().update_video_state(state, video, VideoState.COMPLETED)
+            video_file.unlink()
+            return SeeOther(f'/video/{video.uuid}')
+
         from star.server import app
-        app.add_background_task(VideoApi._transcribe, self, state, video_file, video)
+        app.add_background_task(VideoApi._transcribe, self, state, video_file, video, language)
 
         logger.info(f'Video file {video_file} is being processed in the background...')
-        state.broker.publish(ServerEvent.VIDEO_UPLOADED, {'uuid': video.uuid, 'title': video.title})
         return SeeOther(f'/video/{video.uuid}')
 
     @define_async_api
-    async def upload_chunk(self, state: State, file_data: bytes, filename: str, chunk_index: int, total_chunks: int, chunk_uuid: str) -> WebResponse:
+    async def find_video_by_hash(self, state: State, content_hash: str) -> JsonResponse:
+        # lets a client skip uploading a file we've already transcribed; see `star.transcribe.upload.HASH_BLOCK_SIZE`
+        if not re.fullmatch('[0-9a-f]{64}', content_hash):
+            raise BadArguments()
+
+        found = VideoStore().get_transcribed_video_from_hash(state, content_hash)
+        if found is None:
+            raise VideoNotFoundError(content_hash)
+        return JsonResponse({'video': dataclasses.asdict(VideoReturn.from_models(*found))})
+
+    async def _chunk_received(self, state: State, upload: ChunkedUpload, chunk: ChunkInfo, completed: bool) -> WebResponse:
+        safe_filename = secure_filename(chunk.filename)
+        logger.info(f'Written chunk {chunk.index + 1}/{chunk.total_chunks} for file {safe_filename}')
+        if not completed:
+            # More chunks expected
+            return Ok(f'Chunk {chunk.index + 1}/{chunk.total_chunks} received')
+
+        # can mean reading back the whole file, which would hold up every other request on this worker
+        content_hash = await asyncio.to_thread(upload.content_hash)
+        # a file that already has the name is kept, and this one is numbered instead
+        final_file_path = UploadRegistry(ENVIRONMENT.upload_folder()).claim(safe_filename)
         try:
-            # Create a unique filename for this upload session
-            upload_folder = ENVIRONMENT.upload_folder()
-            safe_filename = secure_filename(filename)
-            chunk_folder = upload_folder / f"chunks_{chunk_uuid}"
-            chunk_folder.mkdir(exist_ok=True)
-            
-            # Write the chunk to disk
-            chunk_file = chunk_folder / f"chunk_{chunk_index:06d}"
-            chunk_file.write_bytes(file_data)
-            
-            logger.info(f'Written chunk {chunk_index + 1}/{total_chunks} for file {safe_filename}')
-            
-            # Check if all chunks have been received
-            received_chunks = len(list(chunk_folder.glob("chunk_*")))
-            
-            if received_chunks == total_chunks:
-                # All chunks received, combine them
-                final_file_path = upload_folder / safe_filename
-                
-                # Handle duplicate filenames
-                counter = 1
-                while final_file_path.exists():
-                    name_parts = safe_filename.rsplit('.', 1)
-                    if len(name_parts) == 2:
-                        final_file_path = upload_folder / f"{name_parts[0]}_{counter}.{name_parts[1]}"
-                    else:
-                        final_file_path = upload_folder / f"{safe_filename}_{counter}"
-                    counter += 1
-                
-                # Combine chunks in order
-                with open(final_file_path, 'wb') as final_file:
-                    for i in range(total_chunks):
-                        chunk_file = chunk_folder / f"chunk_{i:06d}"
-                        if chunk_file.exists():
-                            final_file.write(chunk_file.read_bytes())
-                        else:
-                            raise ServerError(f"Missing chunk {i} for file {safe_filename}")
-                
-                # Clean up chunk files
-                shutil.rmtree(chunk_folder)
-                
-                logger.info(f'Successfully assembled file {final_file_path} from {total_chunks} chunks')
-                
-                # Process the complete file
-                return await self.upload_video(state, final_file_path)
+            upload.finish(final_file_path)
+        except BaseException:
+            final_file_path.unlink(missing_ok=True)
+            raise
+
+        # Process the complete file
+        return await self.upload_video(state, final_file_path, content_hash, chunk.language)
+
+    def _open_upload(self, state: State, chunk: ChunkInfo) -> ChunkedUpload:
+        # Uploads are assembled in a folder unique to their upload session
+        registry = UploadRegistry(ENVIRONMENT.upload_folder())
+        if not registry.exists(chunk.uuid):
+            # turn uploads away before they start rather than after the whole file has been sent
+            if TRANSCRIPTION_BACKEND == 'jobs':
+                JobStore().admit(state, state.scheduler.backlog_limit, state.scheduler.retry_after_seconds)
             else:
-                # More chunks expected
-                return Ok(f'Chunk {chunk_index + 1}/{total_chunks} received')
+                state.scheduler.admit()
+        return registry.open(chunk)
+
+    @define_async_api
+    async def upload_chunk(self, state: State, chunk: ChunkInfo, data: AsyncIterable[bytes]) -> WebResponse:
+        # `data` is streamed to its place in the file as it arrives, so a chunk is never held in memory
+        try:
+            upload = self._open_upload(state, chunk)
+            writer = upload.open_chunk(chunk.index, chunk.offset, chunk.total_size)
+            try:
+                async for block in data:
+                    writer.write(block)
+            finally:
+                writer.close()
+            completed = upload.mark_received(chunk.index, writer.block_digests)
+            return await self._chunk_received(state, upload, chunk, completed)
+        except ServerError:
+            raise
         except Exception as e:
-            logger.error(f'Failed to process chunk {chunk_index} for file {filename}: {e}')
-            return WebResponse(status=500, response=f'Failed to process chunk {chunk_index + 1}')
+            logger.error(f'Failed to process chunk {chunk.index} for file {chunk.filename}: {e}')
+            return WebResponse(status=500, response=f'Failed to process chunk {chunk.index + 1}')
 
     @define_async_api
-    async def get_videos(self, state: State, count: int, offset: int) -> JsonResponse:
-        videos = VideoStore().get_all_videos(state, count, offset)
-
-        video_responses = []
-        for video, transcript in videos:
-            video_responses.append(
-                VideoReturn(
-                    uuid=str(video.uuid),
-                    create_date=str(video.created),
-                    title=video.title,
-                    state=video.state,
-                    transcription=TranscriptReturn(
-                        uuid=str(transcript.uuid), create_date=str(transcript.created), language=transcript.language
-                    )
-                    if transcript
-                    else None,
-                )
-            )
-        return JsonResponse({'videos': [dataclasses.asdict(response) for response in video_responses]})
+    async def upload_multipart_chunk(self, state: State, body: AsyncIterable[bytes], boundary: bytes) -> WebResponse:
+        # Same as `upload_chunk`, but for a dropzone form. The chunk parameters have to come before the file part,
+        # which is the order dropzone sends them in
+        opened: list[tuple[ChunkedUpload, ChunkInfo, ChunkWriter]] = []
+
+        def open_file(fields: dict[str, str], filename: str | None) -> ChunkWriter:
+            if opened:
+                raise UploadError('Only one file can be uploaded per request')
+            chunk = ChunkInfo.from_form(fields, filename)
+            upload = self._open_upload(state, chunk)
+            writer = upload.open_chunk(chunk.index, chunk.offset, chunk.total_size)
+            opened.append((upload, chunk, writer))
+            return writer
+
+        try:
+            fields = await MultipartUpload(boundary, open_file).receive(body)
+            if not opened:
+                raise UploadError('No file part in the request')
+
+            upload, chunk, writer = opened[0]
+            if ChunkInfo.from_form(fields, chunk.filename) != chunk:
+                raise UploadError('Chunk parameters must be sent before the file')
+            completed = upload.mark_received(chunk.index, writer.block_digests)
+            return await self._chunk_received(state, upload, chunk, completed)
+        except ServerError:
+            raise
+        except Exception as e:
+            logger.error(f'Failed to process uploaded chunk: {e}')
+            return WebResponse(status=500, response='Failed to process chunk')
+
+    @define_async_api
+    async def get_upload_status(self, state: State, upload_uuid: UUID) -> JsonResponse:
+        # lets a client resume an interrupted upload by sending only the chunks that never arrived
+        upload = UploadRegistry(ENVIRONMENT.upload_folder()).get(str(upload_uuid))
+        missing_chunks = upload.missing_chunks()
+        return JsonResponse(
+            {
+                'uuid': str(upload_uuid),
+                'total_chunks': upload.total_chunks,
+                'received_chunks': upload.total_chunks - len(missing_chunks),
+                'missing_chunks': missing_chunks,
+            }
+        )
+
+    @define_async_api
+    async def get_videos(self, state: State, count: int, cursor: int | None = None) -> JsonResponse:
+        videos, next_cursor = VideoStore().get_all_videos(state, count, cursor)
+
+        video_responses = [VideoReturn.from_models(video, transcript) for video, transcript in videos]
+        return JsonResponse(
+            {'videos': [dataclasses.asdict(response) for response in video_responses], 'next_cursor': next_cursor}
+        )
 
     @define_sse_api
     async def stream_video(self, state: State, uuid: UUID) -> AsyncIterator[VideoEvent]:
-        while True:
-            video, transcript = VideoStore().get_video_from_uuid(state, uuid)
-            video_metadata = VideoReturn(
-                uuid=str(video.uuid),
-                create_date=str(video.created),
-                title=video.title,
-                state=video.state,
-                transcription=TranscriptReturn(
-                    uuid=str(transcript.uuid), create_date=str(transcript.created), language=transcript.language
-                )
-                if transcript
-                else None,
-            )
-
+        # subscribe before reading the video so nothing published in between is lost
+        hub = VideoEventHub.of(state.broker)
+        async with hub.listen([uuid], segments=True) as events:
+            video_metadata = VideoReturn.from_models(*VideoStore().get_video_from_uuid(state, uuid))
+            video_metadata.queue_position = hub.queue_positions.get(str(uuid))
             yield VideoEvent(video_metadata)
 
-            if video.state in [VideoState.COMPLETED, VideoState.FAILED]:
-                break
-            await asyncio.sleep(5)
+            # catch up on the transcript so far; segments that also arrive as events are only sent once
+            next_segment = 0
+            if video_metadata.state not in [VideoState.COMPLETED, VideoState.FAILED]:
+                for segment in PartialTranscript.of(uuid).read():
+                    yield VideoSegmentEvent(uuid, segment)
+                    next_segment = segment['index'] + 1
+
+            while video_metadata.state not in [VideoState.COMPLETED, VideoState.FAILED]:
+                try:
+                    event, data = await asyncio.wait_for(events.get(), timeout=SSE_FALLBACK_POLL_SECONDS)
+                except TimeoutError:
+                    video_metadata = VideoReturn.from_models(*VideoStore().get_video_from_uuid(state, uuid))
+                    video_metadata.queue_position = hub.queue_positions.get(str(uuid))
+                    yield VideoEvent(video_metadata)
+                    continue
+
+                if event == ServerEvent.VIDEO_STATE_CHANGE:
+                    video_metadata = dataclasses.replace(video_metadata, state=data['state'])
+                elif event == ServerEvent.VIDEO_TRANSCRIPT_COMPLETED:
+                    video_metadata = dataclasses.replace(
+                        video_metadata, transcription=TranscriptReturn(**data['transcription'])
+                    )
+                elif event == ServerEvent.VIDEO_QUEUE_POSITION:
+                    video_metadata = dataclasses.replace(video_metadata, queue_position=data['position'])
+                elif event == ServerEvent.VIDEO_TRANSCRIPT_SEGMENT:
+                    for segment in data['segments']:
+                        if segment['index'] >= next_segment:
+                            next_segment = segment['index'] + 1
+                            yield VideoSegmentEvent(uuid, segment)
+                    continue
+                yield VideoEvent(video_metadata)
         yield VideoEventEnd(video_metadata)
         StopAsyncIteration
 
+    @define_sse_api
+    async def stream_videos(self, state: State, uuids: list[str] | None = None) -> AsyncIterator[VideoChangeEvent]:
+        async with VideoEventHub.of(state.broker).listen(uuids) as events:
+            while True:
+                event, data = await events.get()
+                if event == ServerEvent.VIDEO_UPLOADED:
+                    yield VideoCreatedEvent(data['uuid'], data['video'])
+                elif event == ServerEvent.VIDEO_STATE_CHANGE:
+                    yield VideoStateEvent(data['uuid'], {'state': data['state']})
+                elif event == ServerEvent.VIDEO_TRANSCRIPT_COMPLETED:
+                    yield VideoTranscriptEvent(data['uuid'], {'transcription': data['transcription']})
+                elif event == ServerEvent.VIDEO_QUEUE_POSITION:
+                    yield VideoQueueEvent(data['uuid'], {'queue_position': data['position']})
+
     @define_async_api
     async def get_transcript_file(self, state: State, *, transcript_id: UUID | None = None, video_id: UUID | None = None) -> bytes:
         if transcript_id:
@@ -0,0 +1,6 @@
+# What whisper takes as input: 16 kHz mono float32 samples. They're written little endian with no header,
+# so that the transcriber can memory map the file rather than decode it again
+SAMPLE_RATE = 16000
+SAMPLE_FORMAT = 'f32le'
+SAMPLE_DTYPE = '<f4'
+PCM_SUFFIX = '.f32'
@@ -10,42 +10,48 @@ from star.web_utils import url_endpoint, html_endpoint, sse_endpoint
 from star.response import WebResponse, HtmlResponse, ServerSentEventResponse
 from star.state import State
 from star.transcribe.api import VideoApi
+from star.transcribe.upload import ChunkInfo
+from star.transcribe.language import Language
 from star.error import UploadError
 from star.events import ServerEvent
 
 
 logger = logging.getLogger('star.video')
 
+# how many videos the video list shows at a time
+VIDEO_PAGE_SIZE = 50
+
 
 def define_transcribe(api: Blueprint, sse: Blueprint, app: Blueprint):
     @api.post('/video')
     @url_endpoint
     async def upload_video() -> WebResponse:
         logger.info('Received chunked video upload request')
-        form = await request.form
-        files = await request.files
-        
-        if 'file' not in files:
-            logger.error('No file part in the request')
-            return UploadError('No file part in the request').as_response_code()
-        
-        file = files['file']
-        filename = form.get('filename', file.filename)
-        chunk_index = int(form.get('dzchunkindex', 0))
-        total_chunks = int(form.get('dztotalchunkcount', 1))
-        chunk_uuid = form.get('dzuuid', '')
-        
-        file_data = file.read()
-        
-        logger.info(f'Received chunk {chunk_index + 1}/{total_chunks} for file {filename}')
-        return await VideoApi().upload_chunk(
-            State.state, 
-            file_data, 
-            filename, 
-            chunk_index, 
-            total_chunks, 
-            chunk_uuid
-        )
+        boundary = request.mimetype_params.get('boundary')
+        if request.mimetype != 'multipart/form-data' or not boundary:
+            logger.error('Upload is not a multipart form')
+            return UploadError('Expected a multipart form upload').as_response_code()
+
+        # the body is parsed as it arrives rather than through `request.files`, so chunks never sit in memory
+        return await VideoApi().upload_multipart_chunk(State.state, request.body, boundary.encode('latin-1'))
+
+    @api.put('/video')
+    @url_endpoint
+    async def upload_video_raw() -> WebResponse:
+        # The body is the chunk itself, described by the same parameters dropzone sends, in the query string
+        chunk = ChunkInfo.from_form(request.args)
+        logger.info(f'Received raw chunk {chunk.index + 1}/{chunk.total_chunks} for file {chunk.filename}')
+        return await VideoApi().upload_chunk(State.state, chunk, request.body)
+
+    @api.get('/video/hash/<content_hash>')
+    @url_endpoint
+    async def find_video_by_hash(content_hash: str) -> WebResponse:
+        return await VideoApi().find_video_by_hash(State.state, content_hash)
+
+    @api.get('/video/upload/<uuid:upload_uuid>')
+    @url_endpoint
+    async def upload_status(upload_uuid: UUID) -> WebResponse:
+        return await VideoApi().get_upload_status(State.state, upload_uuid)
 
     @sse.get('/video/<uuid:uuid>')
     @sse_endpoint
@@ -53,6 +59,22 @@ def define_transcribe(api: Blueprint, sse: Blueprint, app: Blueprint):
         async for event in VideoApi().stream_video(State.state, uuid):
             yield event
 
+    @sse.get('/videos')
+    @sse_endpoint
+    async def stream_videos() -> AsyncIterator[ServerSentEventResponse]:
+        # optionally narrowed down with ?uuid=<video>&uuid=<video>
+        uuids = request.args.getlist('uuid') or None
+        async for event in VideoApi().stream_videos(State.state, uuids):
+            yield event
+
+    @api.get('/videos')
+    @url_endpoint
+    async def list_videos() -> WebResponse:
+        # newest first; pass the returned `next_cursor` back as ?cursor= to fetch the next page
+        count = request.args.get('count', 25, type=int)
+        cursor = request.args.get('cursor', None, type=int)
+        return await VideoApi().get_videos(State.state, count, cursor)
+
     @api.get('/transcript/<uuid:transcript_uuid>')
     @url_endpoint
     async def download_transcript(transcript_uuid: UUID) -> WebResponse:
@@ -62,20 +84,24 @@ def define_transcribe(api: Blueprint, sse: Blueprint, app: Blueprint):
     @app.get('/video')
     @html_endpoint(template_path='videos/home.html', title='Videos', expire_event=ServerEvent.VIDEO_STATE_CHANGE)
     async def video_homepage(html: str) -> HtmlResponse:
-        all_videos = (await VideoApi().get_videos(State.state, count=100, offset=0)).contained_json
+        # the first page of videos; the page fetches the rest from `list_videos` as it is asked for them
+        all_videos = (await VideoApi().get_videos(State.state, count=VIDEO_PAGE_SIZE)).contained_json
         for video in all_videos['videos']:
             date_string = video['create_date'].split('.')[0]
             video['create_date'] = str(datetime.datetime.strptime(date_string, '%Y-%m-%d %H:%M:%S'))
         return await render_template_string(
             html,
-            videos=all_videos['videos']
+            videos=all_videos['videos'],
+            next_cursor=all_videos['next_cursor'],
+            page_size=VIDEO_PAGE_SIZE,
         )
 
     @app.get('/video/upload')
     @html_endpoint(template_path='videos/upload.html', title='Video Upload')
     async def video_upload(html: str) -> HtmlResponse:
         return await render_template_string(
-            html
+            html,
+            languages=list(Language)
         )
 
     @app.get('/video/<uuid>')
@@ -0,0 +1,140 @@
+import asyncio
+import logging
+import contextlib
+import weakref
+from typing import Any, Self
+from collections.abc import AsyncIterator, Iterable
+
+from star.events import Broker, ServerEvent
+
+logger = logging.getLogger('star.video')
+
+
+class VideoListener:
+    """
+    ### One SSE client's view of the hub, read with `get` like a queue.
+
+    Transcript segments can arrive faster than a client reads them, so they never queue one event per segment.
+    They collect in `segments` under their video and take up a single place in the queue until they are read,
+    which leaves the rest of the queue to the state changes that a client cannot do without.
+    """
+
+    __slots__ = ('queue', 'uuids', 'loop', 'segments')
+
+    queue: asyncio.Queue
+    uuids: set[str] | None
+    loop: asyncio.AbstractEventLoop
+    segments: dict[str, list[dict]] | None
+
+    def __init__(self, queue: asyncio.Queue, uuids: set[str] | None, loop: asyncio.AbstractEventLoop, segments: bool = False):
+        self.queue = queue
+        self.uuids = uuids
+        self.loop = loop
+        self.segments = {} if segments else None
+
+    def wants(self, uuid: str) -> bool:
+        return self.uuids is None or uuid in self.uuids
+
+    def wants_segments(self, uuid: str) -> bool:
+        # only a client watching particular videos has any use for their transcripts as they are written
+        return self.segments is not None and self.uuids is not None and uuid in self.uuids
+
+    def put(self, event: ServerEvent, data: Any) -> bool:
+        try:
+            self.queue.put_nowait((event, data))
+            return True
+        except asyncio.QueueFull:
+            logger.warning(f'Video listener is not keeping up, dropping {event}')
+            return False
+
+    def put_segments(self, uuid: str, segments: list[dict]):
+        if uuid in self.segments:
+            # already waiting in the queue, so they go out together with those
+            self.segments[uuid].extend(segments)
+            return
+        self.segments[uuid] = list(segments)
+        if not self.put(ServerEvent.VIDEO_TRANSCRIPT_SEGMENT, {'uuid': uuid}):
+            del self.segments[uuid]
+
+    async def get(self) -> tuple[ServerEvent, Any]:
+        event, data = await self.queue.get()
+        if event == ServerEvent.VIDEO_TRANSCRIPT_SEGMENT:
+            data = {'uuid': data['uuid'], 'segments': self.segments.pop(data['uuid'])}
+        return event, data
+
+    def empty(self) -> bool:
+        return self.queue.empty()
+
+
+class VideoEventHub:
+    """
+    ### Fans video events out to every connected SSE client in this worker.
+
+    The hub holds a single subscription per broker event no matter how many clients are listening, and routes
+    each event only to the clients that asked for that video. Transcript segments only go to clients that asked for
+    them by video, see `VideoListener`. It also remembers where every queued video sits in
+    the transcription queue of whichever worker queued it, so new clients can be told straight away.
+    """
+
+    EVENTS: tuple[ServerEvent, ...] = (
+        ServerEvent.VIDEO_UPLOADED,
+        ServerEvent.VIDEO_STATE_CHANGE,
+        ServerEvent.VIDEO_TRANSCRIPT_COMPLETED,
+        ServerEvent.VIDEO_QUEUE_POSITION,
+        ServerEvent.VIDEO_TRANSCRIPT_SEGMENT,
+    )
+
+    _hubs: 'weakref.WeakKeyDictionary[Broker, VideoEventHub]' = weakref.WeakKeyDictionary()
+
+    broker: Broker
+    listeners: set[VideoListener]
+    queue_positions: dict[str, int]
+
+    def __init__(self, broker: Broker):
+        self.broker = broker
+        self.listeners = set()
+        self.queue_positions = {}
+        for event in self.EVENTS:
+            self.broker.subscribe(event, self._dispatch)
+
+    @classmethod
+    def of(cls, broker: Broker) -> Self:
+        if broker not in cls._hubs:
+            cls._hubs[broker] = cls(broker)
+        return cls._hubs[broker]
+
+    def _dispatch(self, event: ServerEvent, data: Any):
+        uuid = str(data['uuid'])
+        if event == ServerEvent.VIDEO_QUEUE_POSITION:
+            if data['position'] is None:
+                self.queue_positions.pop(uuid, None)
+            else:
+                self.queue_positions[uuid] = data['position']
+
+        if event == ServerEvent.VIDEO_TRANSCRIPT_SEGMENT:
+            for listener in tuple(self.listeners):
+                if listener.wants_segments(uuid):
+                    listener.loop.call_soon_threadsafe(listener.put_segments, uuid, data['segments'])
+            return
+
+        for listener in tuple(self.listeners):
+            if listener.wants(uuid):
+                listener.loop.call_soon_threadsafe(listener.put, event, data)
+
+    @contextlib.asynccontextmanager
+    async def listen(
+        self, uuids: Iterable[str] | None = None, maxsize: int = 64, segments: bool = False
+    ) -> AsyncIterator[VideoListener]:
+        # `uuids` restricts the stream to those videos; None streams every video. `segments` also streams the
+        # transcripts of those videos as they are written, which needs `uuids`
+        listener = VideoListener(
+            asyncio.Queue(maxsize=maxsize),
+            {str(uuid) for uuid in uuids} if uuids is not None else None,
+            asyncio.get_running_loop(),
+            segments,
+        )
+        self.listeners.add(listener)
+        try:
+            yield listener
+        finally:
+            self.listeners.discard(listener)
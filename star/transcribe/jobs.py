@@ -0,0 +1,173 @@
+from sqlalchemy import select, update, func, or_, and_
+from sqlalchemy.exc import SQLAlchemyError
+from pathlib import Path
+from uuid import UUID
+import datetime
+import logging
+
+from star.state import State
+from star.models.transcribe import Video, TranscriptionJob
+from star.transcribe.state import JobState
+from star.transcribe.language import Language
+from star.error import DbError, TranscriptionBacklogFull
+from star.events import ServerEvent
+
+logger = logging.getLogger('star.video')
+
+
+def utcnow() -> datetime.datetime:
+    # leases are compared across nodes, so they are kept in naive UTC rather than whatever the local zone is
+    return datetime.datetime.now(datetime.UTC).replace(tzinfo=None)
+
+
+def claimable(now: datetime.datetime):
+    # a job is up for grabs while it is queued, or once the worker running it has stopped renewing its lease
+    return or_(
+        TranscriptionJob.state == JobState.QUEUED,
+        and_(TranscriptionJob.state == JobState.RUNNING, TranscriptionJob.lease_expires < now),
+    )
+
+
+class JobStore:
+    """
+    ### Durable transcription queue shared by every worker that can reach the database.
+
+    A worker claims a job by taking a lease on it, which it renews with heartbeats for as long as it is working. If
+    the worker dies the lease runs out and the job goes back up for grabs, until it has been tried `max_attempts`
+    times.
+    """
+
+    def enqueue(
+        self, state: State, video: Video, video_file: Path, duration: float | None, language: Language = Language.UNKNOWN
+    ) -> TranscriptionJob:
+        try:
+            logger.info(f'Queueing transcription job for video "{video.title}"')
+            with state.Session.begin() as session:
+                job = TranscriptionJob(
+                    video=video.id, state=JobState.QUEUED, video_path=str(video_file), duration=duration, language=language
+                )
+                session.add(job)
+                session.flush()
+                session.expunge(job)
+            return job
+        except SQLAlchemyError as e:
+            logger.error(f'Failed to queue transcription job for video "{video.title}"')
+            raise DbError() from e
+
+    def queued_count(self, state: State) -> int:
+        with state.Session.begin() as session:
+            query = select(func.count()).select_from(TranscriptionJob).where(TranscriptionJob.state == JobState.QUEUED)
+            return session.scalar(query) or 0
+
+    def admit(self, state: State, backlog_limit: int, retry_after_seconds: int):
+        queued = self.queued_count(state)
+        if queued >= backlog_limit:
+            logger.warning(f'Transcription backlog is full ({queued} waiting), turning new uploads away')
+            raise TranscriptionBacklogFull(retry_after_seconds)
+
+    def claim(self, state: State, owner: str, lease_seconds: float, max_attempts: int) -> tuple[TranscriptionJob, Video] | None:
+        # Leases the shortest claimable job to `owner`, or returns None if there is nothing to do
+        while True:
+            now = utcnow()
+            with state.Session.begin() as session:
+                query = (
+                    select(TranscriptionJob, Video)
+                    .join(Video, Video.id == TranscriptionJob.video)
+                    .where(claimable(now), TranscriptionJob.attempts < max_attempts)
+                    .order_by(TranscriptionJob.duration.asc().nulls_last(), TranscriptionJob.id)
+                    .limit(1)
+                    # Postgres hands every worker a different row; SQLite ignores this and relies on the update below
+                    .with_for_update(of=TranscriptionJob, skip_locked=True)
+                )
+                row = session.execute(query).first()
+                if row is None:
+                    return None
+
+                job, video = row
+                claimed = session.execute(
+                    update(TranscriptionJob)
+                    .where(TranscriptionJob.id == job.id, claimable(now))
+                    .values(
+                        state=JobState.RUNNING,
+                        lease_owner=owner,
+                        lease_expires=now + datetime.timedelta(seconds=lease_seconds),
+                        heartbeat=now,
+                        attempts=TranscriptionJob.attempts + 1,
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+                if claimed.rowcount != 1:
+                    # somebody else got there between our read and our write, so try the next one
+                    continue
+
+                session.refresh(job)
+                session.expunge_all()
+
+            logger.info(f'Claimed transcription job {job.id} for video "{video.title}" (attempt {job.attempts})')
+            return job, video
+
+    def heartbeat(self, state: State, job: TranscriptionJob, owner: str, lease_seconds: float) -> bool:
+        # Renews the lease on `job`. False means the lease was lost and somebody else may be running the job
+        now = utcnow()
+        with state.Session.begin() as session:
+            renewed = session.execute(
+                update(TranscriptionJob)
+                .where(
+                    TranscriptionJob.id == job.id,
+                    TranscriptionJob.state == JobState.RUNNING,
+                    TranscriptionJob.lease_owner == owner,
+                )
+                .values(lease_expires=now + datetime.timedelta(seconds=lease_seconds), heartbeat=now)
+            )
+            return renewed.rowcount == 1
+
+    def finish(self, state: State, job: TranscriptionJob, owner: str, job_state: JobState) -> bool:
+        with state.Session.begin() as session:
+            finished = session.execute(
+                update(TranscriptionJob)
+                .where(
+                    TranscriptionJob.id == job.id,
+                    TranscriptionJob.state == JobState.RUNNING,
+                    TranscriptionJob.lease_owner == owner,
+                )
+                .values(state=job_state, lease_expires=None)
+            )
+            if finished.rowcount != 1:
+                logger.warning(f'Lost the lease on transcription job {job.id} before it finished')
+            return finished.rowcount == 1
+
+    def reap(self, state: State, max_attempts: int) -> list[Video]:
+        # Fails the jobs whose last attempt died with them, returning their videos
+        now = utcnow()
+        with state.Session.begin() as session:
+            query = (
+                select(TranscriptionJob, Video)
+                .join(Video, Video.id == TranscriptionJob.video)
+                .where(claimable(now), TranscriptionJob.attempts >= max_attempts)
+                .with_for_update(of=TranscriptionJob, skip_locked=True)
+            )
+            rows = session.execute(query).all()
+            for job, video in rows:
+                logger.error(f'Transcription job {job.id} for video "{video.title}" failed after {job.attempts} attempts')
+                job.state = JobState.FAILED
+                job.lease_expires = None
+            session.flush()
+            session.expunge_all()
+        return [video for _, video in rows]
+
+    def queue_positions(self, state: State) -> list[tuple[UUID, int]]:
+        with state.Session.begin() as session:
+            query = (
+                select(Video.uuid)
+                .join(TranscriptionJob, TranscriptionJob.video == Video.id)
+                .where(TranscriptionJob.state == JobState.QUEUED)
+                .order_by(TranscriptionJob.duration.asc().nulls_last(), TranscriptionJob.id)
+            )
+            return [(uuid, position) for position, uuid in enumerate(session.scalars(query), start=1)]
+
+    def publish_positions(self, state: State, dequeued: list[UUID] = []):
+        # Every worker computes the same queue from the table, so whoever changed it announces the new order
+        for uuid in dequeued:
+            state.broker.publish(ServerEvent.VIDEO_QUEUE_POSITION, {'uuid': uuid, 'position': None})
+        for uuid, position in self.queue_positions(state):
+            state.broker.publish(ServerEvent.VIDEO_QUEUE_POSITION, {'uuid': uuid, 'position': position})
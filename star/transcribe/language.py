@@ -2,5 +2,44 @@ from enum import StrEnum
 
 
 class Language(StrEnum):
+    # every language whisperx has an alignment model for
     UNKNOWN = 'unknown'
     ENGLISH = 'en'
+    FRENCH = 'fr'
+    GERMAN = 'de'
+    SPANISH = 'es'
+    ITALIAN = 'it'
+    JAPANESE = 'ja'
+    CHINESE = 'zh'
+    DUTCH = 'nl'
+    UKRAINIAN = 'uk'
+    PORTUGUESE = 'pt'
+    ARABIC = 'ar'
+    CZECH = 'cs'
+    RUSSIAN = 'ru'
+    POLISH = 'pl'
+    HUNGARIAN = 'hu'
+    FINNISH = 'fi'
+    PERSIAN = 'fa'
+    GREEK = 'el'
+    TURKISH = 'tr'
+    DANISH = 'da'
+    HEBREW = 'he'
+    VIETNAMESE = 'vi'
+    KOREAN = 'ko'
+    URDU = 'ur'
+    TELUGU = 'te'
+    HINDI = 'hi'
+    CATALAN = 'ca'
+    MALAYALAM = 'ml'
+    NORWEGIAN_BOKMAL = 'no'
+    NORWEGIAN_NYNORSK = 'nn'
+    SLOVAK = 'sk'
+    SLOVENIAN = 'sl'
+    CROATIAN = 'hr'
+    ROMANIAN = 'ro'
+    BASQUE = 'eu'
+    GALICIAN = 'gl'
+    GEORGIAN = 'ka'
+    LATVIAN = 'lv'
+    TAGALOG = 'tl'
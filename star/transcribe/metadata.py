@@ -1,6 +1,33 @@
 import dataclasses
+from typing import Any
+
+# the parts of each stream worth keeping; ffprobe reports a lot more, most of it only useful for debugging ffprobe
+PROBE_STREAM_FIELDS = ('index', 'codec_type', 'codec_name', 'duration', 'sample_rate', 'channels', 'width', 'height')
 
 
 @dataclasses.dataclass
 class VideoMetadata:
     title: str
+    content_hash: str | None = None
+
+
+@dataclasses.dataclass
+class ProbeMetadata:
+    # What ffprobe found in an upload. It is stored on the video, so a file with the same content hash is never probed
+    # twice; see `VideoStore.get_probe_from_hash`
+    duration: float | None
+    format: str | None
+    streams: list[dict[str, Any]]
+
+    @classmethod
+    def from_ffprobe(cls, output: dict) -> 'ProbeMetadata':
+        # `output` is what `-show_format -show_streams -output_format json` prints
+        container = output.get('format', {})
+        try:
+            duration = float(container['duration'])
+        except (KeyError, ValueError):
+            duration = None
+        streams = [
+            {field: stream[field] for field in PROBE_STREAM_FIELDS if field in stream} for stream in output.get('streams', [])
+        ]
+        return cls(duration=duration, format=container.get('format_name'), streams=streams)
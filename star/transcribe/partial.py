@@ -0,0 +1,81 @@
+import json
+import asyncio
+from pathlib import Path
+from typing import Any, Self
+from collections.abc import Iterable
+
+from star.environment import ENVIRONMENT
+from star.events import Broker, ServerEvent
+
+PARTIAL_SUFFIX = '.partial.jsonl'
+
+
+class PartialTranscript:
+    """
+    ### The segments of a transcript that is still being written, one JSON object per line.
+
+    The transcriber appends each segment as soon as it is final, and whoever is running the job relays the lines
+    that are new since it last looked to the broker as a single `VIDEO_TRANSCRIPT_SEGMENT`. Clients that connect
+    part way through read what is already there to catch up. Each segment carries its `index` in the transcript, so
+    a client can tell a replayed one from a new one.
+    """
+
+    path: Path
+    count: int
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.count = 0
+        self._offset = 0
+
+    @classmethod
+    def of(cls, video_uuid: Any) -> Self:
+        # lives alongside the finished transcripts, so every node serving the video can read it
+        return cls(ENVIRONMENT.transcript_folder() / f'{video_uuid}{PARTIAL_SUFFIX}')
+
+    def start(self):
+        # a retried job starts its transcript over
+        self.path.write_text('')
+        self.count = 0
+
+    def append(self, segments: Iterable[dict]):
+        with open(self.path, 'a') as f:
+            for segment in segments:
+                line = {'index': self.count, 'start': segment['start'], 'end': segment['end'], 'text': segment['text']}
+                f.write(json.dumps(line) + '\n')
+                self.count += 1
+
+    def read(self) -> list[dict]:
+        try:
+            text = self.path.read_text()
+        except FileNotFoundError:
+            return []
+        # a line without its newline is still being written
+        return [json.loads(line) for line in text.split('\n')[:-1] if line]
+
+    def poll(self) -> list[dict]:
+        # Returns the segments appended since the last poll
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(self._offset)
+                data = f.read()
+        except FileNotFoundError:
+            return []
+        complete = data[: data.rfind(b'\n') + 1]
+        self._offset += len(complete)
+        return [json.loads(line) for line in complete.splitlines() if line]
+
+    async def relay(self, broker: Broker, video_uuid: Any, interval: float):
+        # Publishes segments as they are appended, until cancelled
+        while True:
+            self.publish(broker, video_uuid)
+            await asyncio.sleep(interval)
+
+    def publish(self, broker: Broker, video_uuid: Any):
+        # everything appended since the last poll goes out as one event
+        segments = self.poll()
+        if segments:
+            broker.publish(ServerEvent.VIDEO_TRANSCRIPT_SEGMENT, {'uuid': video_uuid, 'segments': segments})
+
+    def remove(self):
+        self.path.unlink(missing_ok=True)
@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import dataclasses
+import secrets
+import tempfile
+from pathlib import Path
+from multiprocessing.connection import Client, Connection
+
+from star.settings import GLOBAL_CONFIGURATION
+from star.subprocess.transcribe import Transcribe
+from star.transcribe.language import Language
+from star.error import SubprocessFailed
+
+logger = logging.getLogger('star.video')
+
+# serving processes are handed the key to their socket here, so it never shows up in `ps`
+AUTHKEY_ENVIRONMENT_VARIABLE = 'STAR_TRANSCRIBER_AUTHKEY'
+
+
+class WarmTranscriber:
+    __slots__ = ('process', 'connection', 'jobs')
+
+    process: asyncio.subprocess.Process
+    connection: Connection
+    jobs: int
+
+    def __init__(self, process: asyncio.subprocess.Process, connection: Connection):
+        self.process = process
+        self.connection = connection
+        self.jobs = 0
+
+    def request(self, audio_file: Path, language: Language, partial_file: Path | None) -> dict:
+        # blocks until the job is done, so it is run in a thread
+        self.connection.send(
+            {
+                'audio': str(audio_file),
+                'language': language if language != Language.UNKNOWN else None,
+                'partial': str(partial_file) if partial_file is not None else None,
+            }
+        )
+        return self.connection.recv()
+
+
+class TranscriberPool:
+    """
+    ### Keeps up to `size` transcription processes alive with their models loaded.
+
+    Processes are only started once there is work for them, and each one is replaced after `max_jobs` jobs so that
+    whatever memory torch leaks along the way is handed back. A `size` of 0 disables the pool, and every job starts
+    a fresh `scripts/transcribe.py` instead.
+
+    Workers run with `Transcribe`'s CPU affinity, niceness, I/O priority, environment and memory limit, but not its
+    CPU time limit, which would add up over every job a worker serves; see `Transcribe.WARM_RLIMITS`.
+    """
+
+    size: int
+    max_jobs: int
+    idle: list[WarmTranscriber]
+
+    def __init__(self, size: int | None = None, max_jobs: int | None = None, startup_timeout: float | None = None):
+        if size is None:
+            size = int(GLOBAL_CONFIGURATION.get('transcription_pool_size', 0))
+        if max_jobs is None:
+            max_jobs = int(GLOBAL_CONFIGURATION.get('transcription_pool_max_jobs', 50))
+        if startup_timeout is None:
+            startup_timeout = float(GLOBAL_CONFIGURATION.get('transcription_pool_startup_seconds', 600))
+        self.size = max(0, size)
+        self.max_jobs = max(0, max_jobs)
+        self.startup_timeout = startup_timeout
+
+        self.idle = []
+        self._slots = asyncio.Semaphore(max(1, self.size))
+        self._folder = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0
+
+    async def transcribe(
+        self, audio_file: Path, language: Language = Language.UNKNOWN, partial_file: Path | None = None
+    ) -> tuple[Path, str]:
+        # Returns the subtitles written next to `audio_file` and the language they're in, which is detected if unknown.
+        # Segments are appended to `partial_file` as they're transcribed
+        async with self._slots:
+            # every process is either idle or held by someone inside the semaphore, so there are never more than `size`
+            worker = self.idle.pop() if self.idle else await self._spawn()
+            try:
+                reply = await asyncio.to_thread(worker.request, audio_file, language, partial_file)
+            except BaseException:
+                # we can't tell how far the process got, so it can't be trusted with another job
+                await self._retire(worker, kill=True)
+                raise
+
+            worker.jobs += 1
+            if self.max_jobs and worker.jobs >= self.max_jobs:
+                await self._retire(worker)
+            else:
+                self.idle.append(worker)
+
+        if 'error' in reply:
+            raise SubprocessFailed(Transcribe.COMMAND, reply['error'])
+        return Path(reply['subtitles']), reply['language']
+
+    async def close(self):
+        while self.idle:
+            await self._retire(self.idle.pop())
+
+    async def _spawn(self) -> WarmTranscriber:
+        if self._folder is None:
+            self._folder = tempfile.TemporaryDirectory(prefix='star-transcribers-')
+        address = str(Path(self._folder.name) / f'{secrets.token_hex(8)}.sock')
+        authkey = secrets.token_bytes(32)
+
+        command = Transcribe._get_command(serve=address, max_jobs=self.max_jobs)
+        logger.info(f'Starting warm transcriber `{" ".join(command)}`')
+        process = await asyncio.create_subprocess_exec(
+            *command,
+            cwd=Transcribe.WORKING_DIRECTORY,
+            **dataclasses.replace(Transcribe.resources(), rlimits=Transcribe.WARM_RLIMITS).spawn_options(
+                {AUTHKEY_ENVIRONMENT_VARIABLE: authkey.hex()}
+            ),
+        )  # ty: ignore[missing-argument]
+
+        # the process only listens once its models are loaded, which can take a while on a cold cache
+        try:
+            async with asyncio.timeout(self.startup_timeout):
+                while True:
+                    if process.returncode is not None:
+                        raise SubprocessFailed(' '.join(command), f'exited with {process.returncode} before it was ready')
+                    try:
+                        connection = await asyncio.to_thread(Client, address, family='AF_UNIX', authkey=authkey)
+                        break
+                    except (FileNotFoundError, ConnectionRefusedError):
+                        await asyncio.sleep(0.5)
+        except BaseException:
+            await self._kill(process)
+            raise
+
+        logger.info(f'Warm transcriber {process.pid} is ready')
+        return WarmTranscriber(process, connection)
+
+    async def _retire(self, worker: WarmTranscriber, kill: bool = False):
+        logger.info(f'Retiring warm transcriber {worker.process.pid} after {worker.jobs} jobs')
+        worker.connection.close()
+        if kill:
+            await self._kill(worker.process)
+            return
+        try:
+            # closing the connection tells it to exit, but give it a moment to do so on its own
+            await asyncio.wait_for(worker.process.wait(), 10)
+        except TimeoutError:
+            await self._kill(worker.process)
+
+    async def _kill(self, process: asyncio.subprocess.Process):
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
@@ -0,0 +1,128 @@
+import heapq
+import asyncio
+import logging
+import itertools
+import contextlib
+from collections.abc import AsyncIterator
+
+from star.events import Broker, ServerEvent
+from star.error import TranscriptionBacklogFull
+from star.settings import GLOBAL_CONFIGURATION
+
+logger = logging.getLogger('star.video')
+
+
+class QueuedJob:
+    __slots__ = ('duration', 'sequence', 'key', 'turn')
+
+    duration: float
+    sequence: int
+    key: str
+    turn: asyncio.Future
+
+    def __init__(self, duration: float, sequence: int, key: str, turn: asyncio.Future):
+        self.duration = duration
+        self.sequence = sequence
+        self.key = key
+        self.turn = turn
+
+    def __lt__(self, other: 'QueuedJob') -> bool:
+        # shortest first; equally long jobs run in the order they arrived
+        return (self.duration, self.sequence) < (other.duration, other.sequence)
+
+
+class TranscriptionScheduler:
+    """
+    ### Runs at most `concurrency` transcriptions at once in this worker, shortest video first.
+
+    Jobs wait in a heap ordered by their duration. Every time the queue changes, the jobs whose place in it moved
+    have their new position published as `VIDEO_QUEUE_POSITION`, and jobs leaving the queue publish a position of
+    None. Once `backlog_limit` jobs are waiting, `admit` turns new work away until the backlog drains.
+    """
+
+    broker: Broker
+    concurrency: int
+    backlog_limit: int
+    retry_after_seconds: int
+    queue: list[QueuedJob]
+    running: int
+
+    def __init__(
+        self,
+        broker: Broker,
+        concurrency: int | None = None,
+        backlog_limit: int | None = None,
+        retry_after_seconds: int | None = None,
+    ):
+        self.broker = broker
+        if concurrency is None:
+            concurrency = int(GLOBAL_CONFIGURATION.get('transcription_concurrency', 1))
+        if backlog_limit is None:
+            backlog_limit = int(GLOBAL_CONFIGURATION.get('transcription_backlog_limit', 32))
+        if retry_after_seconds is None:
+            retry_after_seconds = int(GLOBAL_CONFIGURATION.get('transcription_retry_after_seconds', 60))
+        self.concurrency = max(1, concurrency)
+        self.backlog_limit = backlog_limit
+        self.retry_after_seconds = retry_after_seconds
+
+        self.queue = []
+        self.running = 0
+        self._sequence = itertools.count()
+        self._positions = {}
+
+    def admit(self):
+        if len(self.queue) >= self.backlog_limit:
+            logger.warning(f'Transcription backlog is full ({len(self.queue)} waiting), turning new uploads away')
+            raise TranscriptionBacklogFull(self.retry_after_seconds)
+
+    def position(self, key: str) -> int | None:
+        return self._positions.get(key)
+
+    @contextlib.asynccontextmanager
+    async def slot(self, key: str, duration: float) -> AsyncIterator[None]:
+        # Waits in the queue for a free slot, which is held for the lifetime of the context.
+        # `key` identifies the job in queue position events
+        entry = QueuedJob(duration, next(self._sequence), key, asyncio.get_running_loop().create_future())
+        heapq.heappush(self.queue, entry)
+        logger.info(f'Queued transcription {key} ({duration:.1f}s long, {len(self.queue)} waiting)')
+        self._dispatch()
+
+        try:
+            await entry.turn
+        except asyncio.CancelledError:
+            if entry.turn.done() and not entry.turn.cancelled():
+                # we were handed a slot but never got to use it
+                self._release()
+            else:
+                self.queue.remove(entry)
+                heapq.heapify(self.queue)
+                self._publish_positions()
+            raise
+
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _release(self):
+        self.running -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        while self.running < self.concurrency and self.queue:
+            entry = heapq.heappop(self.queue)
+            self.running += 1
+            entry.turn.set_result(None)
+        self._publish_positions()
+
+    def _publish_positions(self):
+        positions = {entry.key: position for position, entry in enumerate(sorted(self.queue), start=1)}
+        for key in self._positions.keys() - positions.keys():
+            self._publish(key, None)
+        for key, position in positions.items():
+            if self._positions.get(key) != position:
+                self._publish(key, position)
+        self._positions = positions
+
+    def _publish(self, key: str, position: int | None):
+        self.broker.publish(ServerEvent.VIDEO_QUEUE_POSITION, {'uuid': key, 'position': position})
@@ -0,0 +1,62 @@
+import dataclasses
+from collections.abc import Sequence
+
+
+@dataclasses.dataclass(frozen=True)
+class Window:
+    # Times are in seconds. The window is transcribed from `start` to `end`, but only the segments centred
+    # between `keep_start` and `keep_end` make it into the transcript
+    start: float
+    end: float
+    keep_start: float
+    keep_end: float
+
+    def keeps(self, segment: dict) -> bool:
+        middle = (segment['start'] + segment['end']) / 2
+        return self.keep_start <= middle < self.keep_end
+
+
+def plan_windows(
+    frame_energies: Sequence[float],
+    frame_seconds: float,
+    window_seconds: float,
+    overlap_seconds: float,
+    search_seconds: float | None = None,
+) -> list[Window]:
+    """
+    ### Splits audio into windows of about `window_seconds`, cutting at the quietest moment near each boundary.
+
+    `frame_energies` is the mean square of each `frame_seconds` of audio. Windows reach `overlap_seconds` past
+    each cut on both sides, so that a word spoken across a cut is heard whole by at least one window; the cut
+    itself is where the transcripts of neighbouring windows are stitched together.
+    """
+    duration = len(frame_energies) * frame_seconds
+    if search_seconds is None:
+        search_seconds = window_seconds / 10
+
+    cuts = [0.0]
+    while duration - cuts[-1] >= window_seconds * 1.5:
+        target = cuts[-1] + window_seconds
+        first = max(int((target - search_seconds) / frame_seconds), int(cuts[-1] / frame_seconds) + 1)
+        last = min(int((target + search_seconds) / frame_seconds), len(frame_energies) - 1)
+        # the quietest frame, preferring the one closest to the target on ties
+        quietest = min(range(first, last + 1), key=lambda frame: (frame_energies[frame], abs(frame * frame_seconds - target)))
+        cuts.append(quietest * frame_seconds)
+    cuts.append(duration)
+
+    return [
+        Window(
+            start=max(0.0, keep_start - overlap_seconds),
+            end=min(duration, keep_end + overlap_seconds),
+            keep_start=keep_start if keep_start > 0 else float('-inf'),
+            keep_end=keep_end if keep_end < duration else float('inf'),
+        )
+        for keep_start, keep_end in zip(cuts, cuts[1:])
+    ]
+
+
+def stitch(transcribed: Sequence[tuple[Window, Sequence[dict]]]) -> list[dict]:
+    # Joins the segments of every window, already offset to the start of the audio, into one transcript. Each
+    # segment is kept by exactly one window, so the text in the overlaps isn't repeated
+    segments = [segment for window, window_segments in transcribed for segment in window_segments if window.keeps(segment)]
+    return sorted(segments, key=lambda segment: segment['start'])
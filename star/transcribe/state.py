@@ -6,3 +6,10 @@ class VideoState(StrEnum):
     PROCESSING = 'Processing Transcript'
     COMPLETED = 'Completed!'
     FAILED = 'Failed'
+
+
+class JobState(StrEnum):
+    QUEUED = 'Queued'
+    RUNNING = 'Running'
+    COMPLETED = 'Completed'
+    FAILED = 'Failed'
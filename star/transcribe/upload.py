@@ -0,0 +1,474 @@
+import os
+import json
+import time
+import fcntl
+import shutil
+import logging
+import hashlib
+import contextlib
+import dataclasses
+from uuid import UUID, uuid4
+from pathlib import Path
+from typing import Self
+from collections.abc import AsyncIterable, AsyncIterator, Callable, Iterator, Mapping
+from werkzeug.sansio.multipart import MultipartDecoder, Preamble, Field, File, Data, Epilogue, NeedData
+
+from star.error import UploadError, UploadSessionNotFound, UploadSessionMismatch, UploadSessionCompleted
+from star.transcribe.language import Language
+from star.settings import GLOBAL_CONFIGURATION
+
+logger = logging.getLogger('star.video')
+
+# An upload is identified by the SHA-256 of the SHA-256 of every block of this size. Unlike a plain hash of the file,
+# it can be built from chunks arriving in any order, and computed by a client before it uploads anything
+HASH_BLOCK_SIZE = 8 * 1024 * 1024
+
+
+@dataclasses.dataclass(frozen=True)
+class ChunkInfo:
+    filename: str
+    index: int
+    total_chunks: int
+    uuid: str
+    offset: int
+    total_size: int | None
+    # what the video is spoken in, if the uploader knows
+    language: Language = Language.UNKNOWN
+
+    @classmethod
+    def from_form(cls, form: Mapping[str, str], filename: str | None = None) -> 'ChunkInfo':
+        # dropzone's chunk parameters; an upload that wasn't chunked is a single chunk holding the whole file
+        try:
+            return cls(
+                filename=form.get('filename', filename or ''),
+                index=int(form.get('dzchunkindex', 0)),
+                total_chunks=int(form.get('dztotalchunkcount', 1)),
+                uuid=form.get('dzuuid', ''),
+                offset=int(form.get('dzchunkbyteoffset', 0)),
+                total_size=int(form['dztotalfilesize']) if 'dztotalfilesize' in form else None,
+                language=Language(form.get('language', Language.UNKNOWN)),
+            )
+        except ValueError as e:
+            raise UploadError(f'Malformed chunk parameters: {e}') from e
+
+
+class ChunkWriter:
+    """
+    ### Writes one chunk front to back, starting at its offset in the part file.
+
+    Chunks that start on a hash block boundary hash their blocks as they're written; see `HASH_BLOCK_SIZE`.
+    """
+
+    __slots__ = ('chunk_index', 'position', 'total_size', 'block_digests', '_fd', '_hasher')
+
+    chunk_index: int
+    position: int
+    total_size: int | None
+    block_digests: dict[int, bytes]
+
+    def __init__(self, fd: int, chunk_index: int, chunk_offset: int, total_size: int | None):
+        self._fd = fd
+        self.chunk_index = chunk_index
+        self.position = chunk_offset
+        self.total_size = total_size
+        self.block_digests = {}
+        self._hasher = hashlib.sha256() if chunk_offset % HASH_BLOCK_SIZE == 0 else None
+
+    def write(self, data: bytes):
+        if self.total_size is not None and self.position + len(data) > self.total_size:
+            raise UploadError(f'Chunk {self.chunk_index} does not fit in the file')
+
+        with memoryview(data) as view:
+            written = 0
+            while written < len(view):
+                written += os.pwrite(self._fd, view[written:], self.position + written)
+            self._hash(view)
+        self.position += written
+
+    def _hash(self, view: memoryview):
+        if self._hasher is None:
+            return
+
+        position = self.position
+        while len(view) > 0:
+            block_remaining = HASH_BLOCK_SIZE - position % HASH_BLOCK_SIZE
+            self._hasher.update(view[:block_remaining])
+            position += min(block_remaining, len(view))
+            view = view[block_remaining:]
+            if position % HASH_BLOCK_SIZE == 0:
+                self.block_digests[position // HASH_BLOCK_SIZE - 1] = self._hasher.digest()
+                self._hasher = hashlib.sha256()
+
+        # the file's last block is the only one allowed to be short
+        if position == self.total_size and position % HASH_BLOCK_SIZE != 0:
+            self.block_digests[position // HASH_BLOCK_SIZE] = self._hasher.digest()
+            self._hasher = None
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class ChunkedUpload:
+    """
+    ### One upload session, assembled in place.
+
+    Every chunk is written straight to its offset in a single preallocated part file, so once the last chunk lands
+    the file is already whole. Which chunks have arrived is tracked in a small bitmap next to it; the bitmap is
+    only touched under a lock, so exactly one request sees the upload go from incomplete to complete no matter
+    how many workers its chunks were spread across, or in what order they arrived. A finished session is kept as a
+    tombstone until it expires, so a chunk that turns up late is turned away rather than starting the upload over.
+    """
+
+    PART_NAME: str = 'upload.part'
+    BITMAP_NAME: str = 'chunks.bitmap'
+    SESSION_NAME: str = 'session.json'
+    DIGESTS_NAME: str = 'blocks.sha256'
+
+    folder: Path
+    part_path: Path
+    bitmap_path: Path
+    session_path: Path
+    digests_path: Path
+    total_chunks: int
+
+    def __init__(self, folder: Path, total_chunks: int):
+        if total_chunks < 1:
+            raise UploadError(f'Upload must have at least one chunk, not {total_chunks}')
+        self.folder = folder
+        self.part_path = folder / self.PART_NAME
+        self.bitmap_path = folder / self.BITMAP_NAME
+        self.session_path = folder / self.SESSION_NAME
+        self.digests_path = folder / self.DIGESTS_NAME
+        self.total_chunks = total_chunks
+
+    @classmethod
+    def load(cls, folder: Path) -> Self:
+        try:
+            session = json.loads((folder / cls.SESSION_NAME).read_text())
+        except (FileNotFoundError, ValueError) as e:
+            raise UploadSessionNotFound(folder.name) from e
+        return cls(folder, session['total_chunks'])
+
+    @contextlib.contextmanager
+    def _locked(self) -> Iterator[int]:
+        try:
+            fd = os.open(self.bitmap_path, os.O_RDWR | os.O_CREAT, 0o600)
+        except FileNotFoundError as e:
+            # the session was finished or expired underneath us
+            raise UploadSessionNotFound(self.folder.name) from e
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield fd
+        finally:
+            os.close(fd)
+
+    def _write_session(self, session: dict):
+        # replaced rather than rewritten, since `load` reads it without taking the lock
+        temporary = self.session_path.with_name(f'{self.SESSION_NAME}.tmp')
+        temporary.write_text(json.dumps(session))
+        os.replace(temporary, self.session_path)
+
+    def register(self, filename: str, total_size: int | None):
+        # Chunks of one upload can land on any worker in any order; whichever gets there first records the session,
+        # and every other chunk has to agree with it
+        self.folder.mkdir(exist_ok=True)
+        with self._locked():
+            try:
+                session = json.loads(self.session_path.read_text())
+            except FileNotFoundError:
+                session = {'filename': filename, 'total_chunks': self.total_chunks, 'total_size': total_size}
+                self._write_session(session)
+                logger.info(f'Started upload session {self.folder.name} for "{filename}" ({self.total_chunks} chunks)')
+                return
+
+        if session.get('completed'):
+            raise UploadSessionCompleted(self.folder.name)
+        if session['total_chunks'] != self.total_chunks:
+            raise UploadSessionMismatch(self.folder.name, f'has {session["total_chunks"]} chunks, not {self.total_chunks}')
+        if session['total_size'] != total_size:
+            raise UploadSessionMismatch(self.folder.name, f'is {session["total_size"]} bytes, not {total_size}')
+
+    def _bitmap_size(self) -> int:
+        return (self.total_chunks + 7) // 8
+
+    def _read_bitmap(self, fd: int) -> bytearray:
+        return bytearray(os.pread(fd, self._bitmap_size(), 0).ljust(self._bitmap_size(), b'\x00'))
+
+    def open_chunk(self, chunk_index: int, chunk_offset: int, total_size: int | None = None) -> ChunkWriter:
+        if not 0 <= chunk_index < self.total_chunks:
+            raise UploadError(f'Chunk {chunk_index} is out of range for an upload of {self.total_chunks} chunks')
+        if chunk_offset < 0 or (total_size is not None and chunk_offset > total_size):
+            raise UploadError(f'Chunk {chunk_index} does not fit in the file')
+
+        try:
+            fd = os.open(self.part_path, os.O_WRONLY | os.O_CREAT, 0o600)
+        except FileNotFoundError as e:
+            raise UploadSessionNotFound(self.folder.name) from e
+        try:
+            if total_size is not None and os.fstat(fd).st_size < total_size:
+                # sparse, so this is free; chunks fill it in as they arrive
+                os.ftruncate(fd, total_size)
+        except OSError:
+            os.close(fd)
+            raise
+        return ChunkWriter(fd, chunk_index, chunk_offset, total_size)
+
+    def write_chunk(self, chunk_index: int, chunk_offset: int, data: bytes, total_size: int | None = None) -> bool:
+        # Returns True if this chunk completed the upload
+        writer = self.open_chunk(chunk_index, chunk_offset, total_size)
+        try:
+            writer.write(data)
+        finally:
+            writer.close()
+        return self.mark_received(chunk_index, writer.block_digests)
+
+    def mark_received(self, chunk_index: int, block_digests: dict[int, bytes] | None = None) -> bool:
+        # Returns True if this chunk completed the upload. Only call it once the whole chunk has been written
+        with self._locked() as fd:
+            if block_digests:
+                with open(self.digests_path, 'r+b' if self.digests_path.exists() else 'wb') as digests:
+                    for block_index, digest in block_digests.items():
+                        digests.seek(block_index * hashlib.sha256().digest_size)
+                        digests.write(digest)
+
+            bitmap = self._read_bitmap(fd)
+            was_complete = self._is_complete(bitmap)
+
+            byte, bit = divmod(chunk_index, 8)
+            bitmap[byte] |= 1 << bit
+            os.pwrite(fd, bitmap, 0)
+            return not was_complete and self._is_complete(bitmap)
+
+    def missing_chunks(self) -> list[int]:
+        with self._locked() as fd:
+            bitmap = self._read_bitmap(fd)
+        return [idx for idx in range(self.total_chunks) if not bitmap[idx // 8] & (1 << (idx % 8))]
+
+    def _is_complete(self, bitmap: bytearray) -> bool:
+        full_bytes, remaining_bits = divmod(self.total_chunks, 8)
+        if bitmap[:full_bytes].count(0xFF) != full_bytes:
+            return False
+        mask = (1 << remaining_bits) - 1
+        return remaining_bits == 0 or bitmap[full_bytes] & mask == mask
+
+    def content_hash(self) -> str:
+        # Only call once the upload is complete. Blocks no chunk could hash on the way in are read back from disk
+        digest_size = hashlib.sha256().digest_size
+        try:
+            digests = bytearray(self.digests_path.read_bytes())
+        except FileNotFoundError:
+            digests = bytearray()
+
+        with open(self.part_path, 'rb') as part:
+            size = os.fstat(part.fileno()).st_size
+            block_count = (size + HASH_BLOCK_SIZE - 1) // HASH_BLOCK_SIZE
+            digests = digests[: block_count * digest_size].ljust(block_count * digest_size, b'\x00')
+            missing = 0
+            for block_index in range(block_count):
+                offset = block_index * digest_size
+                if any(digests[offset : offset + digest_size]):
+                    continue
+
+                missing += 1
+                hasher = hashlib.sha256()
+                part.seek(block_index * HASH_BLOCK_SIZE)
+                remaining = min(HASH_BLOCK_SIZE, size - block_index * HASH_BLOCK_SIZE)
+                while remaining > 0:
+                    data = part.read(min(remaining, 1024 * 1024))
+                    if not data:
+                        break
+                    hasher.update(data)
+                    remaining -= len(data)
+                digests[offset : offset + digest_size] = hasher.digest()
+
+        if missing > 0:
+            logger.debug(f'Hashed {missing}/{block_count} blocks of {self.folder.name} after the upload completed')
+        return hashlib.sha256(digests).hexdigest()
+
+    def finish(self, destination: Path) -> Path:
+        # the part file is already the whole upload, so finishing is a rename on the same filesystem. What's left of
+        # the session is only its record, marked as completed
+        with self._locked():
+            os.replace(self.part_path, destination)
+            session = json.loads(self.session_path.read_text())
+            self._write_session({**session, 'completed': True})
+        self.digests_path.unlink(missing_ok=True)
+        logger.info(f'Assembled {destination} from {self.total_chunks} chunks')
+        return destination
+
+
+class UploadRegistry:
+    """
+    ### Every upload session in progress on this host.
+
+    Sessions are folders in the upload folder named after dropzone's upload uuid, so every worker sees the same
+    sessions. Sessions that haven't seen a chunk in `ttl_seconds` are treated as abandoned and swept away whenever
+    a new session starts.
+    """
+
+    PREFIX: str = 'chunks_'
+
+    folder: Path
+    ttl_seconds: float
+
+    def __init__(self, folder: Path, ttl_seconds: float | None = None):
+        self.folder = folder
+        if ttl_seconds is None:
+            ttl_seconds = float(GLOBAL_CONFIGURATION.get('upload_session_ttl', 24 * 60 * 60))
+        self.ttl_seconds = ttl_seconds
+
+    def _session_folder(self, upload_uuid: str) -> Path:
+        # the uuid comes straight from the client, so it has to be a real uuid before it goes anywhere near a path
+        try:
+            upload_uuid = str(UUID(upload_uuid))
+        except ValueError as e:
+            raise UploadError(f'"{upload_uuid}" is not a valid upload id') from e
+        return self.folder / f'{self.PREFIX}{upload_uuid}'
+
+    def exists(self, upload_uuid: str) -> bool:
+        # a file sent in one go always starts a new session
+        return bool(upload_uuid) and self._session_folder(upload_uuid).exists()
+
+    def open(self, chunk: ChunkInfo) -> ChunkedUpload:
+        upload_uuid = chunk.uuid
+        if not upload_uuid:
+            if chunk.total_chunks != 1:
+                raise UploadError('Chunked uploads need an upload id')
+            # a file sent in one go is a session of its own
+            upload_uuid = str(uuid4())
+
+        folder = self._session_folder(upload_uuid)
+        if not folder.exists():
+            self.sweep()
+
+        upload = ChunkedUpload(folder, chunk.total_chunks)
+        upload.register(chunk.filename, chunk.total_size)
+        return upload
+
+    def get(self, upload_uuid: str) -> ChunkedUpload:
+        return ChunkedUpload.load(self._session_folder(upload_uuid))
+
+    def claim(self, filename: str) -> Path:
+        # Reserves a path in the upload folder for a finished upload, numbering it if the name is taken. The name is
+        # taken by creating the file, so two uploads finishing at once can't both end up with it
+        name, dot, suffix = filename.rpartition('.')
+        counter = 0
+        while True:
+            if counter == 0:
+                path = self.folder / filename
+            elif dot:
+                path = self.folder / f'{name}_{counter}.{suffix}'
+            else:
+                path = self.folder / f'{filename}_{counter}'
+            try:
+                os.close(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644))
+                return path
+            except (FileExistsError, IsADirectoryError):
+                counter += 1
+
+    def sweep(self) -> int:
+        expired = 0
+        cutoff = time.time() - self.ttl_seconds
+        for folder in self.folder.glob(f'{self.PREFIX}*'):
+            try:
+                last_active = max(path.stat().st_mtime for path in [folder, *folder.iterdir()])
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+            if last_active >= cutoff:
+                continue
+
+            logger.info(f'Upload session {folder.name} has been idle for over {self.ttl_seconds}s, removing it')
+            shutil.rmtree(folder, ignore_errors=True)
+            expired += 1
+        return expired
+
+
+class MultipartUpload:
+    """
+    ### Reads a multipart/form-data body as it arrives, without holding any file part in memory.
+
+    Form fields are small and kept. When a file part starts, `open_file` is called with the fields sent before it
+    and the part's filename, and every decoded block of the file is written straight to the writer it returns. The
+    writer is closed once the part ends, or if the body is cut off part way through.
+    """
+
+    MAX_FIELD_SIZE: int = 64 * 1024
+    MAX_PARTS: int = 32
+
+    boundary: bytes
+    open_file: Callable[[dict[str, str], str | None], ChunkWriter]
+
+    def __init__(self, boundary: bytes, open_file: Callable[[dict[str, str], str | None], ChunkWriter]):
+        self.boundary = boundary
+        self.open_file = open_file
+
+    async def _blocks(self, body: AsyncIterable[bytes]) -> AsyncIterator[bytes | None]:
+        # werkzeug's decoder mistakes the CRLF before a boundary for file data when a block ends right after the
+        # boundary marker, so a block is never allowed to end there; the bytes after the cut wait for the next one.
+        # The decoder also only emits the epilogue once it's told the body is over, which is the trailing None
+        marker = b'--' + self.boundary
+        lookback = len(marker) + 1
+        fed = b''
+        held = b''
+        async for data in body:
+            pending = held + data if held else data
+            cut = len(pending)
+            while cut > 0:
+                tail = fed[-lookback:] + pending[max(0, cut - lookback) : cut]
+                if tail.endswith(marker):
+                    cut -= 1
+                elif tail[:-1].endswith(marker):
+                    cut -= 2
+                else:
+                    break
+
+            if cut > 0:
+                yield pending[:cut]
+                fed = (fed + pending[max(0, cut - lookback) : cut])[-lookback:]
+            held = pending[cut:]
+        if held:
+            yield held
+        yield None
+
+    async def receive(self, body: AsyncIterable[bytes]) -> dict[str, str]:
+        decoder = MultipartDecoder(self.boundary, max_parts=self.MAX_PARTS)
+        fields = {}
+        field_name = None
+        field_value = bytearray()
+        writer = None
+        try:
+            async for data in self._blocks(body):
+                decoder.receive_data(data)
+                event = decoder.next_event()
+                while not isinstance(event, NeedData):
+                    if isinstance(event, Epilogue):
+                        return fields
+                    elif isinstance(event, Field):
+                        field_name = event.name
+                        field_value.clear()
+                    elif isinstance(event, File):
+                        writer = self.open_file(dict(fields), event.filename)
+                    elif isinstance(event, Data) and writer is not None:
+                        writer.write(event.data)
+                        if not event.more_data:
+                            writer.close()
+                            writer = None
+                    elif isinstance(event, Data):
+                        field_value += event.data
+                        if len(field_value) > self.MAX_FIELD_SIZE:
+                            raise UploadError(f'Form field "{field_name}" is too large')
+                        if not event.more_data:
+                            fields[field_name] = field_value.decode('utf-8', 'replace')
+                    elif not isinstance(event, Preamble):
+                        raise UploadError(f'Unexpected multipart event {event}')
+                    event = decoder.next_event()
+
+            raise UploadError('Upload ended part way through')
+        except ValueError as e:
+            # werkzeug raises ValueError for malformed bodies
+            raise UploadError(f'Malformed multipart body: {e}') from e
+        finally:
+            if writer is not None:
+                writer.close()
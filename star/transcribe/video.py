@@ -2,12 +2,14 @@ from sqlalchemy import update, select
 from sqlalchemy.exc import SQLAlchemyError
 from pathlib import Path
 import logging
+import dataclasses
 from uuid import UUID
+from collections.abc import Sequence
 
 from star.state import State
 from star.models.transcribe import Video, Transcription
 from star.transcribe.state import VideoState
-from star.transcribe.metadata import VideoMetadata
+from star.transcribe.metadata import VideoMetadata, ProbeMetadata
 from star.error import DbError, VideoNotFoundError
 from star.events import ServerEvent
 
@@ -19,7 +21,7 @@ class VideoStore:
         try:
             logger.info(f'Creating video with title "{video_metadata.title}"')
             with state.Session.begin() as session:
-                video = Video(title=video_metadata.title, state=VideoState.PENDING)
+                video = Video(title=video_metadata.title, state=VideoState.PENDING, content_hash=video_metadata.content_hash)
                 session.add(video)
                 session.flush()
                 session.expunge(video)
@@ -70,16 +72,63 @@ class VideoStore:
             session.expunge_all()
         return video, transcript
 
+    def get_transcribed_video_from_hash(self, state: State, content_hash: str) -> tuple[Video, Transcription] | None:
+        with state.Session.begin() as session:
+            logger.info(f'Looking for a transcribed video with content hash "{content_hash}"')
+            query = (
+                select(Video, Transcription)
+                .join(Transcription, Transcription.id == Video.transcript)
+                .where(Video.content_hash == content_hash)
+                .order_by(Video.id)
+                .limit(1)
+            )
+            row = session.execute(query).first()
+            session.expunge_all()
+        return tuple(row) if row is not None else None
+
+    def get_probe_from_hash(self, state: State, content_hash: str) -> ProbeMetadata | None:
+        with state.Session.begin() as session:
+            query = (
+                select(Video.probe)
+                .where(Video.content_hash == content_hash, Video.probe.is_not(None))
+                .order_by(Video.id)
+                .limit(1)
+            )
+            probe = session.scalar(query)
+        return ProbeMetadata(**probe) if probe is not None else None
+
+    def set_probe(self, state: State, video: Video, probe: ProbeMetadata):
+        try:
+            with state.Session.begin() as session:
+                session.execute(
+                    update(Video).where(Video.id == video.id).values(probe=dataclasses.asdict(probe), duration=probe.duration)
+                )
+            video.probe = dataclasses.asdict(probe)
+            video.duration = probe.duration
+        except SQLAlchemyError as e:
+            logger.error(f'Failed to store probe metadata for video "{video.title}"')
+            raise DbError() from e
+
     def get_all_videos(
-        self, state: State, count: int, offset_id: int, filter: list[VideoState] = []
-    ) -> list[tuple[Video, Transcription | None]]:
+        self, state: State, count: int, cursor: int | None = None, states: Sequence[VideoState] = ()
+    ) -> tuple[list[tuple[Video, Transcription | None]], int | None]:
+        # Keyset pagination: pages are walked newest first, and `cursor` is the id of the last video on the previous
+        # page. Returns the page along with the cursor for the next one, or None if this is the last page. Only videos
+        # in one of `states` are listed, unless it is empty
         count = max(1, min(100, count))  # Ensure count is at least 1
-        offset = max(0, offset_id)
         with state.Session.begin() as session:
-            logger.info(f'Fetching all videos and their transcripts, if applicable. (Count: {count}. Offset: {offset})')
+            logger.info(f'Fetching videos and their transcripts, if applicable. (Count: {count}. Cursor: {cursor})')
             query = select(Video, Transcription).join(Transcription, Transcription.id == Video.transcript, isouter=True)
-            if filter:
-                query = query.where(Video.state.in_(filter))
-            videos = list(session.execute(query.order_by(Video.id.desc())).all())
+            if states:
+                query = query.where(Video.state.in_(states))
+            if cursor is not None:
+                query = query.where(Video.id < cursor)
+            # fetch one extra row to tell whether there is another page without a separate count query
+            videos = list(session.execute(query.order_by(Video.id.desc()).limit(count + 1)).all())
             session.expunge_all()
-        return list(videos)
+
+        next_cursor = None
+        if len(videos) > count:
+            videos = videos[:count]
+            next_cursor = videos[-1][0].id
+        return videos, next_cursor
@@ -0,0 +1,163 @@
+import os
+import socket
+import asyncio
+import logging
+from pathlib import Path
+from uuid import uuid4
+from logging.config import dictConfig
+
+from star.log import config as log_config
+from star.state import State
+from star.settings import GLOBAL_CONFIGURATION
+from star.models.transcribe import Video, TranscriptionJob, OWNER_LENGTH
+from star.transcribe.jobs import JobStore
+from star.transcribe.state import JobState, VideoState
+from star.transcribe.language import Language
+from star.transcribe.video import VideoStore
+
+logger = logging.getLogger('star.video')
+
+
+class TranscriptionWorker:
+    """
+    ### Runs transcription jobs queued in the database, `concurrency` at a time.
+
+    Any number of workers, on any node that shares the upload folder and the database with the web tier, can run
+    side by side. Each one heartbeats the jobs it holds every third of a lease, and stops working on a job as soon
+    as it finds its lease has been lost.
+
+    Progress is published on the worker's own broker, so a worker on another node than the web tier needs the
+    'database' `broker_transport` for clients to hear about it and for cached pages to be invalidated.
+    """
+
+    state: State
+    owner: str
+    concurrency: int
+    lease_seconds: float
+    poll_seconds: float
+    max_attempts: int
+    running: set[asyncio.Task]
+
+    def __init__(
+        self,
+        state: State,
+        owner: str | None = None,
+        concurrency: int | None = None,
+        lease_seconds: float | None = None,
+        poll_seconds: float | None = None,
+        max_attempts: int | None = None,
+    ):
+        self.state = state
+        if owner is None:
+            owner = f'{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}'
+        if concurrency is None:
+            concurrency = int(GLOBAL_CONFIGURATION.get('transcription_concurrency', 1))
+        if lease_seconds is None:
+            lease_seconds = float(GLOBAL_CONFIGURATION.get('transcription_lease_seconds', 60))
+        if poll_seconds is None:
+            poll_seconds = float(GLOBAL_CONFIGURATION.get('transcription_poll_seconds', 5))
+        if max_attempts is None:
+            max_attempts = int(GLOBAL_CONFIGURATION.get('transcription_max_attempts', 3))
+        self.owner = owner[-OWNER_LENGTH:]
+        self.concurrency = max(1, concurrency)
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self.max_attempts = max_attempts
+
+        self.running = set()
+        self._wake = asyncio.Event()
+
+    def _fill(self):
+        # Claims jobs until every slot is busy or the queue is empty
+        for video in JobStore().reap(self.state, self.max_attempts):
+            VideoStore().update_video_state(self.state, video, VideoState.FAILED)
+
+        claimed = []
+        while len(self.running) < self.concurrency:
+            job = JobStore().claim(self.state, self.owner, self.lease_seconds, self.max_attempts)
+            if job is None:
+                break
+            claimed.append(job[1].uuid)
+            task = asyncio.create_task(self.run_job(*job))
+            self.running.add(task)
+            task.add_done_callback(self._done)
+
+        if claimed:
+            JobStore().publish_positions(self.state, claimed)
+
+    def _done(self, task: asyncio.Task):
+        self.running.discard(task)
+        self._wake.set()
+
+    async def run(self):
+        logger.info(f'Transcription worker {self.owner} started with {self.concurrency} slots')
+        try:
+            while True:
+                self._wake.clear()
+                try:
+                    self._fill()
+                except Exception as e:
+                    # the database going away shouldn't take the worker with it
+                    logger.error(f'Transcription worker {self.owner} failed to claim jobs:\n{e}')
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.poll_seconds)
+                except TimeoutError:
+                    pass
+        finally:
+            for task in self.running:
+                task.cancel()
+            await asyncio.gather(*self.running, return_exceptions=True)
+
+    async def process(self, job: TranscriptionJob, video: Video) -> bool:
+        from star.transcribe.api import VideoApi
+
+        return await VideoApi().process_video(self.state, Path(job.video_path), video, Language(job.language))
+
+    async def run_job(self, job: TranscriptionJob, video: Video):
+        work = asyncio.create_task(self.process(job, video))
+        try:
+            while True:
+                done, _ = await asyncio.wait({work}, timeout=self.lease_seconds / 3)
+                if done:
+                    break
+                try:
+                    renewed = JobStore().heartbeat(self.state, job, self.owner, self.lease_seconds)
+                except Exception as e:
+                    # keep working; if the database stays away for a whole lease, the next heartbeat finds out
+                    logger.warning(f'Failed to renew the lease on transcription job {job.id}:\n{e}')
+                    continue
+                if not renewed:
+                    logger.warning(f'Lost the lease on transcription job {job.id}, abandoning video "{video.title}"')
+                    work.cancel()
+                    await asyncio.gather(work, return_exceptions=True)
+                    return
+        except asyncio.CancelledError:
+            # the lease runs out and another worker picks the job back up
+            work.cancel()
+            await asyncio.gather(work, return_exceptions=True)
+            raise
+
+        try:
+            succeeded = work.result()
+        except Exception as e:
+            logger.error(f'Transcription job {job.id} raised:\n{e}')
+            succeeded = False
+        JobStore().finish(self.state, job, self.owner, JobState.COMPLETED if succeeded else JobState.FAILED)
+
+
+async def serve(state: State):
+    state.broker.start()
+    try:
+        await TranscriptionWorker(state).run()
+    finally:
+        await state.transcribers.close()
+        state.broker.stop()
+
+
+def main():
+    dictConfig(log_config())
+    asyncio.run(serve(State()))
+
+
+if __name__ == '__main__':
+    main()
@@ -7,7 +7,7 @@ import itertools
 from collections.abc import Callable, Awaitable, AsyncIterator
 from collections.abc import AsyncIterator
 from pathlib import Path
-from quart import request, render_template_string
+from quart import request, render_template_string, stream_with_context
 
 from star.error import ExpectedJson, BadArguments, JsonPayloadError, ServerError, CacheMiss
 from star.state import State
@@ -339,6 +339,8 @@ def sse_endpoint(func: Callable[..., AsyncIterator[WebEvent | BaseEvent]]):
 
     @functools.wraps(func)
     async def wrapper(*args, **kwargs) -> ServerSentEventResponse:
+        # keep the request around so streams can read query arguments once they start
+        @stream_with_context
         async def async_byte_generator():
             async for event in func(*args, **kwargs):
                 yield event.encode()
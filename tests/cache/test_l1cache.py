@@ -21,7 +21,7 @@ def cache():
 def populated_cache():
     cache = L1Cache()
     cache.insert('key1', 'value1', None)
-    cache.insert('key2', 'value2', ServerEvent.MISSION_UPLOADED)
+    cache.insert('key2', 'value2', ServerEvent.VIDEO_UPLOADED)
     cache.insert('key3', 'value3', ServerEvent.TEST_EVENT)
     return cache
 
@@ -50,6 +50,18 @@ def test__l1cache__insert__multiple_items_pops_if_out_of_range(mocker, small_cac
     assert small_cache.insert('key2', 'value2', None) == ['value1']
 
 
+def test__l1cache__insert__too_large_replaces_old_value(mocker, small_cache, small_bytes):
+    evicted = mocker.Mock()
+    small_cache.on_evict = evicted
+    mocker.patch.object(small_cache, '_getsize', side_effect=[10, small_bytes + 1])
+    small_cache.insert('key1', 'value1', ServerEvent.TEST_EVENT)
+    assert small_cache.insert('key1', 'value2', ServerEvent.TEST_EVENT) == ['value2']
+    assert small_cache.get('key1') is None
+    assert small_cache.current_size_bytes == 0
+    assert small_cache.event_map == {}
+    evicted.assert_called_once_with('key1', 'value2', ServerEvent.TEST_EVENT)
+
+
 def test__l1cache__insert__resets_pop_order(mocker, small_cache, small_bytes):
     mocker.patch.object(small_cache, '_getsize', return_value=small_bytes // 3 + 1)
     assert small_cache.insert('key1', 'value1', None) == []
@@ -118,7 +130,7 @@ def test__l1cache__expire__does_not_error_on_missing_key(cache):
 
 
 def test__l1cache__event__expires_correct_keys(populated_cache):
-    populated_cache.event(ServerEvent.MISSION_UPLOADED)
+    populated_cache.event(ServerEvent.VIDEO_UPLOADED)
     assert populated_cache.contains('key1') is True
     assert populated_cache.contains('key2') is False
     assert populated_cache.contains('key3') is True
@@ -130,3 +142,58 @@ def test__l1cache__event__does_nothing_if_no_matching_keys(populated_cache):
     assert populated_cache.contains('key1') is True
     assert populated_cache.contains('key2') is True
     assert populated_cache.contains('key3') is False
+
+
+def test__l1cache__event__only_touches_indexed_keys(mocker, populated_cache):
+    expire = mocker.spy(populated_cache, 'expire')
+    populated_cache.event(ServerEvent.VIDEO_UPLOADED)
+    expire.assert_called_once_with('key2')
+
+
+def test__l1cache__event__index_cleared_on_expire(populated_cache):
+    populated_cache.expire('key2')
+    assert ServerEvent.VIDEO_UPLOADED not in populated_cache.event_map
+
+
+def test__l1cache__event__index_cleared_on_pop(mocker, small_cache, small_bytes):
+    mocker.patch.object(small_cache, '_getsize', return_value=small_bytes // 2 + 1)
+    small_cache.insert('key1', 'value1', ServerEvent.TEST_EVENT)
+    small_cache.insert('key2', 'value2', None)
+    assert ServerEvent.TEST_EVENT not in small_cache.event_map
+
+
+def test__l1cache__insert__replacement_keeps_size_exact(mocker, cache):
+    mocker.patch.object(cache, '_getsize', return_value=10)
+    cache.insert('key1', 'value1', None)
+    mocker.patch.object(cache, '_getsize', return_value=30)
+    cache.insert('key1', 'value2', None)
+    assert cache.current_size_bytes == 30
+
+
+def test__l1cache__expire__subtracts_entry_size(mocker, cache):
+    mocker.patch.object(cache, '_getsize', return_value=10)
+    cache.insert('key1', 'value1', None)
+    mocker.patch.object(cache, '_getsize', return_value=25)
+    cache.insert('key2', 'value2', None)
+    cache.expire('key1')
+    assert cache.current_size_bytes == 25
+    cache.expire('key2')
+    assert cache.current_size_bytes == 0
+
+
+def test__l1cache__event__subtracts_entry_size(populated_cache):
+    populated_cache.event(ServerEvent.VIDEO_UPLOADED)
+    populated_cache.event(ServerEvent.TEST_EVENT)
+    assert populated_cache.current_size_bytes == populated_cache._getsize('value1')
+
+
+def test__l1cache__get__single_entry_is_newest(cache):
+    cache.insert('key1', 'value1', None)
+    assert cache.get('key1') == 'value1'
+    assert cache.get('key1') == 'value1'
+
+
+def test__l1cache__entry__is_slotted():
+    entry = Entry('key', 'value', 10, None)
+    with pytest.raises(AttributeError):
+        entry.extra = 'nope'
@@ -0,0 +1,146 @@
+# ruff: noqa: F811, F401
+
+import pytest
+
+from star.cache.cache import Cache
+from star.cache.l2 import L2Cache, MAGIC, RECORD_HEADER, INSERT_RECORD
+from star.events import ServerEvent
+from star.error import L1CacheMiss, L2CacheMiss
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return tmp_path / 'l2.log'
+
+
+@pytest.fixture
+def cache(cache_path):
+    cache = L2Cache(cache_path, max_cache_size_bytes=64 * 1024)
+    yield cache
+    cache.close()
+
+
+@pytest.fixture
+def other_worker(cache_path):
+    cache = L2Cache(cache_path, max_cache_size_bytes=64 * 1024)
+    yield cache
+    cache.close()
+
+
+def test__l2cache__get__returns_inserted_value(cache):
+    cache.insert('key1', ('<html></html>', 12.5), ServerEvent.TEST_EVENT)
+    assert cache.get('key1') == (('<html></html>', 12.5), ServerEvent.TEST_EVENT)
+
+
+def test__l2cache__get__returns_none_if_not_exists(cache):
+    assert cache.get('key1') is None
+
+
+def test__l2cache__insert__replaces_value(cache):
+    cache.insert('key1', 'value1', None)
+    cache.insert('key1', 'value2', None)
+    assert cache.get('key1') == ('value2', None)
+    assert len(cache.entry_map) == 1
+
+
+def test__l2cache__insert__unpicklable_is_skipped(cache):
+    assert cache.insert('key1', lambda: None, None) is False
+    assert cache.get('key1') is None
+
+
+def test__l2cache__survives_restart(cache_path, cache):
+    cache.insert('key1', 'value1', None)
+    cache.close()
+    reopened = L2Cache(cache_path, max_cache_size_bytes=64 * 1024)
+    assert reopened.get('key1') == ('value1', None)
+    reopened.close()
+
+
+def test__l2cache__shared__sees_other_worker_inserts(cache, other_worker):
+    cache.insert('key1', 'value1', None)
+    assert other_worker.get('key1') == ('value1', None)
+
+
+def test__l2cache__shared__sees_other_worker_events(cache, other_worker):
+    cache.insert('key1', 'value1', ServerEvent.TEST_EVENT)
+    cache.insert('key2', 'value2', None)
+    assert other_worker.contains('key1')
+    other_worker.event(ServerEvent.TEST_EVENT)
+    assert cache.get('key1') is None
+    assert cache.get('key2') == ('value2', None)
+
+
+def test__l2cache__expire__removes_item(cache, other_worker):
+    cache.insert('key1', 'value1', None)
+    other_worker.expire('key1')
+    assert cache.contains('key1') is False
+
+
+def test__l2cache__compaction__keeps_newest_within_budget(cache, other_worker):
+    for idx in range(200):
+        cache.insert(f'key{idx}', 'x' * 1024, None)
+    assert cache.path.stat().st_size <= cache.max_cache_size_bytes
+    assert cache.get('key199') is not None
+    assert cache.get('key0') is None
+    # the other worker notices the log was swapped out from under it
+    assert other_worker.get('key199') is not None
+    assert other_worker.get('key0') is None
+
+
+def test__l2cache__torn_record__is_ignored_and_overwritten(cache_path, cache):
+    cache.insert('key1', 'value1', None)
+    with open(cache_path, 'ab') as file:
+        file.write(RECORD_HEADER.pack(INSERT_RECORD, 0, 4, 1000) + b'key2')
+    reopened = L2Cache(cache_path, max_cache_size_bytes=64 * 1024)
+    assert reopened.get('key2') is None
+    reopened.insert('key3', 'value3', None)
+    assert cache.get('key3') == ('value3', None)
+    assert cache.get('key1') == ('value1', None)
+    reopened.close()
+
+
+def test__l2cache__clear__removes_all_items(cache, other_worker):
+    cache.insert('key1', 'value1', None)
+    other_worker.clear()
+    assert cache.contains('key1') is False
+
+
+def test__cache__l1_evictions_move_to_l2(mocker, cache):
+    layered = Cache(l2_cache=cache)
+    layered.l1_cache.max_cache_size_bytes = 100
+    mocker.patch.object(layered.l1_cache, '_getsize', return_value=60)
+    layered.insert('key1', 'value1')
+    layered.insert('key2', 'value2')
+    assert layered.l1_cache.contains('key1') is False
+    assert cache.get('key1') == ('value1', None)
+
+
+def test__cache__l2_hits_are_promoted(cache):
+    layered = Cache(l2_cache=cache)
+    cache.insert('key1', 'value1', ServerEvent.TEST_EVENT)
+    assert layered.get('key1') == 'value1'
+    assert layered.l1_cache.contains('key1')
+    layered.event(ServerEvent.TEST_EVENT)
+    assert layered.l1_cache.contains('key1') is False
+    assert cache.contains('key1') is False
+    assert layered.l2_resident == set()
+
+
+def test__cache__promoted_entries_are_not_rewritten(mocker, cache):
+    layered = Cache(l2_cache=cache)
+    cache.insert('key1', 'value1', None)
+    layered.get('key1')
+    insert = mocker.spy(cache, 'insert')
+    layered.l1_cache.expire('key1')
+    layered._evicted('key1', 'value1', None)
+    insert.assert_not_called()
+
+
+def test__cache__miss_without_l2_is_l1_miss():
+    with pytest.raises(L1CacheMiss):
+        Cache().get('key1')
+
+
+def test__cache__miss_with_l2_is_l2_miss(cache):
+    with pytest.raises(L2CacheMiss):
+        Cache(l2_cache=cache).get('key1')
@@ -0,0 +1,76 @@
+# ruff: noqa: F811, F401
+
+import pytest
+
+from star.cache.l2 import L2Cache
+from star.cache.shared import SharedCache, EventEpochs
+from star.events import ServerEvent
+from star.error import CacheMiss
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return tmp_path / 'l2.log'
+
+
+def make_worker(cache_path):
+    return SharedCache(L2Cache(cache_path, max_cache_size_bytes=64 * 1024))
+
+
+@pytest.fixture
+def worker_1(cache_path):
+    return make_worker(cache_path)
+
+
+@pytest.fixture
+def worker_2(cache_path):
+    return make_worker(cache_path)
+
+
+def test__epochs__bump_is_seen_by_other_mappings(tmp_path):
+    epochs_1 = EventEpochs(tmp_path / 'epochs')
+    epochs_2 = EventEpochs(tmp_path / 'epochs')
+    before = epochs_2.snapshot()
+    epochs_1.bump(ServerEvent.TEST_EVENT)
+    after = epochs_2.snapshot()
+    index = list(ServerEvent).index(ServerEvent.TEST_EVENT)
+    assert after[index] == before[index] + 1
+    assert sum(after) == sum(before) + 1
+
+
+def test__shared_cache__insert__visible_to_other_workers(worker_1, worker_2):
+    worker_1.insert('key1', 'value1')
+    assert worker_2.get('key1') == 'value1'
+    assert worker_2.l1_cache.contains('key1')
+
+
+def test__shared_cache__event__reaches_other_workers_l1(worker_1, worker_2):
+    worker_1.insert('key1', 'value1', ServerEvent.VIDEO_STATE_CHANGE)
+    worker_1.insert('key2', 'value2', ServerEvent.TEST_EVENT)
+    worker_2.get('key1')
+    worker_2.get('key2')
+
+    worker_1.event(ServerEvent.VIDEO_STATE_CHANGE)
+    assert worker_1.l1_cache.contains('key1') is False
+
+    with pytest.raises(CacheMiss):
+        worker_2.get('key1')
+    assert worker_2.get('key2') == 'value2'
+    assert worker_2.l2_resident == {'key2'}
+
+
+def test__shared_cache__evictions_forget_promoted_keys(mocker, worker_1, worker_2):
+    worker_1.insert('key1', 'value1')
+    worker_2.get('key1')
+    worker_2.l1_cache.max_cache_size_bytes = 100
+    mocker.patch.object(worker_2.l1_cache, '_getsize', return_value=60)
+    worker_2.insert('key2', 'value2')
+    assert worker_2.l2_resident == set()
+
+
+def test__shared_cache__event__only_expires_once_per_publish(mocker, worker_1, worker_2):
+    worker_1.event(ServerEvent.TEST_EVENT)
+    event = mocker.spy(worker_2.l1_cache, 'event')
+    worker_2._sync()
+    worker_2._sync()
+    event.assert_called_once_with(ServerEvent.TEST_EVENT)
@@ -0,0 +1,47 @@
+# ruff: noqa: F811, F401
+
+import sys
+import pytest
+
+from star.cache.sizing import FastSize, DeepSize
+
+
+@pytest.fixture
+def fallback(mocker):
+    fallback = DeepSize()
+    mocker.patch.object(fallback, 'size', return_value=1234)
+    return fallback
+
+
+@pytest.fixture
+def sizer(fallback):
+    return FastSize(fallback)
+
+
+def test__fast_size__str_does_not_walk(sizer, fallback):
+    assert sizer.size('a' * 1000) == sys.getsizeof('a' * 1000)
+    fallback.size.assert_not_called()
+
+
+def test__fast_size__bytes_does_not_walk(sizer, fallback):
+    assert sizer.size(b'a' * 1000) == sys.getsizeof(b'a' * 1000)
+    fallback.size.assert_not_called()
+
+
+def test__fast_size__small_tuple_is_summed(sizer, fallback):
+    page = ('<html></html>', 1234.5)
+    assert sizer.size(page) == sys.getsizeof(page) + sys.getsizeof(page[0]) + sys.getsizeof(page[1])
+    fallback.size.assert_not_called()
+
+
+def test__fast_size__large_tuple_falls_back(sizer, fallback):
+    assert sizer.size(tuple(range(FastSize.MAX_TUPLE_LENGTH + 1))) == 1234
+
+
+def test__fast_size__unknown_type_falls_back(sizer, fallback):
+    assert sizer.size({'a': 1}) == 1234
+
+
+def test__fast_size__matches_deep_size_for_pages():
+    page = ('<html>' + 'x' * 5000 + '</html>', 1234.5)
+    assert FastSize().size(page) == DeepSize().size(page)
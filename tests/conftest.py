@@ -0,0 +1,17 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from star.events import Broker
+from star.models import Base
+
+
+@pytest.fixture
+def state(mocker):
+    # a `star.state.State` over an empty in-memory database
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    state = mocker.Mock()
+    state.Session = sessionmaker(engine)
+    state.broker = Broker()
+    return state
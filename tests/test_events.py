@@ -0,0 +1,142 @@
+import asyncio
+import datetime
+import pytest
+from uuid import uuid4
+
+from star.events import Broker, ServerEvent, UnixSocketTransport, DatabaseTransport
+from star.models.events import BrokerEvent
+
+
+@pytest.fixture
+def socket_dir(tmp_path):
+    return tmp_path / 'broker'
+
+
+@pytest.fixture
+def worker_1(socket_dir):
+    broker = Broker(UnixSocketTransport(socket_dir))
+    yield broker
+    broker.stop()
+
+
+@pytest.fixture
+def worker_2(socket_dir):
+    broker = Broker(UnixSocketTransport(socket_dir))
+    yield broker
+    broker.stop()
+
+
+def test__broker__publish__calls_subscribers(mocker):
+    broker = Broker()
+    specific = mocker.Mock()
+    everything = mocker.Mock()
+    broker.subscribe(ServerEvent.TEST_EVENT, specific)
+    broker.subscribe_all(everything)
+    broker.publish(ServerEvent.TEST_EVENT, {'a': 1})
+    broker.publish(ServerEvent.VIDEO_UPLOADED)
+    specific.assert_called_once_with(ServerEvent.TEST_EVENT, {'a': 1})
+    assert everything.call_count == 2
+
+
+def test__broker__transport__delivers_to_other_workers(mocker, worker_1, worker_2):
+    callback = mocker.Mock()
+    worker_2.subscribe(ServerEvent.VIDEO_STATE_CHANGE, callback)
+    worker_1.publish(ServerEvent.VIDEO_STATE_CHANGE, {'uuid': 'abc'})
+    worker_2.transport._receive()
+    callback.assert_called_once_with(ServerEvent.VIDEO_STATE_CHANGE, {'uuid': 'abc'})
+
+
+def test__broker__transport__does_not_echo_to_self(mocker, worker_1, worker_2):
+    callback = mocker.Mock()
+    worker_1.subscribe_all(callback)
+    worker_1.publish(ServerEvent.TEST_EVENT)
+    worker_1.transport._receive()
+    callback.assert_called_once()
+
+
+def test__broker__local_subscribers__skip_remote_events(mocker, worker_1, worker_2):
+    callback = mocker.Mock()
+    worker_2.subscribe_all(callback, include_remote=False)
+    worker_1.publish(ServerEvent.TEST_EVENT)
+    worker_2.transport._receive()
+    callback.assert_not_called()
+    worker_2.publish(ServerEvent.TEST_EVENT)
+    callback.assert_called_once()
+
+
+def test__broker__transport__removes_dead_peers(socket_dir, worker_1):
+    dead = UnixSocketTransport(socket_dir)
+    dead._socket.close()
+    worker_1.publish(ServerEvent.TEST_EVENT)
+    assert not dead.path.exists()
+
+
+@pytest.mark.asyncio
+async def test__broker__listen__queues_events_until_closed():
+    broker = Broker()
+    async with broker.listen(ServerEvent.VIDEO_STATE_CHANGE) as events:
+        broker.publish(ServerEvent.VIDEO_STATE_CHANGE, {'uuid': 'abc'})
+        broker.publish(ServerEvent.TEST_EVENT)
+        assert await events.get() == (ServerEvent.VIDEO_STATE_CHANGE, {'uuid': 'abc'})
+        assert events.empty()
+    assert ServerEvent.VIDEO_STATE_CHANGE not in broker.subscribers
+
+
+@pytest.mark.asyncio
+async def test__broker__listen__drops_events_for_slow_listeners():
+    broker = Broker()
+    async with broker.listen(ServerEvent.TEST_EVENT, maxsize=1) as events:
+        broker.publish(ServerEvent.TEST_EVENT, 1)
+        broker.publish(ServerEvent.TEST_EVENT, 2)
+        assert await events.get() == (ServerEvent.TEST_EVENT, 1)
+        await asyncio.sleep(0)
+        assert events.empty()
+
+
+@pytest.fixture
+def node_1(state):
+    return Broker(DatabaseTransport(state.Session))
+
+
+@pytest.fixture
+def node_2(state):
+    return Broker(DatabaseTransport(state.Session))
+
+
+def test__broker__database_transport__delivers_to_other_nodes(mocker, node_1, node_2):
+    node_2.transport._receive(deliver=False)
+    callback = mocker.Mock()
+    node_1.subscribe_all(callback)
+    node_2.subscribe_all(callback)
+    uuid = uuid4()
+    node_1.publish(ServerEvent.VIDEO_STATE_CHANGE, {'uuid': uuid, 'state': 'x'})
+    callback.assert_called_once_with(ServerEvent.VIDEO_STATE_CHANGE, {'uuid': uuid, 'state': 'x'})
+
+    node_1.transport._receive()
+    node_2.transport._receive()
+    node_2.transport._receive()
+    assert callback.call_count == 2
+    callback.assert_called_with(ServerEvent.VIDEO_STATE_CHANGE, {'uuid': str(uuid), 'state': 'x'})
+
+
+def test__broker__database_transport__skips_events_from_before_it_started(mocker, node_1, node_2):
+    node_1.publish(ServerEvent.TEST_EVENT)
+    node_2.transport._receive(deliver=False)
+    callback = mocker.Mock()
+    node_2.subscribe_all(callback)
+    node_1.publish(ServerEvent.TEST_EVENT, 1)
+    node_2.transport._receive()
+    callback.assert_called_once_with(ServerEvent.TEST_EVENT, 1)
+
+
+def test__broker__database_transport__removes_old_events(mocker, state, node_1):
+    node_1.publish(ServerEvent.TEST_EVENT)
+    node_1.transport._receive()
+    with state.Session.begin() as session:
+        assert session.query(BrokerEvent).count() == 1
+
+    later = datetime.datetime.now(datetime.UTC).replace(tzinfo=None) + datetime.timedelta(seconds=301)
+    mocker.patch('star.events.utcnow', return_value=later)
+    node_1.transport._receive()
+    with state.Session.begin() as session:
+        assert session.query(BrokerEvent).count() == 0
@@ -1,6 +1,13 @@
+import os
+import sys
+import asyncio
 import pytest
 
-from star.subprocess.command import Command, define_process
+from star.error import SubprocessFailed, SubprocessTimeout
+from star.subprocess.command import STDERR, STDOUT, Chain, Command, Runner, define_process
+from star.subprocess.transcribe import Transcribe
+from star.subprocess.limiter import ProcessLimiter
+from star.subprocess.resources import IOPRIO_CLASS_BEST_EFFORT, Resources, limits, parse_cpus, thread_environment
 
 
 class MockCommand(Command):
@@ -137,3 +144,211 @@ def test___get_command__arg_kwarg_returns_correct_command(mock_command):
         'abc',
         'def',
     ]
+
+
+def test__transcribe__reads_language():
+    assert Transcribe._map_stdout('Loading audio.aac\nAligning fr transcription output\nlanguage: fr\n') == 'fr'
+    assert Transcribe._map_stdout('No file supplied\n') is None
+    assert Transcribe._get_command('audio.aac', language='de')[-3:] == ['--language', 'de', 'audio.aac']
+
+
+@pytest.mark.asyncio
+async def test__runner__astream_yields_lines_as_printed():
+    script = (
+        'import sys, time\n'
+        'print("one", flush=True)\n'
+        'sys.stderr.write("two\\r")\n'
+        'sys.stderr.flush()\n'
+        'time.sleep(0.2)\n'
+        'print("three")'
+    )
+    runner = Runner([sys.executable, '-c', script])
+    lines = [(source, line) async for source, line in runner.astream(None)]
+    assert sorted(lines) == [(STDERR, 'two'), (STDOUT, 'one'), (STDOUT, 'three')]
+    assert lines[-1] == (STDOUT, 'three')
+
+
+@pytest.mark.asyncio
+async def test__runner__astream_failure_keeps_stderr():
+    runner = Runner([sys.executable, '-c', 'import sys; sys.exit("went wrong")'])
+    with pytest.raises(SubprocessFailed, match='went wrong'):
+        async for _ in runner.astream(None):
+            pass
+
+
+@pytest.mark.asyncio
+async def test__runner__astream_idle_timeout_kills_group(tmp_path):
+    # the child would outlive its parent if only the parent were killed
+    pid_file = tmp_path / 'child.pid'
+    script = (
+        'import subprocess, sys, time\n'
+        f'child = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])\n'
+        f'open({str(pid_file)!r}, "w").write(str(child.pid))\n'
+        'print("started", flush=True)\n'
+        'time.sleep(30)'
+    )
+    runner = Runner([sys.executable, '-c', script])
+    with pytest.raises(SubprocessTimeout, match='printed nothing'):
+        async for _ in runner.astream(None, idle_timeout=0.5):
+            pass
+
+    child = int(pid_file.read_text())
+    for _ in range(50):
+        try:
+            os.kill(child, 0)
+        except ProcessLookupError:
+            break
+        await asyncio.sleep(0.05)
+    else:
+        pytest.fail('child process was left running')
+
+
+@pytest.mark.asyncio
+async def test__runner__astream_wall_clock_timeout():
+    runner = Runner([sys.executable, '-c', 'import time\nwhile True:\n    print("tick", flush=True)\n    time.sleep(0.05)'])
+    with pytest.raises(SubprocessTimeout, match='still running'):
+        async for _ in runner.astream(None, timeout=0.5, idle_timeout=5):
+            pass
+
+
+@pytest.mark.asyncio
+async def test__runner__acall_cancel_kills_process():
+    runner = Runner([sys.executable, '-c', 'import time; time.sleep(30)'])
+    call = asyncio.create_task(runner.acall(None))
+    await asyncio.sleep(0.5)
+    call.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await asyncio.wait_for(call, timeout=5)
+
+
+@pytest.mark.asyncio
+async def test__command__astream_maps_each_line(mocker):
+    script = 'import sys\nprint("Loading audio.f32")\nsys.stderr.write("warning\\n")\nprint("language: fr")'
+    mocker.patch.object(Transcribe, '_get_command', return_value=[sys.executable, '-c', script])
+    assert [language async for language in Transcribe.astream('audio.f32')] == ['fr']
+
+
+def python(script: str) -> list[str]:
+    return [sys.executable, '-c', script]
+
+
+PRODUCE = python('for idx in range(1000):\n    print(idx)')
+UPPER = python('import sys\nfor line in sys.stdin:\n    print(f"line {line.strip()}")')
+COUNT = python('import sys\nprint(sum(1 for _ in sys.stdin))')
+
+
+@pytest.mark.asyncio
+async def test__chain__astream_pipes_stages():
+    chain = Chain(PRODUCE, UPPER, COUNT)
+    assert [line async for _, line in chain.astream(None)] == ['1000']
+    assert chain.dryrun().count(' | ') == 2
+
+
+@pytest.mark.asyncio
+async def test__chain__acall_and_call_agree():
+    chain = Chain(PRODUCE, UPPER)
+    stdout, _ = await chain.acall(None)
+    assert stdout.splitlines()[-1] == 'line 999'
+    assert Chain(PRODUCE, UPPER).call(None)[0].splitlines()[-1] == 'line 999'
+
+
+@pytest.mark.asyncio
+async def test__chain__reports_every_failed_stage():
+    # the last stage succeeds on whatever it was given, but the first one failing still fails the chain
+    chain = Chain(python('import sys\nprint("partial")\nsys.exit(3)'), COUNT)
+    with pytest.raises(SubprocessFailed, match='exited with 3') as e:
+        await chain.acall(None)
+    assert 'exited with 0' not in str(e.value)
+
+    with pytest.raises(SubprocessFailed, match='exited with 3'):
+        Chain(python('import sys\nsys.exit(3)'), COUNT).call(None)
+
+
+@pytest.mark.asyncio
+async def test__chain__timeout_kills_every_stage():
+    chain = Chain(python('import time; time.sleep(30)'), UPPER)
+    with pytest.raises(SubprocessTimeout):
+        async for _ in chain.astream(None, timeout=0.5):
+            pass
+
+
+def test__parse_cpus():
+    assert parse_cpus('') == frozenset()
+    assert parse_cpus('0-3, 6') == frozenset({0, 1, 2, 3, 6})
+
+
+@pytest.mark.asyncio
+async def test__runner__applies_resources():
+    cpu = min(os.sched_getaffinity(0))
+    resources = Resources(
+        cpu_affinity=frozenset({cpu}),
+        nice=3,
+        ionice=(IOPRIO_CLASS_BEST_EFFORT, 7),
+        rlimits=limits(cpu_seconds=100),
+        environment=thread_environment(1),
+    )
+    script = (
+        'import os, resource\n'
+        'print(\n'
+        '    sorted(os.sched_getaffinity(0)),\n'
+        '    os.nice(0),\n'
+        '    resource.getrlimit(resource.RLIMIT_CPU)[1],\n'
+        '    os.environ["OMP_NUM_THREADS"],\n'
+        ')'
+    )
+    runner = Runner(python(script), resources)
+    expected = f'[{cpu}] {os.nice(0) + 3} 100 1'
+    assert (await runner.acall(None))[0].strip() == expected
+    assert runner.call(None)[0].strip() == expected
+
+
+@pytest.mark.asyncio
+async def test__process_limiter__serves_by_priority(tmp_path):
+    limiter = ProcessLimiter('test', 1, tmp_path)
+    served = []
+
+    async def run(priority: int):
+        async with limiter.slot(priority):
+            served.append(priority)
+            await asyncio.sleep(0.01)
+
+    async with limiter.slot():
+        waiters = [asyncio.create_task(run(priority)) for priority in (5, 1, 3)]
+        await asyncio.sleep(0.1)
+        assert served == []
+    await asyncio.gather(*waiters)
+    assert served == [1, 3, 5]
+
+
+@pytest.mark.asyncio
+async def test__process_limiter__shared_between_workers(tmp_path):
+    # two limiters on the same folder stand in for two web workers
+    first = ProcessLimiter('test', 1, tmp_path, poll_seconds=0.01)
+    second = ProcessLimiter('test', 1, tmp_path, poll_seconds=0.01)
+
+    held = second.slot()
+    async with first.slot():
+        waiting = asyncio.create_task(held.__aenter__())
+        await asyncio.sleep(0.1)
+        assert not waiting.done()
+    await asyncio.wait_for(waiting, timeout=1)
+    with pytest.raises(TimeoutError):
+        async with asyncio.timeout(0.1):
+            async with first.slot():
+                pass
+    await held.__aexit__(None, None, None)
+
+
+@pytest.mark.asyncio
+async def test__process_limiter__cancelled_waiter_leaves_queue(tmp_path):
+    limiter = ProcessLimiter('test', 1, tmp_path)
+    async with limiter.slot():
+        waiter = asyncio.create_task(limiter.slot(priority=0).__aenter__())
+        later = limiter.slot(priority=1)
+        waiting = asyncio.create_task(later.__aenter__())
+        await asyncio.sleep(0.05)
+        waiter.cancel()
+        await asyncio.sleep(0.05)
+        assert len(limiter.queue) == 1
+    await asyncio.wait_for(waiting, timeout=1)
+    await later.__aexit__(None, None, None)
@@ -0,0 +1,76 @@
+# ruff: noqa: F811, F401
+
+import pytest
+
+from star.events import Broker, ServerEvent
+from star.transcribe.hub import VideoEventHub
+
+
+@pytest.fixture
+def broker():
+    return Broker()
+
+
+@pytest.fixture
+def hub(broker):
+    return VideoEventHub.of(broker)
+
+
+def test__hub__of__one_subscription_per_broker(broker, hub):
+    assert VideoEventHub.of(broker) is hub
+    for event in VideoEventHub.EVENTS:
+        assert len(broker.subscribers[event]) == 1
+
+
+@pytest.mark.asyncio
+async def test__hub__listen__all_videos(broker, hub):
+    async with hub.listen() as first, hub.listen() as second:
+        broker.publish(ServerEvent.VIDEO_STATE_CHANGE, {'uuid': 'a', 'state': 'x'})
+        assert await first.get() == (ServerEvent.VIDEO_STATE_CHANGE, {'uuid': 'a', 'state': 'x'})
+        assert await second.get() == (ServerEvent.VIDEO_STATE_CHANGE, {'uuid': 'a', 'state': 'x'})
+    assert len(hub.listeners) == 0
+    for event in VideoEventHub.EVENTS:
+        assert len(broker.subscribers[event]) == 1
+
+
+@pytest.mark.asyncio
+async def test__hub__listen__filtered_videos(broker, hub):
+    async with hub.listen(['b']) as events:
+        broker.publish(ServerEvent.VIDEO_STATE_CHANGE, {'uuid': 'a', 'state': 'x'})
+        broker.publish(ServerEvent.VIDEO_STATE_CHANGE, {'uuid': 'b', 'state': 'y'})
+        assert await events.get() == (ServerEvent.VIDEO_STATE_CHANGE, {'uuid': 'b', 'state': 'y'})
+        assert events.empty()
+
+
+@pytest.mark.asyncio
+async def test__hub__listen__segments_only_by_request(broker, hub):
+    async with hub.listen() as everything, hub.listen(['a']) as states, hub.listen(['a'], segments=True) as segments:
+        broker.publish(ServerEvent.VIDEO_TRANSCRIPT_SEGMENT, {'uuid': 'a', 'segments': [{'index': 0}]})
+        broker.publish(ServerEvent.VIDEO_STATE_CHANGE, {'uuid': 'a', 'state': 'x'})
+        assert await segments.get() == (ServerEvent.VIDEO_TRANSCRIPT_SEGMENT, {'uuid': 'a', 'segments': [{'index': 0}]})
+        assert await everything.get() == (ServerEvent.VIDEO_STATE_CHANGE, {'uuid': 'a', 'state': 'x'})
+        assert await states.get() == (ServerEvent.VIDEO_STATE_CHANGE, {'uuid': 'a', 'state': 'x'})
+
+
+@pytest.mark.asyncio
+async def test__hub__listen__segments_share_one_place_in_the_queue(broker, hub):
+    async with hub.listen(['a'], maxsize=2, segments=True) as events:
+        for index in range(5):
+            broker.publish(ServerEvent.VIDEO_TRANSCRIPT_SEGMENT, {'uuid': 'a', 'segments': [{'index': index}]})
+        broker.publish(ServerEvent.VIDEO_STATE_CHANGE, {'uuid': 'a', 'state': 'x'})
+
+        event, data = await events.get()
+        assert event == ServerEvent.VIDEO_TRANSCRIPT_SEGMENT
+        assert [segment['index'] for segment in data['segments']] == [0, 1, 2, 3, 4]
+        assert await events.get() == (ServerEvent.VIDEO_STATE_CHANGE, {'uuid': 'a', 'state': 'x'})
+
+        broker.publish(ServerEvent.VIDEO_TRANSCRIPT_SEGMENT, {'uuid': 'a', 'segments': [{'index': 5}]})
+        assert await events.get() == (ServerEvent.VIDEO_TRANSCRIPT_SEGMENT, {'uuid': 'a', 'segments': [{'index': 5}]})
+        assert events.empty()
+
+
+def test__hub__ignores_unrelated_events(mocker, broker, hub):
+    listener = mocker.Mock()
+    hub.listeners.add(listener)
+    broker.publish(ServerEvent.TEST_EVENT, {'uuid': 'a'})
+    listener.wants.assert_not_called()
@@ -0,0 +1,148 @@
+# ruff: noqa: F811, F401
+
+import asyncio
+import datetime
+import pytest
+from pathlib import Path
+from sqlalchemy import select, text
+
+from star.error import TranscriptionBacklogFull
+from star.models.transcribe import Video, TranscriptionJob
+from star.transcribe.jobs import JobStore
+from star.transcribe.state import JobState, VideoState
+from star.transcribe.language import Language
+from star.transcribe.worker import TranscriptionWorker
+
+
+def queue(state, title, duration, language=Language.UNKNOWN):
+    with state.Session.begin() as session:
+        video = Video(title=title, state=VideoState.PENDING)
+        session.add(video)
+        session.flush()
+        session.expunge(video)
+    return JobStore().enqueue(state, video, Path(f'{title}.mp4'), duration, language)
+
+
+def job_state(state, job):
+    with state.Session.begin() as session:
+        return session.get(TranscriptionJob, job.id).state
+
+
+def expire_leases(mocker, seconds=120):
+    later = datetime.datetime.now(datetime.UTC).replace(tzinfo=None) + datetime.timedelta(seconds=seconds)
+    mocker.patch('star.transcribe.jobs.utcnow', return_value=later)
+
+
+def test__claim__shortest_job_first(state):
+    queue(state, 'long', 30)
+    queue(state, 'untimed', None)
+    queue(state, 'short', 10)
+
+    claimed = [JobStore().claim(state, 'worker', 60, 3) for _ in range(4)]
+    assert [video.title for _, video in claimed[:3]] == ['short', 'long', 'untimed']
+    assert claimed[3] is None
+    assert all(job.state == JobState.RUNNING and job.lease_owner == 'worker' for job, _ in claimed[:3])
+
+
+def test__claim__keeps_language(state):
+    queue(state, 'video', 10, Language.JAPANESE)
+    job, _ = JobStore().claim(state, 'worker', 60, 3)
+    assert Language(job.language) == Language.JAPANESE
+
+
+def test__job__language_defaults_in_the_schema(state):
+    # rows written without going through the model, like the ones the migration that added the column fills in
+    with state.Session.begin() as session:
+        session.execute(
+            text(
+                'INSERT INTO transcription_jobs (video, created, state, video_path, attempts) '
+                "VALUES (1, '2026-01-01 00:00:00', 'QUEUED', 'video.mp4', 0)"
+            )
+        )
+        assert session.scalar(select(TranscriptionJob.language)) == 'unknown'
+
+
+def test__claim__leased_job_is_not_claimed_twice(state):
+    queue(state, 'video', 10)
+    job, _ = JobStore().claim(state, 'first', 60, 3)
+    assert JobStore().claim(state, 'second', 60, 3) is None
+    assert JobStore().heartbeat(state, job, 'first', 60)
+    assert not JobStore().heartbeat(state, job, 'second', 60)
+
+
+def test__claim__expired_lease_is_reclaimed(state, mocker):
+    queue(state, 'video', 10)
+    job, _ = JobStore().claim(state, 'first', 60, 3)
+
+    expire_leases(mocker)
+    reclaimed, _ = JobStore().claim(state, 'second', 60, 3)
+    assert reclaimed.id == job.id
+    assert reclaimed.lease_owner == 'second'
+    assert reclaimed.attempts == 2
+
+    # the first worker finds out on its next heartbeat, and can't finish the job either
+    assert not JobStore().heartbeat(state, job, 'first', 60)
+    assert not JobStore().finish(state, job, 'first', JobState.COMPLETED)
+    assert JobStore().finish(state, reclaimed, 'second', JobState.COMPLETED)
+    assert job_state(state, job) == JobState.COMPLETED
+
+
+def test__reap__fails_jobs_out_of_attempts(state, mocker):
+    job = queue(state, 'video', 10)
+    JobStore().claim(state, 'first', 60, 1)
+    assert JobStore().reap(state, 1) == []
+
+    expire_leases(mocker)
+    assert JobStore().claim(state, 'second', 60, 1) is None
+    assert [video.title for video in JobStore().reap(state, 1)] == ['video']
+    assert job_state(state, job) == JobState.FAILED
+
+
+def test__admit__backlog_full(state):
+    queue(state, 'first', 10)
+    JobStore().admit(state, 2, 30)
+    queue(state, 'second', 10)
+    with pytest.raises(TranscriptionBacklogFull) as error:
+        JobStore().admit(state, 2, 30)
+    assert error.value.headers() == {'Retry-After': '30'}
+
+
+def test__queue_positions(state):
+    queue(state, 'long', 30)
+    queue(state, 'short', 10)
+    JobStore().claim(state, 'worker', 60, 3)
+    with state.Session.begin() as session:
+        long_uuid = session.scalar(select(Video.uuid).where(Video.title == 'long'))
+    assert JobStore().queue_positions(state) == [(long_uuid, 1)]
+
+
+@pytest.mark.asyncio
+async def test__worker__finishes_job(state, mocker):
+    mocker.patch('star.transcribe.worker.TranscriptionWorker.process', return_value=True)
+    job = queue(state, 'video', 10)
+    worker = TranscriptionWorker(state, owner='worker', concurrency=1, lease_seconds=60, poll_seconds=60, max_attempts=3)
+    await worker.run_job(*JobStore().claim(state, 'worker', 60, 3))
+    assert job_state(state, job) == JobState.COMPLETED
+
+
+@pytest.mark.asyncio
+async def test__worker__abandons_job_when_lease_lost(state, mocker):
+    cancelled = asyncio.Event()
+
+    async def process_video(*args):
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    mocker.patch('star.transcribe.worker.TranscriptionWorker.process', side_effect=process_video)
+    job = queue(state, 'video', 10)
+    worker = TranscriptionWorker(state, owner='worker', concurrency=1, lease_seconds=0.03, poll_seconds=60, max_attempts=3)
+    claimed = JobStore().claim(state, 'worker', 60, 3)
+    with state.Session.begin() as session:
+        session.get(TranscriptionJob, job.id).lease_owner = 'somebody else'
+
+    await asyncio.wait_for(worker.run_job(*claimed), 1)
+    assert cancelled.is_set()
+    assert job_state(state, job) == JobState.RUNNING
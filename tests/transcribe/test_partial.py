@@ -0,0 +1,73 @@
+# ruff: noqa: F811, F401
+
+import asyncio
+import pytest
+
+from star.events import Broker, ServerEvent
+from star.transcribe.partial import PartialTranscript
+
+
+def segment(start: float, text: str) -> dict:
+    return {'start': start, 'end': start + 1, 'text': text, 'words': []}
+
+
+def test__partial_transcript__read(tmp_path):
+    partial = PartialTranscript(tmp_path / 'video.partial.jsonl')
+    assert partial.read() == []
+
+    partial.start()
+    partial.append([segment(0, 'a'), segment(1, 'b')])
+    partial.append([segment(2, 'c')])
+    assert partial.read() == [
+        {'index': 0, 'start': 0, 'end': 1, 'text': 'a'},
+        {'index': 1, 'start': 1, 'end': 2, 'text': 'b'},
+        {'index': 2, 'start': 2, 'end': 3, 'text': 'c'},
+    ]
+
+
+def test__partial_transcript__poll_waits_for_whole_lines(tmp_path):
+    writer = PartialTranscript(tmp_path / 'video.partial.jsonl')
+    reader = PartialTranscript(writer.path)
+    writer.start()
+    writer.append([segment(0, 'a')])
+    with open(writer.path, 'a') as f:
+        f.write('{"index": 1, "sta')
+
+    assert [line['text'] for line in reader.poll()] == ['a']
+    assert [line['text'] for line in reader.read()] == ['a']
+    assert reader.poll() == []
+
+    with open(writer.path, 'a') as f:
+        f.write('rt": 1, "end": 2, "text": "b"}\n')
+    assert [line['text'] for line in reader.poll()] == ['b']
+
+
+def test__partial_transcript__start_over(tmp_path):
+    partial = PartialTranscript(tmp_path / 'video.partial.jsonl')
+    partial.start()
+    partial.append([segment(0, 'a')])
+    partial.start()
+    partial.append([segment(0, 'b')])
+    assert partial.read() == [{'index': 0, 'start': 0, 'end': 1, 'text': 'b'}]
+
+    partial.remove()
+    assert not partial.path.exists()
+
+
+@pytest.mark.asyncio
+async def test__partial_transcript__relay(tmp_path):
+    broker = Broker()
+    writer = PartialTranscript(tmp_path / 'video.partial.jsonl')
+    reader = PartialTranscript(writer.path)
+    writer.start()
+
+    async with broker.listen(ServerEvent.VIDEO_TRANSCRIPT_SEGMENT) as events:
+        relay = asyncio.create_task(reader.relay(broker, 'video', 0.01))
+        writer.append([segment(0, 'a'), segment(1, 'b')])
+        first = await asyncio.wait_for(events.get(), timeout=1)
+        writer.append([segment(2, 'c')])
+        second = await asyncio.wait_for(events.get(), timeout=1)
+        relay.cancel()
+
+    assert first == (ServerEvent.VIDEO_TRANSCRIPT_SEGMENT, {'uuid': 'video', 'segments': reader.read()[:2]})
+    assert [line['text'] for line in second[1]['segments']] == ['c']
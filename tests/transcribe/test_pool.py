@@ -0,0 +1,91 @@
+# ruff: noqa: F811, F401
+
+import sys
+import resource
+import pytest
+from pathlib import Path
+
+from star.error import SubprocessFailed
+from star.transcribe.pool import TranscriberPool
+from star.subprocess.transcribe import Transcribe
+from star.subprocess.resources import Resources
+from star.transcribe.language import Language
+
+# speaks the same protocol as `scripts/transcribe.py --serve` without loading any models
+FAKE_TRANSCRIBER = """
+import os, sys
+from multiprocessing.connection import Listener
+address, max_jobs = sys.argv[1], int(sys.argv[2])
+authkey = bytes.fromhex(os.environ['STAR_TRANSCRIBER_AUTHKEY'])
+with Listener(address, family='AF_UNIX', authkey=authkey) as listener:
+    with listener.accept() as connection:
+        for _ in range(max_jobs):
+            request = connection.recv()
+            if request['audio'].endswith('.bad'):
+                connection.send({'error': 'bad audio'})
+            else:
+                connection.send({'subtitles': f"{request['audio']}:{os.getpid()}", 'language': request['language'] or 'en'})
+"""
+
+
+@pytest.fixture
+def fake_transcriber(mocker):
+    def command(serve: str, max_jobs: int) -> list[str]:
+        return [sys.executable, '-c', FAKE_TRANSCRIBER, serve, str(max_jobs)]
+
+    mocker.patch('star.transcribe.pool.Transcribe._get_command', side_effect=command)
+
+
+def served_by(transcribed: tuple[Path, str]) -> str:
+    return str(transcribed[0]).rsplit(':', 1)[1]
+
+
+@pytest.mark.asyncio
+async def test__pool__reuses_process(fake_transcriber):
+    pool = TranscriberPool(size=1, max_jobs=10)
+    try:
+        first = await pool.transcribe(Path('first.aac'))
+        second = await pool.transcribe(Path('second.aac'), Language.FRENCH)
+        assert str(first[0]).startswith('first.aac')
+        assert first[1] == 'en'
+        assert second[1] == 'fr'
+        assert served_by(first) == served_by(second)
+    finally:
+        await pool.close()
+
+
+@pytest.mark.asyncio
+async def test__pool__restarts_after_max_jobs(fake_transcriber):
+    pool = TranscriberPool(size=1, max_jobs=2)
+    try:
+        served = [served_by(await pool.transcribe(Path(f'{idx}.aac'))) for idx in range(3)]
+        assert served[0] == served[1]
+        assert served[1] != served[2]
+    finally:
+        await pool.close()
+
+
+@pytest.mark.asyncio
+async def test__pool__job_error(fake_transcriber):
+    pool = TranscriberPool(size=1, max_jobs=10)
+    try:
+        with pytest.raises(SubprocessFailed):
+            await pool.transcribe(Path('audio.bad'))
+        # a failed job doesn't cost us the process
+        assert len(pool.idle) == 1
+    finally:
+        await pool.close()
+    assert pool.idle == []
+
+
+@pytest.mark.asyncio
+async def test__pool__workers_have_no_cpu_time_limit(mocker):
+    # the limit would be spent across jobs, killing a worker part way through a later one
+    mocker.patch.object(Transcribe, 'RLIMITS', {resource.RLIMIT_CPU: (1, 1), resource.RLIMIT_AS: (2**40, 2**40)})
+    mocker.patch.object(Transcribe, 'WARM_RLIMITS', {resource.RLIMIT_AS: (2**40, 2**40)})
+    spawn_options = mocker.spy(Resources, 'spawn_options')
+    mocker.patch('star.transcribe.pool.asyncio.create_subprocess_exec', side_effect=RuntimeError('stop'))
+    with pytest.raises(RuntimeError):
+        await TranscriberPool(size=1, max_jobs=1)._spawn()
+
+    assert spawn_options.call_args.args[0].rlimits == {resource.RLIMIT_AS: (2**40, 2**40)}
@@ -0,0 +1,106 @@
+# ruff: noqa: F811, F401
+
+import asyncio
+import pytest
+
+from star.error import TranscriptionBacklogFull
+from star.events import Broker, ServerEvent
+from star.transcribe.scheduler import TranscriptionScheduler
+
+
+@pytest.fixture
+def positions():
+    return []
+
+
+@pytest.fixture
+def scheduler(positions):
+    broker = Broker()
+    broker.subscribe(ServerEvent.VIDEO_QUEUE_POSITION, lambda event, data: positions.append((data['uuid'], data['position'])))
+    return TranscriptionScheduler(broker, concurrency=1, backlog_limit=2, retry_after_seconds=30)
+
+
+async def hold(scheduler, key, duration, started, release):
+    async with scheduler.slot(key, duration):
+        started.append(key)
+        await release.wait()
+
+
+@pytest.mark.asyncio
+async def test__scheduler__shortest_job_first(scheduler):
+    started = []
+    release = asyncio.Event()
+    first = asyncio.create_task(hold(scheduler, 'first', 100, started, release))
+    await asyncio.sleep(0)
+
+    waiting = [
+        asyncio.create_task(hold(scheduler, key, duration, started, release))
+        for key, duration in [('long', 30), ('short', 10), ('medium', 20)]
+    ]
+    await asyncio.sleep(0)
+    assert started == ['first']
+    assert scheduler.running == 1
+    assert [scheduler.position(key) for key in ('short', 'medium', 'long')] == [1, 2, 3]
+
+    release.set()
+    await asyncio.gather(first, *waiting)
+    assert started == ['first', 'short', 'medium', 'long']
+    assert scheduler.running == 0
+    assert scheduler.queue == []
+
+
+@pytest.mark.asyncio
+async def test__scheduler__publishes_position_changes(scheduler, positions):
+    started = []
+    release = asyncio.Event()
+    tasks = [
+        asyncio.create_task(hold(scheduler, key, duration, started, release))
+        for key, duration in [('a', 1), ('b', 20), ('c', 10)]
+    ]
+    await asyncio.sleep(0)
+    assert positions == [('b', 1), ('c', 1), ('b', 2)]
+
+    positions.clear()
+    release.set()
+    await asyncio.gather(*tasks)
+    assert positions == [('c', None), ('b', 1), ('b', None)]
+
+
+@pytest.mark.asyncio
+async def test__scheduler__admit(scheduler):
+    started = []
+    release = asyncio.Event()
+    tasks = [asyncio.create_task(hold(scheduler, key, 1, started, release)) for key in 'abc']
+    await asyncio.sleep(0)
+
+    # one running and two waiting fills the backlog
+    with pytest.raises(TranscriptionBacklogFull) as e:
+        scheduler.admit()
+    response = e.value.as_response_code()
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '30'
+
+    release.set()
+    await asyncio.gather(*tasks)
+    scheduler.admit()
+
+
+@pytest.mark.asyncio
+async def test__scheduler__cancelled_while_queued(scheduler):
+    started = []
+    release = asyncio.Event()
+    first = asyncio.create_task(hold(scheduler, 'first', 1, started, release))
+    queued = asyncio.create_task(hold(scheduler, 'queued', 1, started, release))
+    await asyncio.sleep(0)
+    assert scheduler.position('queued') == 1
+
+    queued.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await queued
+    assert scheduler.queue == []
+    assert scheduler.position('queued') is None
+
+    release.set()
+    await first
+    assert started == ['first']
+    assert scheduler.running == 0
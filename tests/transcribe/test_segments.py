@@ -0,0 +1,58 @@
+# ruff: noqa: F811, F401
+
+import pytest
+
+from star.transcribe.segments import Window, plan_windows, stitch
+
+
+def test__plan_windows__short_audio_is_one_window():
+    windows = plan_windows([1.0] * 140, 1.0, 100, 5)
+    assert windows == [Window(start=0.0, end=140.0, keep_start=float('-inf'), keep_end=float('inf'))]
+
+
+def test__plan_windows__cuts_at_silence():
+    energies = [1.0] * 300
+    energies[93] = 0.0
+    energies[200] = 0.0
+    windows = plan_windows(energies, 1.0, 100, 5, search_seconds=10)
+
+    assert [(window.keep_start, window.keep_end) for window in windows] == [
+        (float('-inf'), 93.0),
+        (93.0, 200.0),
+        (200.0, float('inf')),
+    ]
+    assert [(window.start, window.end) for window in windows] == [(0.0, 98.0), (88.0, 205.0), (195.0, 300.0)]
+
+
+def test__plan_windows__prefers_target_without_silence():
+    windows = plan_windows([1.0] * 300, 1.0, 100, 5)
+    assert [window.keep_end for window in windows[:-1]] == [100.0, 200.0]
+
+
+def test__plan_windows__covers_audio():
+    energies = [float(idx % 7) for idx in range(10_000)]
+    windows = plan_windows(energies, 0.1, 120, 2)
+    assert windows[0].start == 0.0
+    assert windows[-1].end == pytest.approx(1000.0)
+    for before, after in zip(windows, windows[1:]):
+        assert before.keep_end == after.keep_start
+        assert after.start < before.end
+
+
+def test__stitch__overlap_is_not_repeated():
+    first = Window(start=0, end=105, keep_start=float('-inf'), keep_end=100)
+    second = Window(start=95, end=200, keep_start=100, keep_end=float('inf'))
+
+    # both windows hear 'b' whole, and 'a' and 'c' cut off at their edges
+    first_segments = [
+        {'start': 0, 'end': 90, 'text': 'a'},
+        {'start': 96, 'end': 102, 'text': 'b'},
+        {'start': 102, 'end': 105, 'text': 'c'},
+    ]
+    second_segments = [
+        {'start': 95, 'end': 98, 'text': 'a'},
+        {'start': 96, 'end': 102, 'text': 'b'},
+        {'start': 102, 'end': 150, 'text': 'c'},
+    ]
+    transcript = stitch([(first, first_segments), (second, second_segments)])
+    assert [(segment['text'], segment['end']) for segment in transcript] == [('a', 90), ('b', 102), ('c', 150)]
@@ -0,0 +1,265 @@
+# ruff: noqa: F811, F401
+
+import pytest
+
+import os
+import time
+import shutil
+import hashlib
+import uuid
+
+from star.error import UploadError, UploadSessionMismatch, UploadSessionNotFound, UploadSessionCompleted
+from star.transcribe.upload import ChunkedUpload, ChunkInfo, MultipartUpload, UploadRegistry
+from star.transcribe.language import Language
+
+
+@pytest.fixture
+def folder(tmp_path):
+    return tmp_path / 'chunks_test'
+
+
+def session(folder, total_chunks, total_size=None):
+    upload = ChunkedUpload(folder, total_chunks)
+    upload.register('video.mp4', total_size)
+    return upload
+
+
+def test__chunked_upload__out_of_order(folder, tmp_path):
+    chunks = [b'aaaa', b'bbbb', b'cc']
+    upload = session(folder, len(chunks), 10)
+
+    assert not upload.write_chunk(2, 8, chunks[2], total_size=10)
+    assert not upload.write_chunk(0, 0, chunks[0], total_size=10)
+    assert upload.write_chunk(1, 4, chunks[1], total_size=10)
+
+    destination = upload.finish(tmp_path / 'video.mp4')
+    assert destination.read_bytes() == b'aaaabbbbcc'
+    assert not upload.part_path.exists()
+
+
+def test__chunked_upload__completes_once(folder):
+    upload = session(folder, 2, 4)
+    assert not upload.write_chunk(0, 0, b'aa', total_size=4)
+    assert upload.write_chunk(1, 2, b'bb', total_size=4)
+    # a retried chunk after completion must not complete the upload a second time
+    assert not upload.write_chunk(1, 2, b'bb', total_size=4)
+
+
+def test__chunked_upload__retried_chunk(folder):
+    upload = session(folder, 2, 4)
+    assert not upload.write_chunk(0, 0, b'xx', total_size=4)
+    assert not upload.write_chunk(0, 0, b'aa', total_size=4)
+    assert upload.write_chunk(1, 2, b'bb', total_size=4)
+    assert upload.part_path.read_bytes() == b'aabb'
+
+
+def test__chunked_upload__many_chunks(folder):
+    # spans more than one bitmap byte
+    upload = session(folder, 19, 19)
+    completed = [upload.write_chunk(idx, idx, bytes([idx]), total_size=19) for idx in reversed(range(19))]
+    assert completed == [False] * 18 + [True]
+    assert upload.part_path.read_bytes() == bytes(range(19))
+
+
+def test__chunked_upload__single_chunk_without_size(folder):
+    upload = session(folder, 1)
+    assert upload.write_chunk(0, 0, b'whole file')
+    assert upload.part_path.read_bytes() == b'whole file'
+
+
+def test__chunked_upload__invalid_chunks(folder):
+    with pytest.raises(UploadError):
+        ChunkedUpload(folder, 0)
+
+    upload = session(folder, 2, 4)
+    with pytest.raises(UploadError):
+        upload.write_chunk(2, 0, b'aa', total_size=4)
+    with pytest.raises(UploadError):
+        upload.write_chunk(1, 3, b'aa', total_size=4)
+
+
+def test__chunked_upload__missing_chunks(folder):
+    upload = session(folder, 10, 10)
+    upload.write_chunk(3, 3, b'a', total_size=10)
+    upload.write_chunk(8, 8, b'a', total_size=10)
+    assert ChunkedUpload.load(folder).missing_chunks() == [0, 1, 2, 4, 5, 6, 7, 9]
+
+
+def test__chunked_upload__session_mismatch(folder):
+    session(folder, 2, 4)
+    with pytest.raises(UploadSessionMismatch):
+        session(folder, 3, 4)
+    with pytest.raises(UploadSessionMismatch):
+        session(folder, 2, 5)
+
+
+def test__chunked_upload__expired_session(folder):
+    upload = session(folder, 2, 4)
+    shutil.rmtree(folder)
+    with pytest.raises(UploadSessionNotFound):
+        upload.write_chunk(1, 2, b'bb', total_size=4)
+    with pytest.raises(UploadSessionNotFound):
+        ChunkedUpload.load(folder)
+
+
+def test__upload_registry__open(tmp_path):
+    registry = UploadRegistry(tmp_path, ttl_seconds=60)
+    upload_uuid = str(uuid.uuid4())
+    chunk = ChunkInfo(filename='video.mp4', index=0, total_chunks=2, uuid=upload_uuid, offset=0, total_size=4)
+    upload = registry.open(chunk)
+    assert upload.folder == tmp_path / f'chunks_{upload_uuid}'
+    assert registry.get(upload_uuid).total_chunks == 2
+
+    with pytest.raises(UploadError):
+        registry.open(ChunkInfo(filename='video.mp4', index=0, total_chunks=2, uuid='../escape', offset=0, total_size=4))
+    with pytest.raises(UploadError):
+        registry.open(ChunkInfo(filename='video.mp4', index=0, total_chunks=2, uuid='', offset=0, total_size=4))
+
+
+def test__upload_registry__finished_session_turns_late_chunks_away(tmp_path):
+    registry = UploadRegistry(tmp_path, ttl_seconds=60)
+    chunk = ChunkInfo(filename='video.mp4', index=0, total_chunks=1, uuid=str(uuid.uuid4()), offset=0, total_size=2)
+    upload = registry.open(chunk)
+    assert upload.write_chunk(0, 0, b'aa', total_size=2)
+    upload.finish(registry.claim('video.mp4'))
+
+    assert registry.exists(chunk.uuid)
+    with pytest.raises(UploadSessionCompleted):
+        registry.open(chunk)
+    assert list(tmp_path.glob('*.mp4')) == [tmp_path / 'video.mp4']
+
+
+def test__upload_registry__claim(tmp_path):
+    registry = UploadRegistry(tmp_path, ttl_seconds=60)
+    assert registry.claim('video.mp4') == tmp_path / 'video.mp4'
+    assert registry.claim('video.mp4') == tmp_path / 'video_1.mp4'
+    assert registry.claim('video') == tmp_path / 'video'
+    assert registry.claim('video') == tmp_path / 'video_1'
+    assert (tmp_path / 'video_1.mp4').exists()
+
+
+def test__upload_registry__sweep(tmp_path):
+    registry = UploadRegistry(tmp_path, ttl_seconds=60)
+    stale, fresh = (str(uuid.uuid4()) for _ in range(2))
+    for upload_uuid in (stale, fresh):
+        registry.open(ChunkInfo(filename='video.mp4', index=0, total_chunks=2, uuid=upload_uuid, offset=0, total_size=4))
+
+    stale_folder = tmp_path / f'chunks_{stale}'
+    an_hour_ago = time.time() - 60 * 60
+    for path in [stale_folder, *stale_folder.iterdir()]:
+        os.utime(path, (an_hour_ago, an_hour_ago))
+
+    assert registry.sweep() == 1
+    assert not stale_folder.exists()
+    assert (tmp_path / f'chunks_{fresh}').exists()
+
+
+def multipart(*parts, boundary='XyZ'):
+    body = b''
+    for name, value, filename in parts:
+        disposition = f'form-data; name="{name}"'
+        if filename is not None:
+            disposition += f'; filename="{filename}"'
+        body += f'--{boundary}\r\nContent-Disposition: {disposition}\r\n\r\n'.encode() + value + b'\r\n'
+    return body + f'--{boundary}--\r\n'.encode()
+
+
+async def blocks(body, size):
+    for idx in range(0, len(body), size):
+        yield body[idx : idx + size]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('block_size', [1, 7, 4096])
+async def test__multipart_upload__streams_file(folder, block_size):
+    body = multipart(
+        ('dzuuid', b'abc', None),
+        ('dzchunkindex', b'1', None),
+        ('dztotalchunkcount', b'2', None),
+        ('dzchunkbyteoffset', b'4', None),
+        ('dztotalfilesize', b'10', None),
+        ('file', b'bbbbbb', 'video.mp4'),
+    )
+    opened = []
+
+    def open_file(fields, filename):
+        chunk = ChunkInfo.from_form(fields, filename)
+        opened.append(chunk)
+        return session(folder, chunk.total_chunks, chunk.total_size).open_chunk(chunk.index, chunk.offset, chunk.total_size)
+
+    fields = await MultipartUpload(b'XyZ', open_file).receive(blocks(body, block_size))
+    assert fields['dzuuid'] == 'abc'
+    assert opened == [ChunkInfo(filename='video.mp4', index=1, total_chunks=2, uuid='abc', offset=4, total_size=10)]
+    assert (folder / ChunkedUpload.PART_NAME).read_bytes() == b'\x00' * 4 + b'bbbbbb'
+
+
+@pytest.mark.asyncio
+async def test__multipart_upload__truncated(mocker):
+    body = multipart(('file', b'bbbbbb', 'video.mp4'))
+    writer = mocker.Mock()
+    with pytest.raises(UploadError):
+        await MultipartUpload(b'XyZ', lambda fields, filename: writer).receive(blocks(body[:-12], 4096))
+    writer.close.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test__multipart_upload__field_too_large(mocker):
+    body = multipart(('filename', b'a' * (MultipartUpload.MAX_FIELD_SIZE + 1), None))
+    with pytest.raises(UploadError):
+        await MultipartUpload(b'XyZ', mocker.Mock()).receive(blocks(body, 4096))
+
+
+def test__chunk_info__malformed():
+    with pytest.raises(UploadError):
+        ChunkInfo.from_form({'dzchunkindex': 'one'})
+    with pytest.raises(UploadError):
+        ChunkInfo.from_form({'language': 'klingon'})
+
+
+def test__chunk_info__language():
+    assert ChunkInfo.from_form({}).language == Language.UNKNOWN
+    assert ChunkInfo.from_form({'language': 'fr'}).language == Language.FRENCH
+
+
+def reference_hash(data, block_size):
+    digests = b''.join(hashlib.sha256(data[idx : idx + block_size]).digest() for idx in range(0, len(data), block_size))
+    return hashlib.sha256(digests).hexdigest()
+
+
+@pytest.mark.parametrize('chunk_size', [4, 8, 3, 5, 40])
+def test__chunked_upload__content_hash(mocker, folder, chunk_size):
+    mocker.patch('star.transcribe.upload.HASH_BLOCK_SIZE', 4)
+    data = bytes(range(30))
+    offsets = list(range(0, len(data), chunk_size))
+    upload = session(folder, len(offsets), len(data))
+    # out of order, and fed in uneven writes
+    for chunk_index, offset in reversed(list(enumerate(offsets))):
+        writer = upload.open_chunk(chunk_index, offset, len(data))
+        chunk = data[offset : offset + chunk_size]
+        writer.write(chunk[:3])
+        writer.write(chunk[3:])
+        writer.close()
+        upload.mark_received(chunk_index, writer.block_digests)
+
+    assert upload.content_hash() == reference_hash(data, 4)
+
+
+def test__chunked_upload__content_hash_without_size(mocker, folder):
+    mocker.patch('star.transcribe.upload.HASH_BLOCK_SIZE', 4)
+    upload = session(folder, 1)
+    upload.write_chunk(0, 0, b'0123456789')
+    assert upload.content_hash() == reference_hash(b'0123456789', 4)
+
+
+def test__chunked_upload__content_hash_only_rehashes_missing_blocks(mocker, folder):
+    mocker.patch('star.transcribe.upload.HASH_BLOCK_SIZE', 4)
+    upload = session(folder, 2, 8)
+    upload.write_chunk(0, 0, b'0123', total_size=8)
+    upload.write_chunk(1, 4, b'4567', total_size=8)
+
+    # a wrong digest on file proves the block wasn't read back from disk
+    with open(upload.digests_path, 'r+b') as digests:
+        digests.write(hashlib.sha256(b'nope').digest())
+    assert (
+        upload.content_hash() == hashlib.sha256(hashlib.sha256(b'nope').digest() + hashlib.sha256(b'4567').digest()).hexdigest()
+    )
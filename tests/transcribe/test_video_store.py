@@ -0,0 +1,98 @@
+# ruff: noqa: F811, F401
+
+import pytest
+
+from star.models.transcribe import Video, Transcription
+from star.transcribe.video import VideoStore
+from star.transcribe.state import VideoState
+from star.transcribe.metadata import ProbeMetadata
+
+
+@pytest.fixture
+def state(state):
+    # five videos, alternately completed and failed
+    with state.Session.begin() as session:
+        for idx in range(5):
+            session.add(Video(title=f'video {idx}', state=VideoState.COMPLETED if idx % 2 == 0 else VideoState.FAILED))
+    return state
+
+
+def titles(videos):
+    return [video.title for video, _ in videos]
+
+
+def test__get_all_videos__pages_newest_first(state):
+    videos, cursor = VideoStore().get_all_videos(state, 2)
+    assert titles(videos) == ['video 4', 'video 3']
+
+    videos, cursor = VideoStore().get_all_videos(state, 2, cursor)
+    assert titles(videos) == ['video 2', 'video 1']
+
+    videos, cursor = VideoStore().get_all_videos(state, 2, cursor)
+    assert titles(videos) == ['video 0']
+    assert cursor is None
+
+
+def test__get_all_videos__exact_page_has_no_cursor(state):
+    videos, cursor = VideoStore().get_all_videos(state, 5)
+    assert len(videos) == 5
+    assert cursor is None
+
+
+def test__get_all_videos__filtered(state):
+    videos, cursor = VideoStore().get_all_videos(state, 1, states=[VideoState.COMPLETED])
+    assert titles(videos) == ['video 4']
+
+    videos, cursor = VideoStore().get_all_videos(state, 5, cursor, states=[VideoState.COMPLETED])
+    assert titles(videos) == ['video 2', 'video 0']
+    assert cursor is None
+
+
+def test__get_transcribed_video_from_hash(state):
+    with state.Session.begin() as session:
+        transcript = Transcription(language='en', path='video.srt')
+        session.add(transcript)
+        session.flush()
+        session.add(Video(title='untranscribed', content_hash='a' * 64))
+        session.add(Video(title='transcribed', content_hash='a' * 64, transcript=transcript.id))
+        session.add(Video(title='other', content_hash='b' * 64))
+
+    video, transcript = VideoStore().get_transcribed_video_from_hash(state, 'a' * 64)
+    assert video.title == 'transcribed'
+    assert transcript.path == 'video.srt'
+    assert VideoStore().get_transcribed_video_from_hash(state, 'b' * 64) is None
+    assert VideoStore().get_transcribed_video_from_hash(state, 'c' * 64) is None
+
+
+def test__probe_metadata__from_ffprobe():
+    probe = ProbeMetadata.from_ffprobe(
+        {
+            'format': {'format_name': 'mov,mp4', 'duration': '12.5', 'tags': {'encoder': 'x'}},
+            'streams': [
+                {'index': 0, 'codec_type': 'video', 'codec_name': 'h264', 'width': 640, 'height': 480, 'profile': 'High'},
+                {'index': 1, 'codec_type': 'audio', 'codec_name': 'aac', 'sample_rate': '44100', 'channels': 2},
+            ],
+        }
+    )
+    assert probe.duration == 12.5
+    assert probe.format == 'mov,mp4'
+    assert probe.streams[0] == {'index': 0, 'codec_type': 'video', 'codec_name': 'h264', 'width': 640, 'height': 480}
+    assert ProbeMetadata.from_ffprobe({'format': {'duration': 'N/A'}}).duration is None
+
+
+def test__get_probe_from_hash__reuses_earlier_upload(state):
+    with state.Session.begin() as session:
+        first = Video(title='first', content_hash='ab' * 32)
+        second = Video(title='second', content_hash='ab' * 32)
+        session.add_all([first, second])
+        session.flush()
+        session.expunge_all()
+
+    assert VideoStore().get_probe_from_hash(state, 'ab' * 32) is None
+    probe = ProbeMetadata(duration=3.0, format='wav', streams=[{'index': 0, 'codec_type': 'audio'}])
+    VideoStore().set_probe(state, first, probe)
+
+    assert VideoStore().get_probe_from_hash(state, 'ab' * 32) == probe
+    assert VideoStore().get_probe_from_hash(state, 'cd' * 32) is None
+    with state.Session.begin() as session:
+        assert session.get(Video, first.id).duration == 3.0